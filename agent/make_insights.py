@@ -1,111 +1,370 @@
 #!/usr/bin/env python3
 import os, json, sqlite3, pathlib, time
+import urllib.parse
+import urllib.request
 from datetime import datetime, timezone
 
 DB_PATH = os.getenv("DB_PATH", "data/hygro.db")
 OUT_PATH = os.getenv("OUT_PATH", "data/insights/latest.json")
-INTERVAL_MINUTES = int(os.getenv("INTERVAL_MINUTES", "20"))
+STATE_PATH = os.getenv("STATE_PATH", "data/insights/agent_state.json")
+API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8081")
+INTERVAL_MINUTES = int(os.getenv("INTERVAL_MINUTES", "20"))  # collector sampling interval (expected points)
 WARN_RH = float(os.getenv("HUMIDITY_WARN", "60"))
 ALERT_RH = float(os.getenv("HUMIDITY_ALERT", "65"))
+EXCLUDE_ANOMALIES = os.getenv("EXCLUDE_ANOMALIES", "0") == "1"  # leave out readings flagged as sensor faults
 
-def stats(xs):
-    xs = [x for x in xs if x is not None]
-    if not xs:
+# incremental windows: hourly buckets, only recent ones are re-fetched each run
+BUCKET_SECS = 3600
+WINDOWS = {"last_24h": 24 * 3600, "last_7d": 7 * 24 * 3600}
+LOOKBACK_SECS = int(os.getenv("AGENT_LOOKBACK_SECS", str(3 * 3600)))  # >= server gap cap; covers late/replayed readings
+REBUILD_HOURS = float(os.getenv("AGENT_REBUILD_HOURS", "24"))        # full re-fetch now and then to reconcile
+STATE_VERSION = 3
+
+# change-triggered runs: watch the readings high-water mark, debounce bursts
+POLL_SECS = float(os.getenv("AGENT_POLL_SECS", "2"))
+DEBOUNCE_SECS = float(os.getenv("AGENT_DEBOUNCE_SECS", "10"))     # quiet time after the last change
+MAX_DELAY_SECS = float(os.getenv("AGENT_MAX_DELAY_SECS", "60"))   # run at the latest this long after the first change
+MIN_INTERVAL_SECS = float(os.getenv("AGENT_MIN_INTERVAL_SECS", "30"))  # bound on recompute rate
+STATUS_RANK = {"no_data": 0, "ok": 1, "warn": 2, "alert": 3}
+
+def api_get(path, params=None):
+    url = f"{API_BASE_URL}{path}"
+    if params:
+        url += "?" + urllib.parse.urlencode(params)
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+def fetch_coverage(start_epoch, end_epoch):
+    """
+    {room_id: {coverage_pct, outage_secs, ...}} from the server's gap index.
+    """
+    return api_get("/api/coverage", {"start": start_epoch, "end": end_epoch}).get("rooms") or {}
+
+def fetch_forecast():
+    """
+    {room_id: {humidity, battery}} projections from the server's trend state.
+    """
+    return api_get("/api/forecast").get("rooms") or {}
+
+def fetch_buckets(start_epoch, end_epoch):
+    """
+    Hourly aggregates for all rooms, {room_id: [bucket, ...]}, from one
+    grouped pass of the server's stats engine (same numbers the dashboard
+    and the nightly report use), plus each room's mould-risk index.
+    """
+    data = api_get(
+        "/api/stats",
+        {"start": start_epoch, "end": end_epoch, "warn": WARN_RH, "alert": ALERT_RH, "bucket": BUCKET_SECS,
+         "exclude_anomalies": "true" if EXCLUDE_ANOMALIES else "false"},
+    )
+    return data.get("rooms") or {}, data.get("mould_risk_index") or {}
+
+def compact_bucket(st):
+    """
+    The mergeable part of one bucket: counts, sums, extremes, seconds.
+    """
+    def block(b):
+        if not b:
+            return None
+        return {"count": b["count"], "sum": b["avg"] * b["count"], "min": b["min"], "max": b["max"],
+                "peak_epoch": b.get("peak_epoch")}
+
+    return {
+        "points": st["points"],
+        "first_epoch": st["first_epoch"],
+        "last_epoch": st["last_epoch"],
+        "temperature": block(st.get("temperature")),
+        "humidity": block(st.get("humidity")),
+        "battery_mv": block(st.get("battery_mv")),
+        "dew_point": block(st.get("dew_point")),
+        "absolute_humidity": block(st.get("absolute_humidity")),
+        "secs_warn": st["seconds_humidity_above_warn"],
+        "secs_alert": st["seconds_humidity_above_alert"],
+        "secs_mould": st["seconds_mould_risk"],
+    }
+
+def merge_blocks(blocks, peak=True):
+    blocks = [b for b in blocks if b]
+    if not blocks:
         return None
+    count = sum(b["count"] for b in blocks)
+    top = max(blocks, key=lambda b: b["max"])
+    out = {
+        "min": min(b["min"] for b in blocks),
+        "max": top["max"],
+        "avg": sum(b["sum"] for b in blocks) / count,
+        "count": count,
+    }
+    if peak:
+        out["peak_epoch"] = top["peak_epoch"]
+    return out
+
+def window_summary(buckets, start_epoch, now):
+    """
+    Merge the buckets that start inside [start_epoch, now).
+    """
+    sel = [b for s, b in buckets.items() if int(s) >= start_epoch]
+    return merge_window(sel, start_epoch, now)
+
+def merge_window(sel, start_epoch, now):
+    secs_warn = sum(b["secs_warn"] for b in sel)
+    secs_alert = sum(b["secs_alert"] for b in sel)
     return {
-        "min": float(min(xs)),
-        "max": float(max(xs)),
-        "avg": float(sum(xs) / len(xs)),
-        "count": int(len(xs)),
+        "start": start_epoch,
+        "points": sum(b["points"] for b in sel),
+        "expected_points": int(round((now - start_epoch) / 60 / INTERVAL_MINUTES)),
+        "temperature": merge_blocks(b["temperature"] for b in sel),
+        "humidity": merge_blocks(b["humidity"] for b in sel),
+        "battery_mv": merge_blocks((b["battery_mv"] for b in sel), peak=False),
+        "dew_point": merge_blocks((b["dew_point"] for b in sel), peak=False),
+        "absolute_humidity": merge_blocks((b["absolute_humidity"] for b in sel), peak=False),
+        "hours_humidity_above_warn": round(secs_warn / 3600.0, 2),
+        "hours_humidity_above_alert": round(secs_alert / 3600.0, 2),
+        "hours_mould_risk": round(sum(b["secs_mould"] for b in sel) / 3600.0, 2),
     }
 
-def hours_above(xs, threshold):
-    xs = [x for x in xs if x is not None]
-    n = sum(1 for x in xs if x >= threshold)
-    return round(n * INTERVAL_MINUTES / 60.0, 2)
-
-def fetch_window(conn, start_epoch, end_epoch):
-    cur = conn.execute(
-        """SELECT epoch, temp_c, humidity_pct, battery_mv
-           FROM readings
-           WHERE epoch BETWEEN ? AND ?
-           ORDER BY epoch ASC""",
-        (start_epoch, end_epoch)
+def load_state():
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def write_atomic(path, text):
+    """
+    Temp file + fsync + rename: readers see the old or the new file, never
+    a partial one.
+    """
+    p = pathlib.Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f".{p.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+
+def save_state(state):
+    write_atomic(STATE_PATH, json.dumps(state))
+
+def update_buckets(state, now):
+    """
+    Re-fetch only the buckets from (checkpoint - LOOKBACK_SECS) on, drop
+    buckets that fell out of the longest window, and move the checkpoint.
+    A missing/incompatible state or an overdue rebuild re-fetches it all.
+    """
+    oldest = now - now % BUCKET_SECS - max(WINDOWS.values())
+    key = {"version": STATE_VERSION, "warn_rh": WARN_RH, "alert_rh": ALERT_RH, "bucket_secs": BUCKET_SECS,
+           "exclude_anomalies": EXCLUDE_ANOMALIES}
+
+    full = (
+        any(state.get(k) != v for k, v in key.items())
+        or not state.get("checkpoint")
+        or now - state.get("rebuilt_epoch", 0) >= REBUILD_HOURS * 3600
     )
-    rows = cur.fetchall()
-    temps = [r[1] for r in rows]
-    hums  = [r[2] for r in rows]
-    batts = [r[3] for r in rows]
-    return rows, temps, hums, batts
+    if full:
+        state = dict(key, rooms={}, rebuilt_epoch=now, published_version=state.get("published_version", 0))
+        since = oldest
+    else:
+        since = state["checkpoint"] - LOOKBACK_SECS
+        since = max(oldest, since - since % BUCKET_SECS)
 
-def run_once():
-    now = int(datetime.now(timezone.utc).timestamp())
-    day_start = now - 24 * 3600
-    week_start = now - 7 * 24 * 3600
+    rooms = {}
+    for room_id, buckets in state["rooms"].items():
+        kept = {s: b for s, b in buckets.items() if oldest <= int(s) < since}
+        if kept:
+            rooms[room_id] = kept
+
+    fetched, mould = fetch_buckets(since, now)
+    for room_id, buckets in fetched.items():
+        for st in buckets:
+            rooms.setdefault(room_id, {})[str(st["start"] - st["start"] % BUCKET_SECS)] = compact_bucket(st)
+
+    state["rooms"] = rooms
+    state["mould_risk_index"] = dict(state.get("mould_risk_index") or {}, **mould)
+    state["checkpoint"] = now
+    return state, {
+        "full": full,
+        "since": since,
+        "fetched": sum(len(b) for b in fetched.values()),
+        "kept": sum(len(b) for b in rooms.values()),
+    }
 
+def latest_readings(room_ids):
+    """
+    Newest row per room (one index seek each, on one connection).
+    """
+    out = {}
     conn = sqlite3.connect(DB_PATH)
     try:
-        latest = None
-        cur = conn.execute(
-            "SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv FROM readings ORDER BY epoch DESC LIMIT 1"
-        )
-        row = cur.fetchone()
-        if row:
-            latest = dict(zip(["ts_utc","epoch","temp_c","humidity_pct","battery_mv"], row))
-
-        rows24, t24, h24, b24 = fetch_window(conn, day_start, now)
-        rows7,  t7,  h7,  b7  = fetch_window(conn, week_start, now)
-
-        expected_24 = int(round((24 * 60) / INTERVAL_MINUTES))
-        expected_7  = int(round((7 * 24 * 60) / INTERVAL_MINUTES))
-
-        out = {
-            "generated_utc": datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
-            "sampling_interval_minutes": INTERVAL_MINUTES,
-            "thresholds": {"warn_rh": WARN_RH, "alert_rh": ALERT_RH},
-            "latest": latest,
-            "last_24h": {
-                "points": len(rows24),
-                "expected_points": expected_24,
-                "temperature": stats(t24),
-                "humidity": stats(h24),
-                "hours_humidity_above_warn": hours_above(h24, WARN_RH),
-                "hours_humidity_above_alert": hours_above(h24, ALERT_RH),
-            },
-            "last_7d": {
-                "points": len(rows7),
-                "expected_points": expected_7,
-                "temperature": stats(t7),
-                "humidity": stats(h7),
-                "hours_humidity_above_warn": hours_above(h7, WARN_RH),
-                "hours_humidity_above_alert": hours_above(h7, ALERT_RH),
-            }
-        }
-
-        status = "ok"
-        if out["last_24h"]["hours_humidity_above_alert"] >= 1.0:
-            status = "alert"
-        elif out["last_24h"]["hours_humidity_above_warn"] >= 1.0:
-            status = "warn"
-        out["status"] = status
-
-        p = pathlib.Path(OUT_PATH)
-        p.parent.mkdir(parents=True, exist_ok=True)
-        p.write_text(json.dumps(out, indent=2), encoding="utf-8")
-
-        print(f"[agent] wrote {OUT_PATH} status={status}", flush=True)
-
+        for room_id in room_ids:
+            row = conn.execute(
+                "SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv FROM readings "
+                "WHERE room_id = ? ORDER BY epoch DESC LIMIT 1",
+                (room_id,),
+            ).fetchone()
+            if row:
+                out[room_id] = dict(zip(["ts_utc","epoch","temp_c","humidity_pct","battery_mv"], row))
     finally:
         conn.close()
+    return out
+
+def room_status(w24):
+    if not w24["points"]:
+        return "no_data"
+    if w24["hours_humidity_above_alert"] >= 1.0:
+        return "alert"
+    if w24["hours_humidity_above_warn"] >= 1.0:
+        return "warn"
+    return "ok"
+
+def fleet_summary(state, rooms_out, hour, now):
+    """
+    Rollup over all rooms: status counts, the worst room and each window
+    merged across rooms. Hours above threshold are summed as room-hours.
+    """
+    counts = {k: 0 for k in STATUS_RANK}
+    for r in rooms_out.values():
+        counts[r["status"]] += 1
+    worst = max(rooms_out.values(), key=lambda r: (STATUS_RANK[r["status"]],
+                                                   r["last_24h"]["hours_humidity_above_alert"],
+                                                   r["last_24h"]["hours_humidity_above_warn"]), default=None)
+    out = {
+        "rooms": len(rooms_out),
+        "status_counts": counts,
+        "status": worst["status"] if worst else "no_data",
+        "worst_room_id": worst["room_id"] if worst and worst["status"] != "no_data" else None,
+    }
+    mould = [(r["mould_risk_index"]["index"], r["room_id"]) for r in rooms_out.values() if r.get("mould_risk_index")]
+    out["max_mould_risk_index"], out["max_mould_risk_room_id"] = max(mould) if mould else (None, None)
+    for name, secs in WINDOWS.items():
+        sel = [b for room_id in rooms_out for s, b in state["rooms"].get(room_id, {}).items()
+               if int(s) >= hour - secs]
+        w = merge_window(sel, hour - secs, now)
+        w["expected_points"] *= len(rooms_out)
+        cov = [r[name]["coverage_pct"] for r in rooms_out.values() if r[name].get("coverage_pct") is not None]
+        w["coverage_pct"] = round(sum(cov) / len(cov), 2) if cov else None
+        w["room_hours_humidity_above_warn"] = w.pop("hours_humidity_above_warn")
+        w["room_hours_humidity_above_alert"] = w.pop("hours_humidity_above_alert")
+        w["room_hours_mould_risk"] = w.pop("hours_mould_risk")
+        out[name] = w
+    return out
+
+def run_once():
+    now = int(datetime.now(timezone.utc).timestamp())
+    cfg = api_get("/api/rooms")
+    rooms = [r for r in cfg.get("rooms") or [] if r.get("enabled", True) and (r.get("id") or "").strip()]
+
+    state, info = update_buckets(load_state(), now)
+    latest = latest_readings([r["id"] for r in rooms])
+
+    # windows are whole hours: the oldest bucket starts at or before now - window
+    hour = now - now % BUCKET_SECS
+    coverage = {name: fetch_coverage(hour - secs, now) for name, secs in WINDOWS.items()}
+    forecast = fetch_forecast()
+    rooms_out = {}
+    for r in rooms:
+        buckets = state["rooms"].get(r["id"], {})
+        item = {"room_id": r["id"], "label": r.get("label") or r["id"], "latest": latest.get(r["id"])}
+        for name, secs in WINDOWS.items():
+            item[name] = window_summary(buckets, hour - secs, now)
+            cov = coverage[name].get(r["id"]) or {}
+            item[name]["coverage_pct"] = cov.get("coverage_pct")
+            item[name]["outage_hours"] = None if cov.get("outage_secs") is None else round(cov["outage_secs"] / 3600.0, 2)
+        item["status"] = room_status(item["last_24h"])
+        item["mould_risk_index"] = state["mould_risk_index"].get(r["id"])
+        fc = forecast.get(r["id"]) or {}
+        item["forecast"] = {"humidity": fc.get("humidity"), "battery": fc.get("battery")}
+        rooms_out[r["id"]] = item
+
+    fleet = fleet_summary(state, rooms_out, hour, now)
+    state["published_version"] = state.get("published_version", 0) + 1
+    out = {
+        "version": state["published_version"],  # increases with every publication
+        "generated_utc": datetime.now(timezone.utc).isoformat().replace("+00:00","Z"),
+        "sampling_interval_minutes": INTERVAL_MINUTES,
+        "thresholds": {"warn_rh": WARN_RH, "alert_rh": ALERT_RH},
+        "primary_room_id": cfg.get("primary_room_id"),
+        "status": fleet["status"],
+        "fleet": fleet,
+        "rooms": rooms_out,
+    }
+
+    write_atomic(OUT_PATH, json.dumps(out, indent=2))
+    save_state(state)
+
+    print(
+        f"[agent] wrote {OUT_PATH} v{out['version']} status={fleet['status']} rooms={len(rooms_out)} "
+        f"({'full rebuild' if info['full'] else 'incremental'}: fetched {info['fetched']} bucket(s) "
+        f"since {info['since']}, holding {info['kept']})",
+        flush=True,
+    )
+
+def open_watch_conn():
+    """
+    Read-only connection used only for readings_mark(). None until the
+    server has created the database.
+    """
+    if not os.path.exists(DB_PATH):
+        return None
+    return sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+
+def readings_mark(conn):
+    """
+    MAX(rowid) of readings: grows with every inserted or replaced reading
+    and ignores the server's other writes (mould index, alert state, ...),
+    which PRAGMA data_version would not. One seek to the end of the table.
+    """
+    return conn.execute("SELECT MAX(rowid) FROM readings").fetchone()[0]
 
 def main():
-    sleep_s = max(10, INTERVAL_MINUTES * 60)
+    """
+    Recompute when new data lands: a change starts a pending run that
+    fires after DEBOUNCE_SECS without further changes (or MAX_DELAY_SECS
+    after the first one), at most once per MIN_INTERVAL_SECS. Without
+    changes the only run is at the hour rollover, when the windows move.
+    """
+    conn = None
+    mark = None
+    first_change = last_change = None
+    last_run = 0.0
+    last_hour = None
+
     while True:
+        now = time.time()
         try:
-            run_once()
-        except Exception as e:
-            print(f"[agent] error: {e}", flush=True)
-        time.sleep(sleep_s)
+            if conn is None:
+                conn = open_watch_conn()
+            if conn is not None:
+                m = readings_mark(conn)
+                if m != mark:
+                    if mark is not None:
+                        first_change = first_change or now
+                        last_change = now
+                    mark = m
+        except sqlite3.Error as e:
+            print(f"[agent] watch error: {e}", flush=True)
+            if conn is not None:
+                conn.close()
+            conn = None
+
+        hour = int(now) // BUCKET_SECS
+        due = last_hour != hour or (
+            first_change is not None
+            and (now - last_change >= DEBOUNCE_SECS or now - first_change >= MAX_DELAY_SECS)
+        )
+        if due and now - last_run >= MIN_INTERVAL_SECS:
+            reason = "changed" if first_change is not None else "hourly"
+            first_change = last_change = None
+            last_run = now
+            last_hour = hour
+            try:
+                run_once()
+            except Exception as e:
+                print(f"[agent] error ({reason} run): {e}", flush=True)
+                last_hour = None  # retry after MIN_INTERVAL_SECS
+
+        time.sleep(POLL_SECS)
 
 if __name__ == "__main__":
     main()
@@ -1,38 +1,32 @@
-import os, time, csv, pathlib, asyncio, struct, binascii
-from datetime import datetime
-from bleak import BleakScanner
-import json
+import os, time, asyncio, binascii
+if os.getenv("BLE_BACKEND", "bleak") == "sim":
+    from ble_sim import BleakScanner  # simulated fleet for load tests (see bench_collectors.py)
+else:
+    from bleak import BleakScanner
+
+from ingest_client import IngestClient
+from room_config import RoomConfigWatcher
+from telemetry import Telemetry
 
-CONFIG_PATH = os.getenv("SETUP_CONFIG_PATH", "/data/config.json")
 FE95 = "0000fe95-0000-1000-8000-00805f9b34fb"
-OUTPUT = os.getenv("OUTPUT", "/data/current.csv")
 INTERVAL = int(os.getenv("INTERVAL_SECONDS", "600"))
 MIN_RSSI = int(os.getenv("MIN_RSSI", "-120"))
-selected_mac = None
-last_cfg_check = 0.0
-CFG_REFRESH_SECS = int(os.getenv("CFG_REFRESH_SECS", "5"))
-
+PUBLISH_MIN_INTERVAL = float(os.getenv("PUBLISH_MIN_INTERVAL_SECS", str(INTERVAL)))  # per-room rate limit
+SCAN_MODE = os.getenv("ADV_SCAN_MODE", "active")
+PRINT_RAW = os.getenv("PRINT_RAW", "0") == "1"
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "/data/adv_outbox.db")  # separate from the GATT collector's spool
 
-last = {"temp_c": None, "humidity_pct": None}
-last_seen = 0.0
-last_written = 0.0
+# room/MAC table, kept current by the watcher task (no file I/O in on_adv)
+rooms = None
 
-def get_selected_mac():
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            cfg = json.load(f) or {}
-        mac = (cfg.get("device_mac") or "").strip().upper()
-        return mac or None
-    except Exception:
-        return None
+# per-MAC advert state
+last_counter = {}    # MiBeacon frame counter of the last frame we used
+latest = {}          # merged temp/humidity (they may arrive in separate frames)
+last_published = {}
 
+ingest = None  # IngestClient, created in main()
+telemetry = Telemetry("adv")  # no scan/connect phases here: RSSI and publishes only
 
-def ensure_csv(p):
-    pp = pathlib.Path(p)
-    pp.parent.mkdir(parents=True, exist_ok=True)
-    if not pp.exists():
-        with pp.open("w", newline="") as f:
-            csv.writer(f).writerow(["timestamp_iso", "epoch", "temp_c", "humidity_pct"])
 
 def parse_and_debug(sd: bytes):
     # MiBeacon (simplified): [fc(2)][devId(1)][cnt(1)][len(1)] + events...
@@ -76,24 +70,12 @@ def parse_and_debug(sd: bytes):
 
 
 def on_adv(d, adv):
-    global last, last_seen
-    global selected_mac, last_cfg_check
-
-    # ---- refresh selected device periodically ----
-    now = time.time()
-    if now - last_cfg_check >= CFG_REFRESH_SECS:
-        selected_mac = get_selected_mac()
-        last_cfg_check = now
-
-    # ---- no device selected yet ----
-    if not selected_mac:
-        return
-
     # ---- ignore other BLE devices early ----
-    if d.address.strip().upper() != selected_mac:
+    mac = d.address.strip().upper()
+    room = rooms.table.by_mac.get(mac)
+    if room is None:
         return
 
-    # ---- existing logic continues ----
     if adv.rssi is not None and adv.rssi < MIN_RSSI:
         return
 
@@ -101,28 +83,57 @@ def on_adv(d, adv):
     if not sd:
         return
 
+    vals, info = parse_and_debug(sd)
+    if PRINT_RAW:
+        print(f"[RAW] room={room['id']} mac={mac} {info}", flush=True)
+    if not vals:
+        return
+
+    # the same frame is re-advertised many times; only use each counter once
+    if last_counter.get(mac) == info["cnt"]:
+        return
+    last_counter[mac] = info["cnt"]
+    telemetry.observe_rssi(room["id"], adv.rssi)
+
+    merged = latest.setdefault(mac, {"temp_c": None, "humidity_pct": None, "battery_mv": None})
+    merged.update(vals)
+    if merged["temp_c"] is None or merged["humidity_pct"] is None:
+        return  # wait until both halves have been seen once
+
+    now = time.time()
+    if now - last_published.get(mac, 0.0) < PUBLISH_MIN_INTERVAL:
+        return
+    last_published[mac] = now
+
+    print(
+        f"[ADV] room={room['id']} mac={mac} rssi={adv.rssi} "
+        f"T={merged['temp_c']}°C H={merged['humidity_pct']}%",
+        flush=True,
+    )
+    ingest.submit(mac, dict(merged))
+    telemetry.poll_result(room["id"], True)
+
+
 async def main():
-    global last_written
-    ensure_csv(OUTPUT)
-    scanner = BleakScanner(detection_callback=on_adv, scanning_mode="active")
+    global ingest, rooms
+    rooms = RoomConfigWatcher()
+    watch_task = asyncio.create_task(rooms.run())
+    print(f"[INFO] watching {len(rooms.table.rooms)} room(s) for MiBeacon adverts", flush=True)
+
+    ingest = IngestClient(outbox_path=OUTBOX_PATH, telemetry=telemetry.summary)
+    await ingest.start()
+    await telemetry.serve(extra=lambda: {"ingest": ingest.stats()})
+    scanner = BleakScanner(detection_callback=on_adv, scanning_mode=SCAN_MODE)
     await scanner.start()
-    print("[INFO] Listening (active scan, debug)…", flush=True)
+    print(f"[INFO] Listening ({SCAN_MODE} scan)…", flush=True)
     try:
         while True:
-            now = time.time()
-            if (now - last_written) >= INTERVAL and last_seen > 0 and (now - last_seen) < (INTERVAL * 3):
-                with open(OUTPUT, "a", newline="") as f:
-                    csv.writer(f).writerow([
-                        datetime.utcfromtimestamp(now).isoformat() + "Z",
-                        f"{now:.0f}",
-                        f"{last.get('temp_c'):.2f}" if last.get('temp_c') is not None else "",
-                        f"{last.get('humidity_pct'):.2f}" if last.get('humidity_pct') is not None else "",
-                    ])
-                last_written = now
-                print(f"[LOG] wrote CSV at {datetime.fromtimestamp(now)}", flush=True)
-            await asyncio.sleep(1)
+            await asyncio.sleep(3600)
     finally:
         await scanner.stop()
+        watch_task.cancel()
+        await telemetry.close()
+        await ingest.close()
 
 if __name__ == "__main__":
     try:
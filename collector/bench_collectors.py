@@ -0,0 +1,207 @@
+"""
+Load test for the collectors against the BLE simulator (ble_sim.py).
+
+Starts a stand-in for the server's POST /api/ingest/batch, writes a
+config with one room per simulated device, runs gatt_collector.py or
+adv_collector.py as a subprocess with BLE_BACKEND=sim, and reports
+cycle time, readings/sec and ingest lag.
+
+    python bench_collectors.py gatt --rooms 200 --interval 60 --duration 180
+    python bench_collectors.py adv --rooms 500 --env SIM_ADV_INTERVAL=0.5
+"""
+import os, re, sys, json, time, signal, random, asyncio, argparse, tempfile
+
+from aiohttp import web
+
+from ble_sim import sim_macs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+METRIC_RE = re.compile(r"(\w+)=([-\d.]+)")
+
+
+def pct(values, p):
+    if not values:
+        return None
+    s = sorted(values)
+    return round(s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))], 2)
+
+
+class StandInServer:
+    """
+    Accepts ingest batches like the real server and records what arrived.
+    """
+
+    def __init__(self, rooms_by_mac: dict, latency: float = 0.0, fail: float = 0.0):
+        self.rooms_by_mac = rooms_by_mac
+        self.latency = latency
+        self.fail = fail
+        self.readings = 0
+        self.batches = 0
+        self.failed = 0
+        self.lags = []
+        self.rooms_seen = set()
+        self.telemetry = None
+
+    async def ingest_batch(self, request):
+        body = await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.fail:
+            self.failed += 1
+            return web.json_response({"detail": "simulated failure"}, status=503)
+
+        now = time.time()
+        results = []
+        for r in body.get("readings") or []:
+            room_id = self.rooms_by_mac.get((r.get("mac") or "").upper())
+            if room_id is None:
+                results.append({"ok": False, "mac": r.get("mac"), "epoch": r.get("epoch"), "error": "MAC not mapped to any enabled room"})
+                continue
+            self.rooms_seen.add(room_id)
+            self.lags.append(now - r["epoch"])
+            results.append({"ok": True, "mac": r["mac"], "epoch": r["epoch"], "room_id": room_id})
+
+        accepted = sum(1 for r in results if r["ok"])
+        self.readings += accepted
+        self.batches += 1
+        self.telemetry = body.get("telemetry") or self.telemetry
+        return web.json_response({"ok": True, "accepted": accepted, "rejected": len(results) - accepted, "results": results})
+
+    async def start(self, port: int) -> int:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/api/ingest/batch", self.ingest_batch)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+async def run(args) -> dict:
+    macs = sim_macs(args.rooms)
+    rooms = [{"id": f"sim{i:04d}", "label": f"Sim {i}", "mac": mac, "name": "LYWSD03MMC", "enabled": True}
+             for i, mac in enumerate(macs)]
+    server = StandInServer({r["mac"]: r["id"] for r in rooms}, args.server_latency, args.server_fail)
+    port = await server.start(args.port)
+
+    with tempfile.TemporaryDirectory(prefix="hygro-bench-") as tmp:
+        cfg_path = os.path.join(tmp, "config.json")
+        with open(cfg_path, "w", encoding="utf-8") as f:
+            json.dump({"schema_version": 2, "rooms": rooms}, f)
+
+        env = dict(os.environ)
+        env.update({
+            "BLE_BACKEND": "sim",
+            "SIM_DEVICES": str(args.rooms),
+            "SETUP_CONFIG_PATH": cfg_path,
+            "API_BASE_URL": f"http://127.0.0.1:{port}",
+            "INTERVAL_SECONDS": str(args.interval),
+            "OUTPUT": os.path.join(tmp, "current.csv"),
+            "OUTBOX_PATH": os.path.join(tmp, "outbox.db"),
+            "COLLECTOR_STATUS_PATH": os.path.join(tmp, "collector_status.json"),
+            "TELEMETRY_PORT": "0",
+            "PYTHONUNBUFFERED": "1",
+        })
+        for kv in args.env:
+            k, _, v = kv.partition("=")
+            env[k] = v
+
+        script = os.path.join(HERE, f"{args.collector}_collector.py")
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, script, cwd=HERE, env=env,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        )
+
+        cycles, cycle_rooms, cycle_ok, discovery, warns = [], 0, 0, [], 0
+
+        async def read_output():
+            nonlocal cycle_rooms, cycle_ok, warns
+            async for raw in proc.stdout:
+                line = raw.decode(errors="replace").rstrip()
+                if args.verbose:
+                    print(f"  | {line}", flush=True)
+                if line.startswith("[WARN]"):
+                    warns += 1
+                if not line.startswith("[METRIC]"):
+                    continue
+                m = dict(METRIC_RE.findall(line))
+                if "cycle_duration_secs" in m:
+                    cycles.append(float(m["cycle_duration_secs"]))
+                    cycle_rooms += int(m.get("rooms", 0))
+                    cycle_ok += int(m.get("ok", 0))
+                elif "discovery_secs" in m:
+                    discovery.append(float(m["discovery_secs"]))
+
+        reader = asyncio.create_task(read_output())
+        t0 = time.time()
+        print(f"[INFO] {args.collector}: {args.rooms} simulated room(s) for {args.duration:.0f}s …", flush=True)
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=args.duration)
+            print(f"[WARN] collector exited early with code {proc.returncode}", flush=True)
+        except asyncio.TimeoutError:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                proc.kill()
+        elapsed = time.time() - t0
+        await reader
+
+    await server.stop()
+
+    tel_rooms = (server.telemetry or {}).get("rooms") or {}
+    polls = sum(r.get("polls") or 0 for r in tel_rooms.values())
+    ok = sum(r.get("ok") or 0 for r in tel_rooms.values())
+    return {
+        "collector": args.collector,
+        "rooms": args.rooms,
+        "duration_secs": round(elapsed, 1),
+        "readings": server.readings,
+        "readings_per_sec": round(server.readings / elapsed, 2) if elapsed else None,
+        "rooms_reporting": len(server.rooms_seen),
+        "batches": server.batches,
+        "failed_batches": server.failed,
+        "mean_batch": round(server.readings / server.batches, 1) if server.batches else None,
+        "ingest_lag_p50": pct(server.lags, 50),
+        "ingest_lag_p90": pct(server.lags, 90),
+        "cycles": len(cycles),
+        "cycle_secs_mean": round(sum(cycles) / len(cycles), 2) if cycles else None,
+        "cycle_secs_p90": pct(cycles, 90),
+        "cycle_secs_max": max(cycles) if cycles else None,
+        "rooms_polled": cycle_rooms,
+        "rooms_ok": cycle_ok,
+        "rooms_polled_per_sec": round(cycle_rooms / sum(cycles), 2) if cycles and sum(cycles) else None,
+        "discovery_secs_p50": pct(discovery, 50),
+        "poll_success_rate": round(ok / polls, 3) if polls else None,
+        "warnings": warns,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("collector", choices=["gatt", "adv"])
+    ap.add_argument("--rooms", type=int, default=100)
+    ap.add_argument("--duration", type=float, default=120, help="seconds to run the collector")
+    ap.add_argument("--interval", type=int, default=60, help="INTERVAL_SECONDS for the collector")
+    ap.add_argument("--server-latency", type=float, default=0.0, help="added per ingest request (s)")
+    ap.add_argument("--server-fail", type=float, default=0.0, help="probability of a 503 per batch")
+    ap.add_argument("--port", type=int, default=0, help="stand-in server port (0 = any free port)")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra collector/simulator setting, e.g. SIM_CONNECT_FAIL=0.2 (repeatable)")
+    ap.add_argument("--json", action="store_true", help="print the result as JSON")
+    ap.add_argument("-v", "--verbose", action="store_true", help="echo collector output")
+    args = ap.parse_args()
+
+    res = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(res, indent=2))
+        return
+    for k, v in res.items():
+        print(f"{k:>22}: {'—' if v is None else v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Fake bleak backend: hundreds of simulated LYWSD03MMC-style hygrometers.
+
+Drop-in for the two bleak classes the collectors use. Select it with
+BLE_BACKEND=sim. Devices advertise MiBeacon (FE95) frames and, once
+connected, send notify payloads in parse_notify() format. Payloads are
+synthetic unless SIM_RECORDING points at a JSON-lines file of recorded
+ones: {"kind": "notify" | "adv", "hex": "..."} per line.
+"""
+import os, json, time, heapq, random, asyncio
+
+SIM_DEVICES        = int(os.getenv("SIM_DEVICES", "100"))
+SIM_MAC_PREFIX     = os.getenv("SIM_MAC_PREFIX", "C0:FF:EE")
+SIM_SEED           = int(os.getenv("SIM_SEED", "1"))
+SIM_RECORDING      = os.getenv("SIM_RECORDING", "")
+SIM_ADV_INTERVAL   = float(os.getenv("SIM_ADV_INTERVAL", "1.0"))     # secs between adverts per device
+SIM_NOTIFY_INTERVAL= float(os.getenv("SIM_NOTIFY_INTERVAL", "6.0"))  # secs between notifies while connected
+SIM_RSSI           = os.getenv("SIM_RSSI", "-95,-55")                # min,max
+
+# latency ranges (uniform, secs) and failure injection (probabilities)
+SIM_CONNECT_LATENCY = os.getenv("SIM_CONNECT_LATENCY", "0.2,1.5")
+SIM_NOTIFY_LATENCY  = os.getenv("SIM_NOTIFY_LATENCY", "0.5,3.0")     # connect -> first notify
+SIM_ABSENT          = float(os.getenv("SIM_ABSENT", "0.0"))          # device never advertises
+SIM_CONNECT_FAIL    = float(os.getenv("SIM_CONNECT_FAIL", "0.05"))
+SIM_NOTIFY_FAIL     = float(os.getenv("SIM_NOTIFY_FAIL", "0.02"))    # connected but silent
+SIM_DROP_AFTER      = float(os.getenv("SIM_DROP_AFTER", "0"))        # mean secs until a link drops; 0 = never
+
+
+class BleakError(Exception):
+    pass
+
+
+def _range(spec: str):
+    lo, _, hi = spec.partition(",")
+    lo = float(lo)
+    return lo, float(hi) if hi else lo
+
+
+def sim_macs(n: int = SIM_DEVICES, prefix: str = SIM_MAC_PREFIX):
+    return [f"{prefix}:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}" for i in range(n)]
+
+
+def _load_recording(path: str):
+    out = {"notify": [], "adv": []}
+    if not path:
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            out.setdefault(rec["kind"], []).append(bytes.fromhex(rec["hex"]))
+    return out
+
+
+class SimDevice:
+    """
+    One simulated hygrometer: a slow temperature/humidity random walk and
+    a MiBeacon frame counter.
+    """
+
+    def __init__(self, idx: int, mac: str, rng: random.Random, recording: dict):
+        self.idx = idx
+        self.address = mac
+        self.name = "LYWSD03MMC"
+        self.details = None
+        self.rng = rng
+        self.recording = recording
+        self.present = rng.random() >= SIM_ABSENT
+        self.rssi_base = rng.uniform(*_range(SIM_RSSI))
+        self.temp_c = rng.uniform(17, 25)
+        self.humidity = rng.uniform(40, 70)
+        self.battery_mv = rng.randint(2600, 3100)
+        self.counter = rng.randint(0, 255)
+        self.n_notify = 0
+        self.n_adv = 0
+
+    def _step(self):
+        self.temp_c = min(35.0, max(5.0, self.temp_c + self.rng.gauss(0, 0.05)))
+        self.humidity = min(99.0, max(10.0, self.humidity + self.rng.gauss(0, 0.2)))
+
+    def rssi(self) -> int:
+        return int(self.rssi_base + self.rng.gauss(0, 3))
+
+    def notify_payload(self) -> bytes:
+        rec = self.recording.get("notify")
+        if rec:
+            self.n_notify += 1
+            return rec[(self.idx + self.n_notify) % len(rec)]
+        self._step()
+        # parse_notify(): temp int16 LE /100, humidity byte, battery uint16 LE
+        return (
+            int(round(self.temp_c * 100)).to_bytes(2, "little", signed=True)
+            + bytes([int(round(self.humidity))])
+            + self.battery_mv.to_bytes(2, "little")
+        )
+
+    def adv_service_data(self) -> bytes:
+        rec = self.recording.get("adv")
+        if rec:
+            self.n_adv += 1
+            return rec[(self.idx + self.n_adv) % len(rec)]
+        self._step()
+        # new frame every ~10 adverts, re-advertised in between (like the real sensor)
+        self.n_adv += 1
+        if self.n_adv % 10 == 0:
+            self.counter = (self.counter + 1) & 0xFF
+        payload = (
+            int(round(self.temp_c * 100)).to_bytes(2, "little", signed=True)
+            + int(round(self.humidity * 100)).to_bytes(2, "little")
+        )
+        # [fc(2)][devId(1)][cnt(1)][len(1)] + event 0x100D (temp + humidity)
+        return (
+            (0x5020).to_bytes(2, "little") + bytes([0x5B, self.counter, len(payload) + 3])
+            + (0x100D).to_bytes(2, "little") + bytes([len(payload)]) + payload
+        )
+
+
+class SimAdvertisement:
+    def __init__(self, rssi: int, service_data: dict, local_name: str):
+        self.rssi = rssi
+        self.service_data = service_data
+        self.local_name = local_name
+        self.manufacturer_data = {}
+        self.service_uuids = list(service_data)
+
+
+_fleet = None
+
+
+def fleet() -> dict:
+    """
+    mac -> SimDevice, built once per process from the SIM_* settings.
+    """
+    global _fleet
+    if _fleet is None:
+        rng = random.Random(SIM_SEED)
+        recording = _load_recording(SIM_RECORDING)
+        _fleet = {mac: SimDevice(i, mac, rng, recording) for i, mac in enumerate(sim_macs())}
+    return _fleet
+
+
+FE95 = "0000fe95-0000-1000-8000-00805f9b34fb"
+
+
+class BleakScanner:
+    """
+    Every present device advertises once per SIM_ADV_INTERVAL (random
+    phase). One task drives the whole fleet from a heap of due times.
+    """
+
+    def __init__(self, detection_callback=None, adapter=None, scanning_mode="active", **_kw):
+        self.callback = detection_callback
+        self.adapter = adapter
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _run(self):
+        devices = [d for d in fleet().values() if d.present]
+        rng = random.Random()
+        now = time.monotonic()
+        due = [(now + rng.uniform(0, SIM_ADV_INTERVAL), i) for i in range(len(devices))]
+        heapq.heapify(due)
+        while due:
+            t, i = due[0]
+            delay = t - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            heapq.heapreplace(due, (t + SIM_ADV_INTERVAL, i))
+            dev = devices[i]
+            if self.callback is not None:
+                self.callback(dev, SimAdvertisement(dev.rssi(), {FE95: dev.adv_service_data()}, dev.name))
+
+
+class BleakClient:
+    """
+    Connect/notify with injected latency and failures. Accepts a device
+    from the scanner or a MAC string, like bleak.
+    """
+
+    def __init__(self, address_or_device, timeout: float = 10.0, disconnected_callback=None, adapter=None, **_kw):
+        mac = getattr(address_or_device, "address", address_or_device)
+        self.address = str(mac).upper()
+        self.timeout = timeout
+        self.disconnected_callback = disconnected_callback
+        self.device = fleet().get(self.address)
+        self.is_connected = False
+        self.tasks = {}
+        self.drop_task = None
+
+    async def connect(self):
+        lat = random.uniform(*_range(SIM_CONNECT_LATENCY))
+        if lat > self.timeout:
+            await asyncio.sleep(self.timeout)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(lat)
+        if self.device is None or not self.device.present:
+            raise BleakError(f"Device with address {self.address} was not found.")
+        if random.random() < SIM_CONNECT_FAIL:
+            raise BleakError("simulated connection failure")
+        self.is_connected = True
+        if SIM_DROP_AFTER > 0:
+            self.drop_task = asyncio.create_task(self._drop(random.expovariate(1 / SIM_DROP_AFTER)))
+        return True
+
+    async def disconnect(self):
+        for t in list(self.tasks.values()) + ([self.drop_task] if self.drop_task else []):
+            t.cancel()
+        self.tasks = {}
+        self.drop_task = None
+        self.is_connected = False
+        return True
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+    async def start_notify(self, uuid, callback):
+        if not self.is_connected:
+            raise BleakError("Not connected")
+        silent = random.random() < SIM_NOTIFY_FAIL
+        self.tasks[uuid] = asyncio.create_task(self._notify(callback, silent))
+
+    async def stop_notify(self, uuid):
+        t = self.tasks.pop(uuid, None)
+        if t is not None:
+            t.cancel()
+
+    async def _notify(self, callback, silent: bool):
+        await asyncio.sleep(random.uniform(*_range(SIM_NOTIFY_LATENCY)))
+        while not silent:
+            callback(0x36, bytearray(self.device.notify_payload()))
+            await asyncio.sleep(SIM_NOTIFY_INTERVAL)
+
+    async def _drop(self, after: float):
+        await asyncio.sleep(after)
+        self.drop_task = None
+        await self.disconnect()
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
@@ -1,10 +1,15 @@
-import os, csv, time, asyncio, pathlib, struct
+import os, csv, time, asyncio, pathlib, struct, random
 from datetime import datetime
-from bleak import BleakClient, BleakScanner
-import urllib.request
-import urllib.error
+if os.getenv("BLE_BACKEND", "bleak") == "sim":
+    from ble_sim import BleakClient, BleakScanner  # simulated fleet for load tests (see bench_collectors.py)
+else:
+    from bleak import BleakClient, BleakScanner
 import traceback
 
+from ingest_client import IngestClient
+from room_config import RoomConfigWatcher
+from telemetry import Telemetry
+
 import json
 
 CONFIG_PATH = os.getenv("SETUP_CONFIG_PATH", "/data/config.json")
@@ -14,15 +19,31 @@ NOTIFY_UUID = "ebe0ccc1-7a0a-4b0c-8a1a-6ff2997da3a6"
 # DEVICE_MAC = None  # will be loaded from config
 OUTPUT      = os.getenv("OUTPUT","/data/current.csv")
 INTERVAL    = int(os.getenv("INTERVAL_SECONDS","600"))
-API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8081")
 
 # connection behavior
 SCAN_TIMEOUT       = float(os.getenv("SCAN_TIMEOUT","25"))   # seconds to wait for adverts
 CONNECT_TIMEOUT    = float(os.getenv("CONNECT_TIMEOUT","15"))
 NOTIFY_WINDOW_SECS = int(os.getenv("NOTIFY_WINDOW_SECS","60"))  # time to stay connected (persistent mode ignores)
-IDLE_BETWEEN_CYCLES= int(os.getenv("IDLE_BETWEEN_CYCLES","8"))  # base sleep if nothing to write
 PERSISTENT_NOTIFY  = os.getenv("PERSISTENT_NOTIFY","0") == "1"  # keep connection open and stream
 MAX_BACKOFF        = int(os.getenv("MAX_BACKOFF","60"))  # cap backoff
+PUBLISH_MIN_INTERVAL = float(os.getenv("PUBLISH_MIN_INTERVAL_SECS", str(INTERVAL)))  # persistent mode: per-room rate limit
+ROOMS_REFRESH_SECS = int(os.getenv("ROOMS_REFRESH_SECS","30"))  # persistent mode: dead stream check interval
+
+# multi-room polling
+BLE_ADAPTERS        = [a.strip() for a in os.getenv("BLE_ADAPTERS","hci0").split(",") if a.strip()]
+MAX_CONN_PER_ADAPTER= int(os.getenv("MAX_CONN_PER_ADAPTER","3"))  # simultaneous connections per adapter
+# persistent mode: subscriptions held open per adapter (at most MAX_CONN_PER_ADAPTER); the
+# default keeps one connection free so rooms beyond the limit can still be polled in turn
+MAX_STREAMS_PER_ADAPTER = int(os.getenv("MAX_STREAMS_PER_ADAPTER", str(max(1, MAX_CONN_PER_ADAPTER - 1))))
+ROOM_RETRIES        = int(os.getenv("ROOM_RETRIES","1"))
+ROOM_RETRY_DELAY    = float(os.getenv("ROOM_RETRY_DELAY_SECS","3"))
+BETWEEN_ROOMS_SECS  = float(os.getenv("BETWEEN_ROOMS_SECS","2"))  # settle time before an adapter slot is reused
+
+# per-room scheduling
+SCHED_JITTER_FRAC   = float(os.getenv("SCHED_JITTER_FRAC","0.1"))    # +/- fraction of INTERVAL added to each due time
+ROOM_BACKOFF_BASE   = float(os.getenv("ROOM_BACKOFF_BASE_SECS","60"))  # first retry delay for a failing room (never below INTERVAL)
+ROOM_BACKOFF_MAX    = float(os.getenv("ROOM_BACKOFF_MAX_SECS","3600"))  # cap for a failing room
+STATUS_PATH         = os.getenv("COLLECTOR_STATUS_PATH","/data/collector_status.json")
 
 # parsing/scaling
 HUMIDITY_SCALE     = float(os.getenv("HUMIDITY_SCALE","1.70"))  # your unit: byte * 1.70 ≈ display %RH
@@ -30,8 +51,18 @@ PRINT_RAW          = os.getenv("PRINT_RAW","0") == "1"          # set to 1 if yo
 
 VERSION = "gatt-robust v1"
 
-last = {"temp_c":None, "humidity_pct":None, "battery_mv":None}
-last_written = 0.0
+# per-room retry/health state, keyed by MAC (survives across cycles)
+room_state = {}
+adapter_slots = {}
+stream_slots = {}
+discovery_locks = {}
+
+ingest = None  # IngestClient, created in main()
+room_watcher = None  # RoomConfigWatcher, created in main()
+telemetry = Telemetry("gatt")
+
+# filled by the per-cycle discovery pass: mac -> {"device", "rssi", "last_seen", "adapter", "scan_secs"}
+device_cache = {}
 
 
 # def get_selected_mac():
@@ -61,47 +92,6 @@ last_written = 0.0
 
 
 
-def get_enabled_rooms():
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            cfg = json.load(f) or {}
-
-        rooms = []
-
-        # v2 config
-        if cfg.get("schema_version") == 2 and isinstance(cfg.get("rooms"), list):
-            for r in cfg["rooms"]:
-                if not r.get("enabled", True):
-                    continue
-
-                mac = (r.get("mac") or "").strip().upper()
-                if not mac:
-                    continue
-
-                rooms.append({
-                    "id": (r.get("id") or "").strip(),
-                    "label": (r.get("label") or "").strip() or (r.get("id") or "").strip(),
-                    "mac": mac,
-                    "name": r.get("name"),
-                })
-
-            return rooms
-
-        # v1 fallback
-        mac = (cfg.get("device_mac") or "").strip().upper()
-        if mac:
-            return [{
-                "id": "default",
-                "label": "Default",
-                "mac": mac,
-                "name": cfg.get("device_name"),
-            }]
-
-        return []
-
-    except Exception:
-        return []
-    
 def ensure_csv(path):
     p = pathlib.Path(path)
     p.parent.mkdir(parents=True, exist_ok=True)
@@ -152,15 +142,82 @@ async def wait_one_notification(client, timeout_s):
         await client.stop_notify(NOTIFY_UUID)
     return vals
 
-async def connect_once(mac: str):
+async def discover_devices(macs: set, adapter: str = None) -> set:
     """
-    Scan to find one device by MAC, then connect.
+    One scan for all wanted MACs on an adapter. Stops as soon as every MAC
+    has advertised, else after SCAN_TIMEOUT. Results land in device_cache;
+    returns the MACs seen in this pass.
     """
-    dev = await BleakScanner.find_device_by_address(mac, timeout=SCAN_TIMEOUT)
-    if dev is None:
-        raise RuntimeError(f"{mac}: device not advertising (scan timed out)")
+    pending = set(macs)
+    all_seen = asyncio.Event()
+    if not pending:
+        return set()
+    t0 = time.monotonic()
+
+    def on_adv(d, adv):
+        mac = (d.address or "").strip().upper()
+        if mac not in pending:
+            return
+        device_cache[mac] = {
+            "device": d,
+            "rssi": adv.rssi,
+            "last_seen": time.time(),
+            "adapter": adapter,
+            "scan_secs": time.monotonic() - t0,
+        }
+        pending.discard(mac)
+        if not pending:
+            all_seen.set()
+
+    kw = {"adapter": adapter} if adapter else {}
+    scanner = BleakScanner(detection_callback=on_adv, **kw)
+    await scanner.start()
+    try:
+        await asyncio.wait_for(all_seen.wait(), timeout=SCAN_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await scanner.stop()
+
+    return set(macs) - pending
 
-    client = BleakClient(dev, timeout=CONNECT_TIMEOUT)
+async def discover_rooms(rooms: list) -> set:
+    """
+    Shared discovery for a cycle: one scanner per adapter, run in parallel.
+    """
+    by_adapter = {}
+    for room in rooms:
+        by_adapter.setdefault(room["adapter"], set()).add(room["mac"])
+
+    t0 = time.monotonic()
+    results = await asyncio.gather(*(discover_devices(macs, adapter) for adapter, macs in by_adapter.items()))
+    seen = set().union(*results) if results else set()
+
+    for room in rooms:
+        entry = device_cache.get(room["mac"]) if room["mac"] in seen else None
+        if entry:
+            telemetry.observe(room["id"], "scan", entry["scan_secs"])
+            telemetry.observe_rssi(room["id"], entry["rssi"])
+        print(
+            f"[SCAN] room={room['id']} mac={room['mac']} "
+            + (f"seen rssi={entry['rssi']}" if entry else "absent"),
+            flush=True
+        )
+    print(f"[METRIC] discovery_secs={time.monotonic() - t0:.1f} seen={len(seen)}/{len(rooms)}", flush=True)
+    return seen
+
+async def connect_once(mac: str, adapter: str = None, disconnected_callback=None):
+    """
+    Connect to a device found by the discovery pass (no per-device scan).
+    """
+    entry = device_cache.get(mac)
+    if entry is None:
+        raise RuntimeError(f"{mac}: not seen by discovery")
+
+    kw = {"adapter": adapter} if adapter else {}
+    client = BleakClient(
+        entry["device"], timeout=CONNECT_TIMEOUT, disconnected_callback=disconnected_callback, **kw
+    )
     await client.__aenter__()
     return client
 
@@ -174,10 +231,15 @@ async def poll_one_room(room: dict):
     client = None
 
     try:
-        client = await connect_once(mac)
+        t0 = time.monotonic()
+        client = await connect_once(mac, room.get("adapter"))
+        telemetry.observe(room_id, "connect", time.monotonic() - t0)
         print(f"[INFO] connected to room={room_id} mac={mac}", flush=True)
 
+        t0 = time.monotonic()
         vals = await wait_one_notification(client, timeout_s=NOTIFY_WINDOW_SECS)
+        if vals["temp_c"] is not None and vals["humidity_pct"] is not None:
+            telemetry.observe(room_id, "first_notify", time.monotonic() - t0)
 
         t = vals.get("temp_c")
         h = vals.get("humidity_pct")
@@ -204,6 +266,7 @@ async def poll_one_room(room: dict):
             
 async def poll_one_room_with_retry(room: dict, retries: int = 1, retry_delay: float = 3.0):
     last_exc = None
+    state = room_state.setdefault(room["mac"], {"failures": 0, "last_ok": None, "last_error": None})
 
     for attempt in range(retries + 1):
         try:
@@ -212,10 +275,17 @@ async def poll_one_room_with_retry(room: dict, retries: int = 1, retry_delay: fl
                 f"attempt={attempt + 1}/{retries + 1}",
                 flush=True
             )
-            return await poll_one_room(room)
+            vals = await poll_one_room(room)
+            telemetry.poll_result(room["id"], True)
+            state["failures"] = 0
+            state["last_ok"] = time.time()
+            state["last_error"] = None
+            return vals
 
         except Exception as e:
             last_exc = e
+            state["last_error"] = f"{type(e).__name__}: {e}"
+            telemetry.poll_result(room["id"], False, state["last_error"])
             print(
                 f"[WARN] poll attempt failed for room={room['id']} mac={room['mac']} "
                 f"attempt={attempt + 1}/{retries + 1}: type={type(e).__name__} repr={e!r}",
@@ -226,190 +296,357 @@ async def poll_one_room_with_retry(room: dict, retries: int = 1, retry_delay: fl
             if attempt < retries:
                 await asyncio.sleep(retry_delay)
 
+    state["failures"] += 1
     raise last_exc
-            
-def post_reading_to_api(mac: str, vals: dict):
-    t = vals.get("temp_c")
-    h = vals.get("humidity_pct")
-    mv = vals.get("battery_mv")
-
-    # do not send empty readings
-    if t is None and h is None and mv is None:
-        print(f"[INFO] skip ingest for mac={mac}: empty reading", flush=True)
-        return False
-
-    now = time.time()
-    payload = {
-        "mac": mac,
-        "ts_utc": datetime.utcfromtimestamp(now).isoformat() + "Z",
-        "epoch": int(now),
-        "temp_c": t,
-        "humidity_pct": h,
-        "battery_mv": mv,
-    }
-
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url=f"{API_BASE_URL}/api/ingest/reading",
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
 
-    try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-            print(f"[INGEST] mac={mac} status={resp.status} response={raw}", flush=True)
-            return True
-    except urllib.error.HTTPError as e:
-        err_body = e.read().decode("utf-8", errors="replace")
-        print(f"[WARN] ingest HTTP error for mac={mac}: {e.code} {err_body}", flush=True)
-        return False
-    except Exception as e:
-        print(f"[WARN] ingest failed for mac={mac}: {e}", flush=True)
-        return False
+def assign_adapter(room: dict, idx: int) -> str:
+    """
+    Use the room's configured adapter if any, else spread rooms round-robin.
+    """
+    return room.get("adapter") or BLE_ADAPTERS[idx % len(BLE_ADAPTERS)]
 
-async def persistent_stream():
+def discovery_lock(adapter: str) -> asyncio.Lock:
     """
-    Stay connected and stream notifications; reconnect on disconnect.
+    BlueZ allows one discovery session per adapter; serialise scans.
     """
-    backoff = 1
-    while True:
-        try:
-            client = await connect_once()
-            print(f"[INFO] connected (persistent) to {DEVICE_MAC}", flush=True)
-            backoff = 1  # reset backoff on success
-            await client.start_notify(NOTIFY_UUID, lambda *_: None)  # start stream
-
-            # inner loop: read for a long time; write when INTERVAL elapsed
-            global last, last_written
-            t0 = time.time()
-            def cb(_h, data: bytes):
-                global last
-                if PRINT_RAW:
-                    print(f"[RAW] {data.hex()}", flush=True)
-                t, h, mv = parse_notify(data)
-                if t is not None: last["temp_c"] = t
-                if h is not None: last["humidity_pct"] = h
-                if mv is not None: last["battery_mv"] = mv
-                print(f"[GATT] {DEVICE_MAC} -> T={last['temp_c']:.2f}°C H={last['humidity_pct']:.2f}% "
-                      f"(batt={last['battery_mv']}mV)", flush=True)
-
-            await client.stop_notify(NOTIFY_UUID)  # restart with our cb
-            await client.start_notify(NOTIFY_UUID, cb)
-
-            while True:
-                now = time.time()
-                if (now - last_written) >= INTERVAL and (last["temp_c"] is not None or last["humidity_pct"] is not None):
-                    with open(OUTPUT,"a",newline="") as f:
-                        csv.writer(f).writerow([
-                            datetime.utcfromtimestamp(now).isoformat()+"Z",
-                            f"{int(now)}",
-                            f"{last['temp_c']:.2f}" if last['temp_c'] is not None else "",
-                            f"{last['humidity_pct']:.2f}" if last['humidity_pct'] is not None else "",
-                            f"{last['battery_mv']}" if last['battery_mv'] is not None else "",
-                        ])
-                    last_written = now
-                    print(f"[LOG] wrote CSV at {datetime.fromtimestamp(now)}", flush=True)
-                await asyncio.sleep(1)
+    lock = discovery_locks.get(adapter)
+    if lock is None:
+        lock = discovery_locks[adapter] = asyncio.Lock()
+    return lock
+
+def adapter_slot(adapter: str) -> asyncio.Semaphore:
+    sem = adapter_slots.get(adapter)
+    if sem is None:
+        sem = adapter_slots[adapter] = asyncio.Semaphore(max(1, MAX_CONN_PER_ADAPTER))
+    return sem
+
+def stream_slot(adapter: str) -> asyncio.Semaphore:
+    """
+    Persistent mode: held for the whole life of a subscription, alongside
+    the adapter slot its connection occupies.
+    """
+    sem = stream_slots.get(adapter)
+    if sem is None:
+        limit = max(1, min(MAX_STREAMS_PER_ADAPTER, MAX_CONN_PER_ADAPTER))
+        sem = stream_slots[adapter] = asyncio.Semaphore(limit)
+    return sem
 
+async def poll_and_ingest(room: dict, seen: set):
+    """
+    One room's share of a cycle: wait for a free slot on its adapter, poll
+    (with its own retries), post the reading. Rooms that did not advertise
+    during discovery are skipped without taking a slot.
+    """
+    if room["mac"] not in seen:
+        state = room_state.setdefault(room["mac"], {"failures": 0, "last_ok": None, "last_error": None})
+        state["failures"] += 1
+        state["last_error"] = "not seen by discovery"
+        telemetry.not_seen(room["id"])
+        print(
+            f"[WARN] room={room['id']} mac={room['mac']} skipped: not advertising "
+            f"(consecutive={state['failures']})",
+            flush=True
+        )
+        return
+
+    async with adapter_slot(room["adapter"]):
+        try:
+            vals = await poll_one_room_with_retry(room, retries=ROOM_RETRIES, retry_delay=ROOM_RETRY_DELAY)
+            ingest.submit(room["mac"], vals)
         except Exception as e:
-            print(f"[WARN] persistent stream error: {e}", flush=True)
-            # backoff to avoid hammering when asleep
-            await asyncio.sleep(min(backoff, MAX_BACKOFF))
-            backoff = min(backoff * 2, MAX_BACKOFF)
+            print(
+                f"[WARN] room={room['id']} mac={room['mac']} failed "
+                f"(consecutive={room_state.get(room['mac'], {}).get('failures')}): "
+                f"type={type(e).__name__} repr={e!r}",
+                flush=True
+            )
         finally:
-            try:
-                # if we have a client, ensure proper exit
-                await client.__aexit__(None, None, None)  # noqa
-            except Exception:
-                pass
-
-async def periodic_poll():
+            # let BlueZ settle before this adapter slot takes the next room
+            await asyncio.sleep(BETWEEN_ROOMS_SECS)
+            
+async def stream_room(room: dict):
     """
-    Connect, wait for one notify (or a short window), disconnect, sleep, repeat.
+    Hold one notify subscription for a room. Reconnects with per-device
+    exponential backoff; publishes at most one reading per
+    PUBLISH_MIN_INTERVAL seconds.
+
+    The subscription holds a stream slot and an adapter slot until it
+    drops. While every stream slot on the adapter is taken, the room is
+    polled once per PUBLISH_MIN_INTERVAL instead, queueing for an adapter
+    slot like the polling loop does.
     """
-    ensure_csv(OUTPUT)
-    print(f"[INFO] {VERSION}  MAC={DEVICE_MAC}", flush=True)
-    global last, last_written
+    mac = room["mac"]
+    room_id = room.get("id") or "unknown"
+    adapter = room.get("adapter")
     backoff = 1
+    last_published = 0.0
+    loop = asyncio.get_running_loop()
 
     while True:
+        client = None
         try:
-            client = await connect_once()
-            print(f"[INFO] connected to {DEVICE_MAC}", flush=True)
-            backoff = 1  # reset backoff on success
-            vals = await wait_one_notification(client, timeout_s=NOTIFY_WINDOW_SECS)
-            await client.__aexit__(None, None, None)
-
-            t, h, mv = vals.get("temp_c"), vals.get("humidity_pct"), vals.get("battery_mv")
-            if t is not None or h is not None:
-                last.update(vals)
-                print(f"[GATT] {DEVICE_MAC} -> "
-                      f"{('T=%.2f°C ' % t) if t is not None else ''}"
-                      f"{('H=%.2f%% ' % h) if h is not None else ''}"
-                      f"{('(batt=%dmV)' % mv) if mv is not None else ''}",
-                      flush=True)
-
+            # refresh the device handle if we have none or it went stale
+            entry = device_cache.get(mac)
+            if entry is None or time.time() - entry["last_seen"] > SCAN_TIMEOUT + INTERVAL:
+                async with discovery_lock(adapter):
+                    if mac not in await discover_devices({mac}, adapter):
+                        telemetry.not_seen(room_id)
+                        raise RuntimeError(f"{mac}: not advertising")
+                telemetry.observe(room_id, "scan", device_cache[mac]["scan_secs"])
+                telemetry.observe_rssi(room_id, device_cache[mac]["rssi"])
+
+            streams = stream_slot(adapter)
+            if streams.locked():
+                async with adapter_slot(adapter):
+                    try:
+                        vals = await poll_one_room_with_retry(room, retries=ROOM_RETRIES, retry_delay=ROOM_RETRY_DELAY)
+                    finally:
+                        await asyncio.sleep(BETWEEN_ROOMS_SECS)
+                ingest.submit(mac, vals)
+                last_published = time.time()
+                backoff = 1
+                await asyncio.sleep(PUBLISH_MIN_INTERVAL)
+                continue
+
+            disconnected = asyncio.Event()
+            async with streams, adapter_slot(adapter):
+                try:
+                    t0 = time.monotonic()
+                    client = await connect_once(
+                        mac, adapter,
+                        disconnected_callback=lambda _c: loop.call_soon_threadsafe(disconnected.set),
+                    )
+                    telemetry.observe(room_id, "connect", time.monotonic() - t0)
+                    print(f"[INFO] connected (persistent) room={room_id} mac={mac}", flush=True)
+                    backoff = 1
+
+                    vals = {"temp_c": None, "humidity_pct": None, "battery_mv": None}
+                    t_connected = time.monotonic()
+                    first = True
+
+                    def cb(_handle, data: bytes):
+                        nonlocal last_published, first
+                        if PRINT_RAW:
+                            print(f"[RAW] {data.hex()}", flush=True)
+                        t, h, mv = parse_notify(data)
+                        if t is not None: vals["temp_c"] = t
+                        if h is not None: vals["humidity_pct"] = h
+                        if mv is not None: vals["battery_mv"] = mv
+                        if first and vals["temp_c"] is not None and vals["humidity_pct"] is not None:
+                            first = False
+                            telemetry.observe(room_id, "first_notify", time.monotonic() - t_connected)
+                            telemetry.poll_result(room_id, True)
+
+                        now = time.time()
+                        if vals["temp_c"] is None and vals["humidity_pct"] is None:
+                            return
+                        if now - last_published < PUBLISH_MIN_INTERVAL:
+                            return
+                        last_published = now
+                        print(
+                            f"[GATT] room={room_id} mac={mac} T={vals['temp_c']}°C "
+                            f"H={vals['humidity_pct']}% (batt={vals['battery_mv']}mV)",
+                            flush=True,
+                        )
+                        ingest.submit(mac, dict(vals))
+
+                    await client.start_notify(NOTIFY_UUID, cb)
+                    await disconnected.wait()
+                finally:
+                    # release the slots only once the connection is gone
+                    if client is not None:
+                        try:
+                            await client.__aexit__(None, None, None)
+                        except Exception:
+                            pass
+            print(f"[WARN] room={room_id} mac={mac} disconnected; reconnecting", flush=True)
+
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"[WARN] GATT read failed: {e}", flush=True)
-            # exponential backoff when asleep / grabbed / out of range
-            await asyncio.sleep(min(backoff, MAX_BACKOFF))
-            backoff = min(backoff * 2, MAX_BACKOFF)
-        else:
-            # normal idle between cycles
-            await asyncio.sleep(IDLE_BETWEEN_CYCLES)
+            telemetry.poll_result(room_id, False, f"{type(e).__name__}: {e}")
+            print(
+                f"[WARN] persistent stream room={room_id} mac={mac}: "
+                f"type={type(e).__name__} repr={e!r}; retry in {min(backoff, MAX_BACKOFF)}s",
+                flush=True,
+            )
 
-        # periodic CSV write
-        now = time.time()
-        if (now - last_written) >= INTERVAL and (last["temp_c"] is not None or last["humidity_pct"] is not None):
-            with open(OUTPUT,"a",newline="") as f:
-                csv.writer(f).writerow([
-                    datetime.utcfromtimestamp(now).isoformat()+"Z",
-                    f"{int(now)}",
-                    f"{last['temp_c']:.2f}" if last['temp_c'] is not None else "",
-                    f"{last['humidity_pct']:.2f}" if last['humidity_pct'] is not None else "",
-                    f"{last['battery_mv']}" if last['battery_mv'] is not None else "",
-                ])
-            last_written = now
-            print(f"[LOG] wrote CSV at {datetime.fromtimestamp(now)}", flush=True)
+        await asyncio.sleep(min(backoff, MAX_BACKOFF))
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+def current_rooms() -> list:
+    """
+    Working copies of the watcher's room table, with adapters assigned.
+    """
+    rooms = [dict(r) for r in room_watcher.table.rooms]
+    for idx, room in enumerate(rooms):
+        room["adapter"] = assign_adapter(room, idx)
+    return rooms
+
+async def persistent_supervisor():
+    """
+    Keep exactly one stream_room task per enabled room. Reacts as soon as
+    rooms are added, removed or remapped, and restarts dead tasks every
+    ROOMS_REFRESH_SECS.
+    """
+    print(
+        f"[INFO] {VERSION} persistent notify mode "
+        f"max_streams_per_adapter={min(MAX_STREAMS_PER_ADAPTER, MAX_CONN_PER_ADAPTER)}",
+        flush=True,
+    )
+    tasks = {}  # mac -> (room, task)
+
+    while True:
+        rooms = current_rooms()
+        wanted = {r["mac"]: r for r in rooms}
+        telemetry.forget({r["id"] for r in rooms})
+
+        for mac, (room, task) in list(tasks.items()):
+            new = wanted.get(mac)
+            changed = new is None or (new["id"], new["adapter"]) != (room["id"], room["adapter"])
+            if changed or task.done():
+                task.cancel()
+                del tasks[mac]
+                print(f"[INFO] stopped stream room={room['id']} mac={mac}", flush=True)
+
+        for mac, room in wanted.items():
+            if mac not in tasks:
+                tasks[mac] = (room, asyncio.create_task(stream_room(room)))
+                print(f"[INFO] started stream room={room['id']} mac={mac} adapter={room['adapter']}", flush=True)
+
+        await room_watcher.wait_changed(ROOMS_REFRESH_SECS)
 
 async def main():
+    global ingest, room_watcher
     ensure_csv(OUTPUT)
 
+    room_watcher = RoomConfigWatcher()
+    watch_task = asyncio.create_task(room_watcher.run())
+    ingest = IngestClient(telemetry=telemetry.summary)
+    await ingest.start()
+    await telemetry.serve(extra=lambda: {"ingest": ingest.stats()})
+    try:
+        if PERSISTENT_NOTIFY:
+            await persistent_supervisor()
+        else:
+            await polling_loop()
+    finally:
+        watch_task.cancel()
+        await telemetry.close()
+        await ingest.close()
+
+def jitter() -> float:
+    j = INTERVAL * SCHED_JITTER_FRAC
+    return random.uniform(-j, j)
+
+def sync_schedule(rooms: list, now: float):
+    """
+    Give new rooms a first due time spread evenly over one interval, and
+    forget rooms that were removed from the config.
+    """
+    wanted = {r["mac"] for r in rooms}
+    for mac in list(room_state):
+        if mac not in wanted:
+            del room_state[mac]
+
+    for idx, room in enumerate(rooms):
+        state = room_state.setdefault(room["mac"], {"failures": 0, "last_ok": None, "last_error": None})
+        state["room_id"] = room["id"]
+        if "next_due" not in state:
+            state["next_due"] = now + INTERVAL * idx / len(rooms) + abs(jitter())
+            state["backoff_secs"] = 0.0
+
+def reschedule(room: dict, now: float):
+    """
+    Healthy rooms keep their cadence (anchored to the previous due time);
+    failing rooms back off exponentially from max(INTERVAL, ROOM_BACKOFF_BASE)
+    up to ROOM_BACKOFF_MAX, so they are never polled more often than
+    healthy ones (each attempt can cost a full scan on the shared adapter).
+    """
+    state = room_state[room["mac"]]
+    if state["failures"] == 0:
+        state["backoff_secs"] = 0.0
+        base = state["next_due"] + INTERVAL
+        if base < now:
+            base = now + INTERVAL
+        state["next_due"] = base + jitter()
+    else:
+        first = max(INTERVAL, ROOM_BACKOFF_BASE)
+        state["backoff_secs"] = min(first * (2 ** (state["failures"] - 1)), max(ROOM_BACKOFF_MAX, first))
+        state["next_due"] = now + state["backoff_secs"] * random.uniform(1.0, 1.1)
+
+def write_status(rooms: list):
+    """
+    Schedule and health per room, for the dashboard / debugging.
+    Written atomically (temp file + rename).
+    """
+    out = {"updated_epoch": int(time.time()), "interval_secs": INTERVAL, "rooms": []}
+    for room in rooms:
+        state = room_state.get(room["mac"], {})
+        entry = device_cache.get(room["mac"]) or {}
+        out["rooms"].append({
+            "room_id": room["id"],
+            "mac": room["mac"],
+            "adapter": room.get("adapter"),
+            "next_due_epoch": int(state.get("next_due") or 0),
+            "consecutive_failures": state.get("failures", 0),
+            "backoff_secs": state.get("backoff_secs", 0.0),
+            "last_ok_epoch": int(state["last_ok"]) if state.get("last_ok") else None,
+            "last_error": state.get("last_error"),
+            "rssi": entry.get("rssi"),
+            "last_seen_epoch": int(entry["last_seen"]) if entry.get("last_seen") else None,
+        })
+
+    tmp = f"{STATUS_PATH}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        os.replace(tmp, STATUS_PATH)
+    except Exception as e:
+        print(f"[WARN] writing {STATUS_PATH} failed: {e}", flush=True)
+
+async def polling_loop():
+    """
+    Per-room scheduler: every room has its own next-due time. Rooms that
+    come due together share one discovery pass and are polled concurrently.
+    """
     while True:
-        rooms = get_enabled_rooms()
+        rooms = current_rooms()
 
         if not rooms:
             print("[INFO] No enabled rooms with MAC configured yet. Waiting...", flush=True)
-            await asyncio.sleep(5)
+            await room_watcher.wait_changed(ROOMS_REFRESH_SECS)
             continue
 
-        print(f"[INFO] Found {len(rooms)} configured room(s)", flush=True)
-        for room in rooms:
-            print(
-                f"[INFO] room id={room['id']} label={room['label']} mac={room['mac']}",
-                flush=True
-            )
+        now = time.time()
+        sync_schedule(rooms, now)
+        telemetry.forget({r["id"] for r in rooms})
+        due = [r for r in rooms if room_state[r["mac"]]["next_due"] <= now]
+
+        if not due:
+            next_due = min(room_state[r["mac"]]["next_due"] for r in rooms)
+            # wake up at the next due time, or straight away if the config changed
+            await room_watcher.wait_changed(max(0.5, next_due - now))
+            continue
 
-        # For now: test one full pass over all rooms
-        for room in rooms:
-            try:
-                #vals = await poll_one_room(room)
-                vals = await poll_one_room_with_retry(room, retries=1, retry_delay=3.0)
-                post_reading_to_api(room["mac"], vals)
-            except Exception as e:
-                 print(
-                    f"[WARN] room={room['id']} mac={room['mac']} failed: "
-                    f"type={type(e).__name__} repr={e!r}",
-                    flush=True
-                 )
-                 traceback.print_exc()
-
-            await asyncio.sleep(2)
-
-        print(f"[INFO] Cycle complete. Sleeping {INTERVAL}s", flush=True)
-        await asyncio.sleep(INTERVAL)
+        print(f"[INFO] {len(due)}/{len(rooms)} room(s) due: {', '.join(r['id'] for r in due)}", flush=True)
+
+        t0 = time.monotonic()
+        seen = await discover_rooms(due)
+        await asyncio.gather(*(poll_and_ingest(room, seen) for room in due))
+        batch_secs = time.monotonic() - t0
+
+        now = time.time()
+        for room in due:
+            reschedule(room, now)
+        write_status(rooms)
+
+        ok = sum(1 for r in due if room_state[r["mac"]]["failures"] == 0)
+        print(
+            f"[METRIC] cycle_duration_secs={batch_secs:.1f} rooms={len(due)} ok={ok} "
+            f"max_conn_per_adapter={MAX_CONN_PER_ADAPTER} adapters={len(BLE_ADAPTERS)}",
+            flush=True
+        )
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,291 @@
+import os, json, time, asyncio, sqlite3
+from datetime import datetime
+
+import aiohttp
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8081")
+
+INGEST_BATCH_MAX   = int(os.getenv("INGEST_BATCH_MAX", "50"))        # readings per POST
+INGEST_REPLAY_BATCH_MAX = int(os.getenv("INGEST_REPLAY_BATCH_MAX", "500"))  # per POST while draining a backlog
+INGEST_FLUSH_SECS  = float(os.getenv("INGEST_FLUSH_SECS", "1.0"))    # submits are spooled (one fsync) at most this often
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))       # batches in flight
+INGEST_TIMEOUT     = float(os.getenv("INGEST_TIMEOUT", "15"))
+INGEST_MAX_BACKOFF = float(os.getenv("INGEST_MAX_BACKOFF", "60"))
+
+# durable outbox: every reading is written here before it is sent
+OUTBOX_PATH        = os.getenv("OUTBOX_PATH", "/data/collector_outbox.db")
+OUTBOX_MAX_ROWS    = int(os.getenv("OUTBOX_MAX_ROWS", "200000"))     # disk budget (~200 bytes/row); oldest dropped beyond
+OUTBOX_REPORT_SECS = float(os.getenv("OUTBOX_REPORT_SECS", "60"))    # backlog depth log interval
+
+
+def make_reading(mac: str, vals: dict, now: float = None):
+    """
+    Ingest payload for one reading, or None if there is nothing to send.
+    """
+    t = vals.get("temp_c")
+    h = vals.get("humidity_pct")
+    mv = vals.get("battery_mv")
+    if t is None and h is None and mv is None:
+        return None
+
+    now = time.time() if now is None else now
+    return {
+        "mac": mac,
+        "ts_utc": datetime.utcfromtimestamp(now).isoformat() + "Z",
+        "epoch": int(now),
+        "temp_c": t,
+        "humidity_pct": h,
+        "battery_mv": mv,
+    }
+
+
+class Outbox:
+    """
+    Append-only spool in a small SQLite file. Rows are deleted once the
+    server acknowledged them, so whatever is left after a crash or an
+    outage is exactly the undelivered backlog. The row count is kept in
+    memory (counted once at open), so depth() costs nothing.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.count = self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        self.dropped = 0
+
+    def append_many(self, readings):
+        """
+        Spool readings in one transaction (one fsync).
+        """
+        now = time.time()
+        dropped = 0
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO outbox(created, payload) VALUES (?, ?)",
+                [(now, json.dumps(r)) for r in readings],
+            )
+            over = self.count + len(readings) - OUTBOX_MAX_ROWS
+            if over > 0:
+                dropped = self.conn.execute(
+                    "DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)", (over,)
+                ).rowcount
+        self.count += len(readings) - dropped
+        if dropped:
+            self.dropped += dropped
+            print(f"[WARN] outbox over budget ({OUTBOX_MAX_ROWS} rows); dropped {dropped} oldest", flush=True)
+
+    def next_batch(self, after_id: int, limit: int):
+        cur = self.conn.execute(
+            "SELECT id, payload FROM outbox WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        )
+        return [(row_id, json.loads(payload)) for row_id, payload in cur.fetchall()]
+
+    def delivered(self, ids):
+        with self.conn:
+            cur = self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+            self.count -= cur.rowcount  # rows trimmed meanwhile are already off the count
+
+    def depth(self) -> int:
+        return self.count
+
+    def oldest_age(self):
+        row = self.conn.execute("SELECT created FROM outbox ORDER BY id LIMIT 1").fetchone()
+        return None if row is None else time.time() - row[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class IngestClient:
+    """
+    Non-blocking, durable ingest for the collectors.
+
+    submit() queues the reading in memory and returns. A spooler writes
+    the queue to the outbox in one transaction per INGEST_FLUSH_SECS, so
+    BLE callbacks never wait on an fsync (a crash loses at most that
+    window). A dispatcher sends the outbox oldest-first in batches over
+    one keep-alive session, with at most INGEST_CONCURRENCY batches in
+    flight. On failure it backs off and rewinds to the oldest
+    unacknowledged row, so after an outage the backlog is replayed in
+    order, INGEST_REPLAY_BATCH_MAX at a time.
+
+    `telemetry` is an optional callable; its dict rides along with every
+    batch so the server always has a fresh collector summary.
+    """
+
+    def __init__(self, base_url: str = API_BASE_URL, outbox_path: str = OUTBOX_PATH, telemetry=None):
+        self.base_url = base_url.rstrip("/")
+        self.outbox = Outbox(outbox_path)
+        self.telemetry = telemetry
+        self.session = None
+        self.tasks = []
+        self.pending = []        # submitted, not yet spooled
+        self.spool_wakeup = asyncio.Event()
+        self.wakeup = asyncio.Event()
+        self.slots = asyncio.Semaphore(max(1, INGEST_CONCURRENCY))
+        self.cursor = 0          # highest outbox id handed to a sender
+        self.inflight = set()    # ids currently being sent
+        self.backoff = 0.0
+        self.sent = 0
+        self.failed_batches = 0
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=INGEST_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=INGEST_CONCURRENCY, keepalive_timeout=300),
+        )
+        depth = self.outbox.depth()
+        if depth:
+            print(f"[INFO] outbox has {depth} undelivered reading(s); replaying", flush=True)
+            self.wakeup.set()
+        self.tasks = [
+            asyncio.create_task(self._spooler()),
+            asyncio.create_task(self._dispatcher()),
+            asyncio.create_task(self._reporter()),
+        ]
+
+    async def close(self):
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        try:
+            self._spool()
+        except sqlite3.Error as e:
+            print(f"[ERROR] outbox write failed on shutdown: {e!r}; {len(self.pending)} reading(s) lost", flush=True)
+        if self.session is not None:
+            await self.session.close()
+        self.outbox.close()
+
+    def submit(self, mac: str, vals: dict) -> bool:
+        reading = make_reading(mac, vals)
+        if reading is None:
+            print(f"[INFO] skip ingest for mac={mac}: empty reading", flush=True)
+            return False
+        self.pending.append(reading)
+        # while the outbox cannot be written, memory gets the same budget as disk
+        over = len(self.pending) - OUTBOX_MAX_ROWS
+        if over > 0:
+            del self.pending[:over]
+            self.outbox.dropped += over
+            print(f"[WARN] outbox unwritable and {OUTBOX_MAX_ROWS} reading(s) pending; dropped {over} oldest", flush=True)
+        self.spool_wakeup.set()
+        return True
+
+    def _spool(self):
+        if self.pending:
+            self.outbox.append_many(self.pending)
+            self.pending = []
+
+    def stats(self) -> dict:
+        return {
+            "outbox_depth": self.outbox.depth() + len(self.pending),
+            "outbox_oldest_age_secs": self.outbox.oldest_age(),
+            "outbox_dropped": self.outbox.dropped,
+            "sent": self.sent,
+            "failed_batches": self.failed_batches,
+        }
+
+    async def _spooler(self):
+        while True:
+            await self.spool_wakeup.wait()
+            self.spool_wakeup.clear()
+            # give a burst of submits a moment to coalesce into one write (and batch)
+            await asyncio.sleep(INGEST_FLUSH_SECS)
+            try:
+                self._spool()
+            except sqlite3.Error as e:
+                print(f"[WARN] outbox write failed: {e!r}; keeping {len(self.pending)} reading(s) in memory", flush=True)
+                self.spool_wakeup.set()
+                continue
+            self.wakeup.set()
+
+    async def _dispatcher(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            while True:
+                if self.backoff:
+                    await asyncio.sleep(self.backoff)
+
+                await self.slots.acquire()
+                backlog = self.outbox.depth() - len(self.inflight)
+                limit = INGEST_REPLAY_BATCH_MAX if backlog > INGEST_BATCH_MAX else INGEST_BATCH_MAX
+                batch = self.outbox.next_batch(self.cursor, limit)
+                if not batch:
+                    self.slots.release()
+                    break
+
+                # after a rewind, rows of batches still in flight come back; skip them
+                self.cursor = batch[-1][0]
+                batch = [(row_id, reading) for row_id, reading in batch if row_id not in self.inflight]
+                if not batch:
+                    self.slots.release()
+                    continue
+
+                ids = [row_id for row_id, _ in batch]
+                self.inflight.update(ids)
+                asyncio.create_task(self._send(ids, [reading for _, reading in batch]))
+
+    async def _send(self, ids, readings):
+        try:
+            await self._post(readings)
+            self.outbox.delivered(ids)
+            self.sent += len(ids)
+            self.backoff = 0.0
+        except Exception as e:
+            self.failed_batches += 1
+            self.backoff = min(max(self.backoff * 2, 1.0), INGEST_MAX_BACKOFF)
+            # rewind so the oldest unacknowledged rows go first on the next attempt
+            self.cursor = min(self.cursor, ids[0] - 1)
+            print(
+                f"[WARN] ingest batch={len(ids)} failed: {e!r}; "
+                f"retry in {self.backoff:.0f}s (outbox={self.outbox.depth()})",
+                flush=True,
+            )
+            self.wakeup.set()
+        finally:
+            self.inflight.difference_update(ids)
+            self.slots.release()
+
+    async def _post(self, batch):
+        url = f"{self.base_url}/api/ingest/batch"
+        payload = {"readings": batch}
+        if self.telemetry is not None:
+            payload["telemetry"] = self.telemetry()
+        async with self.session.post(url, json=payload) as resp:
+            body = await resp.json(content_type=None)
+            if resp.status >= 500:
+                raise RuntimeError(f"HTTP {resp.status}: {body}")
+            if resp.status >= 400:
+                # the server refused the whole batch; retrying won't help
+                print(f"[WARN] ingest batch rejected: {resp.status} {body}", flush=True)
+                return
+
+            rejected = [r for r in (body.get("results") or []) if not r.get("ok")]
+            for r in rejected:
+                print(f"[WARN] ingest rejected mac={r.get('mac')}: {r.get('error')}", flush=True)
+            print(f"[INGEST] batch={len(batch)} accepted={len(batch) - len(rejected)}", flush=True)
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(OUTBOX_REPORT_SECS)
+            st = self.stats()
+            if st["outbox_depth"] or st["failed_batches"]:
+                age = st["outbox_oldest_age_secs"]
+                print(
+                    f"[METRIC] outbox_depth={st['outbox_depth']} "
+                    f"oldest_age_secs={0 if age is None else int(age)} "
+                    f"dropped={st['outbox_dropped']} sent={st['sent']} failed_batches={st['failed_batches']}",
+                    flush=True,
+                )
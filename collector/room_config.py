@@ -0,0 +1,162 @@
+import os, json, asyncio
+from collections import namedtuple
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # non-Linux dev machines: fall back to mtime polling
+    INotify = None
+
+CONFIG_PATH = os.getenv("SETUP_CONFIG_PATH", "/data/config.json")
+CFG_POLL_SECS = float(os.getenv("CFG_POLL_SECS", "2"))  # mtime fallback interval
+
+# immutable snapshot; swapped as a whole so readers never see a half-built table
+RoomTable = namedtuple("RoomTable", ["rooms", "by_mac", "macs", "version"])
+
+
+def parse_rooms(cfg: dict):
+    rooms = []
+
+    # v2 config
+    if cfg.get("schema_version") == 2 and isinstance(cfg.get("rooms"), list):
+        for r in cfg["rooms"]:
+            if not r.get("enabled", True):
+                continue
+
+            mac = (r.get("mac") or "").strip().upper()
+            if not mac:
+                continue
+
+            rooms.append({
+                "id": (r.get("id") or "").strip(),
+                "label": (r.get("label") or "").strip() or (r.get("id") or "").strip(),
+                "mac": mac,
+                "name": r.get("name"),
+                "adapter": (r.get("adapter") or "").strip() or None,
+            })
+
+        return rooms
+
+    # v1 fallback
+    mac = (cfg.get("device_mac") or "").strip().upper()
+    if mac:
+        return [{
+            "id": "default",
+            "label": "Default",
+            "mac": mac,
+            "name": cfg.get("device_name"),
+            "adapter": None,
+        }]
+
+    return []
+
+
+def get_enabled_rooms():
+    try:
+        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+            cfg = json.load(f) or {}
+        return parse_rooms(cfg)
+    except Exception:
+        return []
+
+
+class RoomConfigWatcher:
+    """
+    Keeps a precomputed room/MAC table in sync with config.json.
+
+    Uses inotify on the config directory when available (the server
+    replaces the file by rename), else polls the file's mtime. The hot
+    paths only read `table`; parsing happens here, off the BLE callbacks.
+    A config that fails to parse (e.g. caught mid-write) keeps the
+    previous table.
+    """
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self.table = RoomTable((), {}, frozenset(), 0)
+        self.changed = asyncio.Event()
+        self._sig = None
+        self.reload()
+
+    def _stat_sig(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def reload(self) -> bool:
+        sig = self._stat_sig()
+        if sig == self._sig:
+            return False
+
+        if sig is None:
+            rooms = []
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    rooms = parse_rooms(json.load(f) or {})
+            except Exception as e:
+                self._sig = sig  # don't re-warn until the file changes again
+                print(f"[WARN] config reload failed, keeping previous rooms: {e}", flush=True)
+                return False
+
+        self._sig = sig
+        rooms = tuple(rooms)
+        if rooms == self.table.rooms:
+            return False
+
+        by_mac = {r["mac"]: r for r in rooms}
+        self.table = RoomTable(rooms, by_mac, frozenset(by_mac), self.table.version + 1)
+        self.changed.set()
+        print(f"[INFO] room config v{self.table.version}: {len(rooms)} enabled room(s)", flush=True)
+        return True
+
+    async def wait_changed(self, timeout: float) -> bool:
+        """
+        Sleep up to `timeout`, returning early (True) if the rooms changed.
+        """
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.changed.clear()
+        return True
+
+    async def run(self):
+        if INotify is not None:
+            try:
+                await self._run_inotify()
+                return
+            except OSError as e:
+                print(f"[WARN] inotify unavailable ({e}); polling config mtime", flush=True)
+        await self._run_polling()
+
+    async def _run_inotify(self):
+        loop = asyncio.get_running_loop()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        name = os.path.basename(self.path)
+        ino = INotify()
+        ino.add_watch(
+            directory,
+            inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE | inotify_flags.DELETE,
+        )
+        wake = asyncio.Event()
+
+        def on_readable():
+            if any(ev.name == name for ev in ino.read(timeout=0)):
+                wake.set()
+
+        loop.add_reader(ino.fileno(), on_readable)
+        try:
+            while True:
+                await wake.wait()
+                wake.clear()
+                self.reload()
+        finally:
+            loop.remove_reader(ino.fileno())
+            ino.close()
+
+    async def _run_polling(self):
+        while True:
+            await asyncio.sleep(CFG_POLL_SECS)
+            self.reload()
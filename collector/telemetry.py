@@ -0,0 +1,167 @@
+import os, time, socket
+
+from aiohttp import web
+
+TELEMETRY_HOST = os.getenv("TELEMETRY_HOST", "0.0.0.0")
+TELEMETRY_PORT = int(os.getenv("TELEMETRY_PORT", "9102"))  # 0 disables the local endpoint
+COLLECTOR_NAME = os.getenv("COLLECTOR_NAME", "")            # default: <kind>@<hostname>
+
+# seconds; BLE timings range from sub-second connects to minute-long scans
+BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+PHASES = ("scan", "connect", "first_notify")
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram (cumulative since start). Quantiles are the
+    upper bound of the bucket they fall in.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last = +Inf
+        self.n = 0
+        self.total = 0.0
+
+    def observe(self, secs: float):
+        i = 0
+        while i < len(BUCKETS) and secs > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.n += 1
+        self.total += secs
+
+    def quantile(self, q: float):
+        if not self.n:
+            return None
+        rank = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else None
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "n": self.n,
+            "sum": round(self.total, 3),
+            "buckets": {str(b): c for b, c in zip(BUCKETS + ("inf",), self.counts)},
+        }
+
+
+class RoomTelemetry:
+    def __init__(self):
+        self.hist = {p: Histogram() for p in PHASES}
+        self.polls = 0
+        self.ok = 0
+        self.not_seen = 0
+        self.last_error = None
+        self.last_ok_epoch = None
+        self.rssi = None
+        self.rssi_avg = None  # EWMA, alpha 0.2
+
+    def summary(self) -> dict:
+        out = {
+            "polls": self.polls,
+            "ok": self.ok,
+            "not_seen": self.not_seen,
+            "success_rate": round(self.ok / self.polls, 3) if self.polls else None,
+            "last_ok_epoch": self.last_ok_epoch,
+            "last_error": self.last_error,
+            "rssi": self.rssi,
+            "rssi_avg": None if self.rssi_avg is None else round(self.rssi_avg, 1),
+        }
+        for p, h in self.hist.items():
+            out[f"{p}_mean"] = round(h.total / h.n, 2) if h.n else None
+            out[f"{p}_p50"] = h.quantile(0.5)
+            out[f"{p}_p90"] = h.quantile(0.9)
+        return out
+
+
+class Telemetry:
+    """
+    Per-room poll timings and health for one collector process.
+
+    Served as JSON on the local endpoint (GET /telemetry, with full
+    histograms) and pushed to the server as a compact summary with every
+    ingest batch.
+    """
+
+    def __init__(self, kind: str):
+        self.name = COLLECTOR_NAME or f"{kind}@{socket.gethostname()}"
+        self.since = int(time.time())
+        self.rooms = {}
+        self.runner = None
+
+    def room(self, room_id: str) -> RoomTelemetry:
+        rt = self.rooms.get(room_id)
+        if rt is None:
+            rt = self.rooms[room_id] = RoomTelemetry()
+        return rt
+
+    def observe(self, room_id: str, phase: str, secs: float):
+        self.room(room_id).hist[phase].observe(secs)
+
+    def observe_rssi(self, room_id: str, rssi):
+        if rssi is None:
+            return
+        rt = self.room(room_id)
+        rt.rssi = rssi
+        rt.rssi_avg = rssi if rt.rssi_avg is None else 0.8 * rt.rssi_avg + 0.2 * rssi
+
+    def poll_result(self, room_id: str, ok: bool, error: str = None):
+        rt = self.room(room_id)
+        rt.polls += 1
+        if ok:
+            rt.ok += 1
+            rt.last_ok_epoch = int(time.time())
+        else:
+            rt.last_error = error
+
+    def not_seen(self, room_id: str):
+        rt = self.room(room_id)
+        rt.not_seen += 1
+        rt.last_error = "not seen by discovery"
+
+    def forget(self, keep_ids):
+        for room_id in list(self.rooms):
+            if room_id not in keep_ids:
+                del self.rooms[room_id]
+
+    def summary(self) -> dict:
+        return {
+            "collector": self.name,
+            "since_epoch": self.since,
+            "rooms": {room_id: rt.summary() for room_id, rt in self.rooms.items()},
+        }
+
+    def snapshot(self) -> dict:
+        out = self.summary()
+        for room_id, rt in self.rooms.items():
+            out["rooms"][room_id]["histograms"] = {p: h.to_dict() for p, h in rt.hist.items()}
+        return out
+
+    async def serve(self, extra=None):
+        """
+        Start the local JSON endpoint. `extra` is an optional callable whose
+        dict is merged in (e.g. ingest/outbox stats).
+        """
+        if not TELEMETRY_PORT:
+            return
+
+        async def handle(_request):
+            out = self.snapshot()
+            if extra is not None:
+                out.update(extra())
+            return web.json_response(out)
+
+        app = web.Application()
+        app.router.add_get("/telemetry", handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, TELEMETRY_HOST, TELEMETRY_PORT).start()
+        print(f"[INFO] telemetry on http://{TELEMETRY_HOST}:{TELEMETRY_PORT}/telemetry", flush=True)
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
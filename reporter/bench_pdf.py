@@ -0,0 +1,125 @@
+"""
+Benchmark for the report PDF: one ReportLab story in this process
+(generate_pdf) versus room sections rendered in a process pool and merged
+(generate_pdf_parallel).
+
+Builds synthetic room summaries like generate_report() does and renders
+each variant in its own subprocess, so peak RSS is not shared between
+them. Reports wall time, pages and peak RSS of the parent and of the
+largest worker.
+
+    python bench_pdf.py --rooms 50
+    python bench_pdf.py --rooms 200 --workers 8 --json
+"""
+import os, sys, json, time, random, argparse, resource, subprocess, tempfile
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import generate_and_send as G  # noqa: E402
+
+
+def synthetic_reports(rooms: int, rows: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = int(datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp())
+    step = max(1, 86400 // max(rows, 1))
+    reports = []
+    for i in range(rooms):
+        t, h, b = rng.uniform(17, 25), rng.uniform(40, 70), rng.randint(2600, 3100)
+        data = []
+        for k in range(rows):
+            t = min(35.0, max(5.0, t + rng.gauss(0, 0.05)))
+            h = min(99.0, max(10.0, h + rng.gauss(0, 0.2)))
+            ep = start + k * step
+            ts = datetime.fromtimestamp(ep, timezone.utc).isoformat().replace("+00:00", "Z")
+            data.append((ts, ep, round(t, 2), round(h, 2), b))
+        temps = [r[2] for r in data] or [0.0]
+        hums = [r[3] for r in data] or [0.0]
+        stats = {
+            "temperature": {"min": min(temps), "max": max(temps), "avg": sum(temps) / len(temps)},
+            "humidity": {"min": min(hums), "max": max(hums), "avg": sum(hums) / len(hums)},
+            "battery_mv": {"min": b, "max": b, "avg": b},
+            "hours_humidity_above_warn": round(rng.uniform(0, 24), 2),
+            "hours_humidity_above_alert": round(rng.uniform(0, 12), 2),
+            "hours_mould_risk": round(rng.uniform(0, 12), 2),
+        }
+        room = {"id": f"bench{i:04d}", "label": f"Bench room {i}", "mac": "", "name": "LYWSD03MMC"}
+        reports.append(G.build_room_summary(room, data, stats, round(rng.uniform(0, 3), 2)))
+    return reports
+
+
+def render(mode: str, rooms: int, rows: int, workers: int) -> dict:
+    """
+    One variant, in this (fresh) process.
+    """
+    reports = synthetic_reports(rooms, rows)
+    with tempfile.TemporaryDirectory(prefix="hygro-bench-pdf-") as tmp:
+        pdf_path = os.path.join(tmp, "report.pdf")
+        t0 = time.perf_counter()
+        if mode == "serial":
+            G.generate_pdf("2026-01-01", reports, pdf_path)
+        else:
+            G.generate_pdf_parallel("2026-01-01", reports, pdf_path, workers)
+        wall = time.perf_counter() - t0
+
+        from pypdf import PdfReader
+        pages = len(PdfReader(pdf_path).pages)
+        size = os.path.getsize(pdf_path)
+
+    # ru_maxrss is KiB on Linux
+    return {
+        "mode": mode,
+        "wall_secs": round(wall, 2),
+        "pages": pages,
+        "pdf_kib": round(size / 1024, 1),
+        "parent_peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "worker_peak_rss_mib": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1) if mode == "parallel" else None,
+    }
+
+
+def run_variant(mode: str, args) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", mode,
+           "--rooms", str(args.rooms), "--rows", str(args.rows), "--workers", str(args.workers)]
+    out = subprocess.run(cmd, cwd=HERE, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=50)
+    ap.add_argument("--rows", type=int, default=1440, help="readings per room (1440 = one per minute)")
+    ap.add_argument("--workers", type=int, default=G.REPORT_WORKERS, help="pool size for the parallel run")
+    ap.add_argument("--json", action="store_true", help="print the result as JSON")
+    ap.add_argument("--child", choices=["serial", "parallel"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(render(args.child, args.rooms, args.rows, args.workers)))
+        return
+
+    print(f"[INFO] {args.rooms} room(s) x {args.rows} reading(s), {args.workers} worker(s), {os.cpu_count()} CPU(s) …", flush=True)
+    res = {
+        "rooms": args.rooms,
+        "rows_per_room": args.rows,
+        "workers": args.workers,
+        "cpus": os.cpu_count(),
+        "serial": run_variant("serial", args),
+        "parallel": run_variant("parallel", args),
+    }
+    s, p = res["serial"]["wall_secs"], res["parallel"]["wall_secs"]
+    res["speedup"] = round(s / p, 2) if p else None
+
+    if args.json:
+        print(json.dumps(res, indent=2))
+        return
+    for mode in ("serial", "parallel"):
+        print(f"{mode}:")
+        for k, v in res[mode].items():
+            if k != "mode":
+                print(f"{k:>22}: {'—' if v is None else v}")
+    print(f"{'speedup':>22}: {res['speedup']}")
+
+
+if __name__ == "__main__":
+    main()
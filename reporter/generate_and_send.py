@@ -1,9 +1,18 @@
 import os
 import json
+import shutil
+import hashlib
+import argparse
+import operator
+import tempfile
+import itertools
 import zipfile
 import sqlite3
 import smtplib
-from datetime import datetime
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 from email.message import EmailMessage
 
 from reportlab.lib.pagesizes import A4
@@ -16,9 +25,20 @@ DATA_DIR = os.getenv("DATA_DIR", "/data")
 DB_PATH = os.getenv("DB_PATH", os.path.join(DATA_DIR, "hygro.db"))
 REPORTS_DIR = os.getenv("REPORTS_DIR", os.path.join(DATA_DIR, "reports"))
 CONFIG_PATH = os.path.join(DATA_DIR, "config.json")
+API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8081")
 
 HUMIDITY_WARN = float(os.getenv("HUMIDITY_WARN", "60"))
 HUMIDITY_ALERT = float(os.getenv("HUMIDITY_ALERT", "65"))
+EXCLUDE_ANOMALIES = os.getenv("EXCLUDE_ANOMALIES", "0") == "1"  # leave out readings flagged as sensor faults
+
+# PDF rendering: room sections in a process pool (merged afterwards) from this many rooms up
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(os.cpu_count() or 1)))
+REPORT_PARALLEL_MIN_ROOMS = int(os.getenv("REPORT_PARALLEL_MIN_ROOMS", "4"))
+PDF_TABLE_ROWS = 100  # newest readings listed per room
+
+# bump when the report layout changes, so cached reports are rebuilt
+REPORT_FORMAT = 1
+BACKFILL_CHUNK_DAYS = max(1, int(os.getenv("BACKFILL_CHUNK_DAYS", "7")))  # days per query in --from/--to mode
 
 
 def load_email_settings():
@@ -72,6 +92,12 @@ def iso_day_bounds(date_str: str):
     return start, end
 
 
+def day_epoch_bounds(date_str: str):
+    start = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    end = start + timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
 def load_rooms():
     if not os.path.exists(CONFIG_PATH):
         return []
@@ -105,43 +131,47 @@ def load_rooms():
     return rooms
 
 
-def has_room_id_column():
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-        cur.execute("PRAGMA table_info(readings)")
-        cols = cur.fetchall()
-        col_names = {c[1] for c in cols}
-        return "room_id" in col_names
-    finally:
-        conn.close()
+def has_room_id_column(conn) -> bool:
+    cols = conn.execute("PRAGMA table_info(readings)").fetchall()
+    return "room_id" in {c[1] for c in cols}
 
 
-def load_rows_for_room(date_str: str, room_id: str):
+def load_day_rows(date_str: str, room_ids):
+    """
+    ({room_id: [(ts_utc, epoch, temp_c, humidity_pct, battery_mv), ...]},
+    {room_id: mould}) for the day: one connection, one schema probe and one
+    query ordered by room, split into rooms as the cursor streams, plus the
+    end-of-day mould-risk index from read_mould_index().
+    """
     start, end = iso_day_bounds(date_str)
+    out = {room_id: [] for room_id in room_ids}
+    if not room_ids:
+        return out, {}
 
     conn = sqlite3.connect(DB_PATH)
     try:
-        cur = conn.cursor()
-
-        if has_room_id_column():
-            cur.execute(
-                """
-                SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv
-                FROM readings
-                WHERE room_id = ?
+        if has_room_id_column(conn):
+            marks = ",".join("?" * len(room_ids))
+            cur = conn.execute(
+                f"""
+                SELECT room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv
+                FROM readings r
+                WHERE room_id IN ({marks})
                   AND ts_utc >= ?
                   AND ts_utc <= ?
-                ORDER BY epoch ASC
+                  AND (? = 0 OR NOT EXISTS (
+                        SELECT 1 FROM reading_anomalies a WHERE a.room_id = r.room_id AND a.epoch = r.epoch))
+                ORDER BY room_id, epoch ASC
                 """,
-                (room_id, start, end),
+                (*room_ids, start, end, 1 if EXCLUDE_ANOMALIES else 0),
             )
         else:
-            if room_id != "default":
-                return []
-            cur.execute(
+            if "default" not in out:
+                return out, {}
+            # legacy single-room schema: everything belongs to "default"
+            cur = conn.execute(
                 """
-                SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv
+                SELECT 'default', ts_utc, epoch, temp_c, humidity_pct, battery_mv
                 FROM readings
                 WHERE ts_utc >= ?
                   AND ts_utc <= ?
@@ -150,51 +180,185 @@ def load_rows_for_room(date_str: str, room_id: str):
                 (start, end),
             )
 
-        return cur.fetchall()
+        for room_id, group in itertools.groupby(cur, key=operator.itemgetter(0)):
+            out[room_id] = [row[1:] for row in group]
+        return out, read_mould_index(conn, [date_str], room_ids)[date_str]
     finally:
         conn.close()
 
 
-def stats(xs):
-    xs = [x for x in xs if x is not None]
-    if not xs:
-        return {}
-    return {
-        "min": min(xs),
-        "max": max(xs),
-        "avg": sum(xs) / len(xs),
-    }
+def day_range(first: str, last: str):
+    day = datetime.strptime(first, "%Y-%m-%d")
+    stop = datetime.strptime(last, "%Y-%m-%d")
+    while day <= stop:
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
 
 
-def hours_above(rows, threshold):
+def iter_range_rows(first: str, last: str, room_ids):
     """
-    Approximate time-above using epoch deltas between consecutive points.
-    For 20-min sampling this is usually good enough.
+    (date_str, {room_id: rows}, {room_id: mould}) for every day from first
+    to last, as in load_day_rows(). One connection walks the range in time
+    order, one query per BACKFILL_CHUNK_DAYS, after one read of the mould
+    index for the whole range. Each chunk is fetched completely before any
+    report is rendered, so no read lock is held while the server ingests.
     """
-    if len(rows) < 2:
-        return 0.0
+    days = list(day_range(first, last))
+    if not room_ids:
+        for date_str in days:
+            yield date_str, {}, {}
+        return
 
-    total = 0
-    for i in range(len(rows) - 1):
-        _ts, ep, _t, h, _b = rows[i]
-        ep2 = rows[i + 1][1]
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        room_schema = has_room_id_column(conn)
+        mould_by_day = read_mould_index(conn, days, room_ids)
+        marks = ",".join("?" * len(room_ids))
+        for c in range(0, len(days), BACKFILL_CHUNK_DAYS):
+            chunk = days[c:c + BACKFILL_CHUNK_DAYS]
+            start, _ = iso_day_bounds(chunk[0])
+            _, end = iso_day_bounds(chunk[-1])
+            if room_schema:
+                rows = conn.execute(
+                    f"""
+                    SELECT room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv
+                    FROM readings r
+                    WHERE room_id IN ({marks})
+                      AND ts_utc >= ?
+                      AND ts_utc <= ?
+                      AND (? = 0 OR NOT EXISTS (
+                            SELECT 1 FROM reading_anomalies a WHERE a.room_id = r.room_id AND a.epoch = r.epoch))
+                    ORDER BY epoch ASC, room_id
+                    """,
+                    (*room_ids, start, end, 1 if EXCLUDE_ANOMALIES else 0),
+                ).fetchall()
+            elif "default" in room_ids:
+                rows = conn.execute(
+                    """
+                    SELECT 'default', ts_utc, epoch, temp_c, humidity_pct, battery_mv
+                    FROM readings
+                    WHERE ts_utc >= ?
+                      AND ts_utc <= ?
+                    ORDER BY epoch ASC
+                    """,
+                    (start, end),
+                ).fetchall()
+            else:
+                rows = []
+
+            by_day = {}
+            for date_str, group in itertools.groupby(rows, key=lambda row: row[1][:10]):
+                out = by_day[date_str] = {room_id: [] for room_id in room_ids}
+                for row in group:
+                    out[row[0]].append(row[1:])
+            del rows
+
+            for date_str in chunk:
+                yield (date_str, by_day.pop(date_str, None) or {room_id: [] for room_id in room_ids},
+                       mould_by_day[date_str])
+    finally:
+        conn.close()
 
-        if h is None:
-            continue
 
-        if float(h) >= threshold:
-            dt = max(0, int(ep2) - int(ep))
-            dt = min(dt, 60 * 60 * 3)  # cap at 3h to avoid huge offline gaps
-            total += dt
+class StatsUnavailable(RuntimeError):
+    pass
 
-    return round(total / 3600.0, 2)
 
+def _fetch_stats(start: int, end: int, bucket: int = None):
+    params = {"start": start, "end": end, "warn": HUMIDITY_WARN, "alert": HUMIDITY_ALERT,
+              "exclude_anomalies": "true" if EXCLUDE_ANOMALIES else "false"}
+    if bucket:
+        params["bucket"] = bucket
+    url = f"{API_BASE_URL}/api/stats?{urllib.parse.urlencode(params)}"
+
+    try:
+        with urllib.request.urlopen(url, timeout=120) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except Exception as e:
+        # a report without its aggregates is worse than none: fail the run
+        raise StatsUnavailable(f"stats request to {url} failed: {e}") from e
+
+
+def fetch_day_stats(date_str: str):
+    """
+    Day aggregates for all rooms from one grouped pass of the server's stats
+    engine, so the report matches what the dashboard and the insights agent
+    show. Raises StatsUnavailable if the server could not be reached.
+    """
+    data = _fetch_stats(*day_epoch_bounds(date_str))
+    return {room_id: st or {} for room_id, st in (data.get("rooms") or {}).items()}
+
+
+def fetch_range_stats(first: str, last: str):
+    """
+    {date_str: {room_id: stats}} for a range of days from a single request
+    with day buckets (same aggregates as fetch_day_stats()).
+    """
+    start, _ = day_epoch_bounds(first)
+    _, end = day_epoch_bounds(last)
+    data = _fetch_stats(start, end, bucket=86400)
+
+    out = {}
+    for room_id, buckets in (data.get("rooms") or {}).items():
+        for st in buckets or []:
+            date_str = datetime.fromtimestamp(st["start"], timezone.utc).strftime("%Y-%m-%d")
+            out.setdefault(date_str, {})[room_id] = st
+    return out
 
-def build_room_summary(room: dict, rows):
-    temps = [r[2] for r in rows if r[2] is not None]
-    hums = [r[3] for r in rows if r[3] is not None]
-    batts = [r[4] for r in rows if r[4] is not None]
 
+def read_mould_index(conn, dates, room_ids):
+    """
+    {date_str: {room_id: {"index", "as_of"}}}: each room's cumulative
+    mould-risk index at the end of each day, from the server's hourly step
+    table, so a backfilled report shows that day's value, not today's.
+    Where the server has not stepped through the day yet (today, or after
+    late data rewound it), it is the value as of `as_of` < midnight; the
+    input hash includes `as_of`, so such a report is rebuilt later.
+
+    One query up to the last midnight, walked once per room in hour order.
+    """
+    out = {date_str: {} for date_str in dates}
+    if not dates or not room_ids:
+        return out
+
+    ends = [(day_epoch_bounds(date_str)[1], date_str) for date_str in sorted(dates)]
+    marks = ",".join("?" * len(room_ids))
+    try:
+        through = dict(conn.execute(
+            f"SELECT room_id, through_epoch FROM mould_index_state WHERE room_id IN ({marks})", room_ids,
+        ).fetchall())
+        cur = conn.execute(
+            f"""
+            SELECT room_id, hour_epoch, idx
+            FROM mould_index
+            WHERE room_id IN ({marks})
+              AND hour_epoch < ?
+            ORDER BY room_id, hour_epoch
+            """,
+            (*room_ids, ends[-1][0]),
+        )
+        for room_id, steps in itertools.groupby(cur, key=operator.itemgetter(0)):
+            if room_id not in through:
+                continue
+            # as_of grows with the day, so one pointer over the days suffices
+            days = iter([(min(end, through[room_id]), date_str) for end, date_str in ends])
+            day = next(days, None)
+            idx = None
+            for _, hour_epoch, step_idx in steps:
+                while day is not None and day[0] <= hour_epoch:
+                    if idx is not None:
+                        out[day[1]][room_id] = {"index": round(idx, 3), "as_of": day[0]}
+                    day = next(days, None)
+                idx = step_idx
+            while day is not None and idx is not None:
+                out[day[1]][room_id] = {"index": round(idx, 3), "as_of": day[0]}
+                day = next(days, None)
+    except sqlite3.OperationalError as e:
+        print(f"[WARN] mould index not available: {e}")
+    return out
+
+
+def build_room_summary(room: dict, rows, stats: dict, mould_index=None):
     latest = rows[-1] if rows else None
 
     return {
@@ -210,11 +374,15 @@ def build_room_summary(room: dict, rows):
             "humidity_pct": latest[3] if latest else None,
             "battery_mv": latest[4] if latest else None,
         },
-        "temp_c": stats(temps),
-        "humidity_pct": stats(hums),
-        "battery_mv": stats(batts),
-        "hours_humidity_above_warn": hours_above(rows, HUMIDITY_WARN),
-        "hours_humidity_above_alert": hours_above(rows, HUMIDITY_ALERT),
+        "temp_c": stats.get("temperature") or {},
+        "humidity_pct": stats.get("humidity") or {},
+        "battery_mv": stats.get("battery_mv") or {},
+        "dew_point_c": stats.get("dew_point") or {},
+        "abs_humidity_gm3": stats.get("absolute_humidity") or {},
+        "hours_humidity_above_warn": stats.get("hours_humidity_above_warn", 0.0),
+        "hours_humidity_above_alert": stats.get("hours_humidity_above_alert", 0.0),
+        "hours_mould_risk": stats.get("hours_mould_risk", 0.0),
+        "mould_risk_index": mould_index,
         "table_rows": rows,
     }
 
@@ -229,135 +397,304 @@ def fmt_stat(d, unit="", digits=2):
     )
 
 
-def generate_pdf(date_str: str, room_reports, pdf_path: str):
-    styles = getSampleStyleSheet()
-    doc = SimpleDocTemplate(pdf_path, pagesize=A4, title=f"Hygrometer Report {date_str}")
-
+def room_story(idx: int, summary: dict, styles):
+    """
+    Flowables for one room's section of the report.
+    """
     story = []
-    generated_utc = datetime.utcnow().isoformat() + "Z"
+    story.append(
+        Paragraph(
+            f"<b>Room {idx}: {summary.get('label', '—')}</b>",
+            styles["Heading2"],
+        )
+    )
+    story.append(Spacer(1, 8))
+
+    if summary.get("mac"):
+        story.append(Paragraph(f"MAC: {summary['mac']}", styles["Normal"]))
+    if summary.get("name"):
+        story.append(Paragraph(f"Device: {summary['name']}", styles["Normal"]))
+
+    story.append(Paragraph(f"Samples: <b>{summary.get('rows', 0)}</b>", styles["Normal"]))
+
+    latest = summary.get("latest") or {}
+    if latest.get("ts_utc"):
+        latest_temp = "—" if latest.get("temp_c") is None else f"{float(latest['temp_c']):.2f}"
+        latest_hum = "—" if latest.get("humidity_pct") is None else f"{float(latest['humidity_pct']):.2f}"
+        latest_batt = "—" if latest.get("battery_mv") is None else str(latest["battery_mv"])
+        story.append(
+            Paragraph(
+                f"Latest reading: {latest['ts_utc']} | "
+                f"T={latest_temp} °C, H={latest_hum} %, B={latest_batt} mV",
+                styles["Normal"],
+            )
+        )
+
+    story.append(Spacer(1, 10))
 
-    story.append(Paragraph(f"<b>Hygrometer Daily Report</b> — {date_str}", styles["Title"]))
+    t = summary.get("temp_c", {})
+    h = summary.get("humidity_pct", {})
+    b = summary.get("battery_mv", {})
+
+    story.append(Paragraph(f"<b>Temperature</b>: {fmt_stat(t, '°C', 2)}", styles["Normal"]))
+    story.append(Paragraph(f"<b>Humidity</b>: {fmt_stat(h, '%', 2)}", styles["Normal"]))
+    story.append(Paragraph(f"<b>Dew point</b>: {fmt_stat(summary.get('dew_point_c'), '°C', 2)}", styles["Normal"]))
+    story.append(
+        Paragraph(f"<b>Absolute humidity</b>: {fmt_stat(summary.get('abs_humidity_gm3'), ' g/m³', 2)}", styles["Normal"])
+    )
+
+    if b:
+        story.append(
+            Paragraph(
+                f"<b>Battery</b>: min={b.get('min')}, max={b.get('max')}, avg={int(b.get('avg'))}",
+                styles["Normal"],
+            )
+        )
+    else:
+        story.append(Paragraph("<b>Battery</b>: —", styles["Normal"]))
+
+    story.append(Spacer(1, 8))
+    story.append(
+        Paragraph(
+            f"Hours humidity ≥ {HUMIDITY_WARN}%: <b>{summary.get('hours_humidity_above_warn', 0)}</b> | "
+            f"≥ {HUMIDITY_ALERT}%: <b>{summary.get('hours_humidity_above_alert', 0)}</b>",
+            styles["Normal"],
+        )
+    )
+    mould_idx = summary.get("mould_risk_index")
+    story.append(
+        Paragraph(
+            f"Hours in mould-favourable conditions: <b>{summary.get('hours_mould_risk', 0)}</b> | "
+            f"Mould risk index (0–6, cumulative, end of day): <b>{'—' if mould_idx is None else f'{mould_idx:.2f}'}</b>",
+            styles["Normal"],
+        )
+    )
     story.append(Spacer(1, 12))
-    story.append(Paragraph(f"Generated (UTC): {generated_utc}", styles["Normal"]))
-    story.append(Paragraph(f"Rooms included: <b>{len(room_reports)}</b>", styles["Normal"]))
-    story.append(Paragraph(f"Humidity warn threshold: <b>{HUMIDITY_WARN}%</b>", styles["Normal"]))
-    story.append(Paragraph(f"Humidity alert threshold: <b>{HUMIDITY_ALERT}%</b>", styles["Normal"]))
-    story.append(Spacer(1, 16))
 
+    rows_for_table = (summary.get("table_rows") or [])[-PDF_TABLE_ROWS:]
+
+    if rows_for_table:
+        table_data = [["Time (UTC)", "Temp (°C)", "Hum (%)", "Battery (mV)"]]
+        for ts, _ep, temp, hum, batt in rows_for_table:
+            table_data.append(
+                [
+                    ts,
+                    "" if temp is None else f"{float(temp):.2f}",
+                    "" if hum is None else f"{float(hum):.2f}",
+                    "" if batt is None else str(batt),
+                ]
+            )
+
+        tbl = Table(table_data, repeatRows=1)
+        tbl.setStyle(
+            TableStyle(
+                [
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                    ("FONTSIZE", (0, 0), (-1, -1), 8),
+                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                    ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
+                ]
+            )
+        )
+        story.append(tbl)
+    else:
+        story.append(Paragraph("No readings for this room on this day.", styles["Normal"]))
+
+    return story
+
+
+def header_story(date_str: str, room_count: int, styles):
+    generated_utc = datetime.utcnow().isoformat() + "Z"
+    return [
+        Paragraph(f"<b>Hygrometer Daily Report</b> — {date_str}", styles["Title"]),
+        Spacer(1, 12),
+        Paragraph(f"Generated (UTC): {generated_utc}", styles["Normal"]),
+        Paragraph(f"Rooms included: <b>{room_count}</b>", styles["Normal"]),
+        Paragraph(f"Humidity warn threshold: <b>{HUMIDITY_WARN}%</b>", styles["Normal"]),
+        Paragraph(f"Humidity alert threshold: <b>{HUMIDITY_ALERT}%</b>", styles["Normal"]),
+        Spacer(1, 16),
+    ]
+
+
+def generate_pdf(date_str: str, room_reports, pdf_path: str):
+    """
+    The whole report as one ReportLab story, in this process.
+    """
+    styles = getSampleStyleSheet()
+    doc = SimpleDocTemplate(pdf_path, pagesize=A4, title=f"Hygrometer Report {date_str}")
+
+    story = header_story(date_str, len(room_reports), styles)
     if not room_reports:
         story.append(Paragraph("No enabled rooms configured.", styles["Normal"]))
     else:
         for idx, summary in enumerate(room_reports, start=1):
             if idx > 1:
                 story.append(PageBreak())
+            story.extend(room_story(idx, summary, styles))
 
-            story.append(
-                Paragraph(
-                    f"<b>Room {idx}: {summary.get('label', '—')}</b>",
-                    styles["Heading2"],
-                )
-            )
-            story.append(Spacer(1, 8))
-
-            if summary.get("mac"):
-                story.append(Paragraph(f"MAC: {summary['mac']}", styles["Normal"]))
-            if summary.get("name"):
-                story.append(Paragraph(f"Device: {summary['name']}", styles["Normal"]))
-
-            story.append(Paragraph(f"Samples: <b>{summary.get('rows', 0)}</b>", styles["Normal"]))
-
-            latest = summary.get("latest") or {}
-            if latest.get("ts_utc"):
-                latest_temp = "—" if latest.get("temp_c") is None else f"{float(latest['temp_c']):.2f}"
-                latest_hum = "—" if latest.get("humidity_pct") is None else f"{float(latest['humidity_pct']):.2f}"
-                latest_batt = "—" if latest.get("battery_mv") is None else str(latest["battery_mv"])
-                story.append(
-                    Paragraph(
-                        f"Latest reading: {latest['ts_utc']} | "
-                        f"T={latest_temp} °C, H={latest_hum} %, B={latest_batt} mV",
-                        styles["Normal"],
-                    )
-                )
+    doc.build(story)
 
-            story.append(Spacer(1, 10))
 
-            t = summary.get("temp_c", {})
-            h = summary.get("humidity_pct", {})
-            b = summary.get("battery_mv", {})
+def _render_room_pdf(args):
+    """
+    Pool worker: one room's section as its own PDF (room 1 also gets the
+    report header, so the first page looks the same as the serial path).
+    """
+    date_str, room_count, idx, summary, path = args
+    styles = getSampleStyleSheet()
+    story = header_story(date_str, room_count, styles) if idx == 1 else []
+    story.extend(room_story(idx, summary, styles))
+    SimpleDocTemplate(path, pagesize=A4, title=f"Hygrometer Report {date_str}").build(story)
+    return path
 
-            story.append(Paragraph(f"<b>Temperature</b>: {fmt_stat(t, '°C', 2)}", styles["Normal"]))
-            story.append(Paragraph(f"<b>Humidity</b>: {fmt_stat(h, '%', 2)}", styles["Normal"]))
 
-            if b:
-                story.append(
-                    Paragraph(
-                        f"<b>Battery</b>: min={b.get('min')}, max={b.get('max')}, avg={int(b.get('avg'))}",
-                        styles["Normal"],
-                    )
-                )
-            else:
-                story.append(Paragraph("<b>Battery</b>: —", styles["Normal"]))
-
-            story.append(Spacer(1, 8))
-            story.append(
-                Paragraph(
-                    f"Hours humidity ≥ {HUMIDITY_WARN}%: <b>{summary.get('hours_humidity_above_warn', 0)}</b> | "
-                    f"≥ {HUMIDITY_ALERT}%: <b>{summary.get('hours_humidity_above_alert', 0)}</b>",
-                    styles["Normal"],
-                )
-            )
-            story.append(Spacer(1, 12))
-
-            rows_for_table = (summary.get("table_rows") or [])[-100:]
-
-            if rows_for_table:
-                table_data = [["Time (UTC)", "Temp (°C)", "Hum (%)", "Battery (mV)"]]
-                for ts, _ep, temp, hum, batt in rows_for_table:
-                    table_data.append(
-                        [
-                            ts,
-                            "" if temp is None else f"{float(temp):.2f}",
-                            "" if hum is None else f"{float(hum):.2f}",
-                            "" if batt is None else str(batt),
-                        ]
-                    )
-
-                tbl = Table(table_data, repeatRows=1)
-                tbl.setStyle(
-                    TableStyle(
-                        [
-                            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-                            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                            ("FONTSIZE", (0, 0), (-1, -1), 8),
-                            ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
-                        ]
-                    )
-                )
-                story.append(tbl)
-            else:
-                story.append(Paragraph("No readings for this room on this day.", styles["Normal"]))
+def generate_pdf_parallel(date_str: str, room_reports, pdf_path: str, workers: int):
+    """
+    Render each room's section in a process pool, then concatenate the
+    per-room PDFs in room order. Same content as generate_pdf().
+    """
+    from pypdf import PdfWriter
 
-    doc.build(story)
+    part_dir = tempfile.mkdtemp(prefix=".parts-", dir=os.path.dirname(pdf_path) or ".")
+    try:
+        jobs = []
+        for idx, summary in enumerate(room_reports, start=1):
+            # only the rows the table shows cross the process boundary
+            summary = dict(summary, table_rows=(summary.get("table_rows") or [])[-PDF_TABLE_ROWS:])
+            jobs.append((date_str, len(room_reports), idx, summary, os.path.join(part_dir, f"{idx:05d}.pdf")))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_render_room_pdf, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+        writer = PdfWriter()
+        for part in parts:
+            writer.append(part)
+        writer.add_metadata({"/Title": f"Hygrometer Report {date_str}"})
+        with open(pdf_path, "wb") as f:
+            writer.write(f)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+def render_report_pdf(date_str: str, room_reports, pdf_path: str):
+    """
+    Parallel rendering for larger reports, the plain path otherwise.
+    """
+    workers = min(REPORT_WORKERS, len(room_reports))
+    if workers > 1 and len(room_reports) >= REPORT_PARALLEL_MIN_ROOMS:
+        generate_pdf_parallel(date_str, room_reports, pdf_path, workers)
+    else:
+        generate_pdf(date_str, room_reports, pdf_path)
 
 
-def generate_report(date_str: str) -> str:
-    os.makedirs(REPORTS_DIR, exist_ok=True)
+def report_paths(date_str: str):
     day_dir = os.path.join(REPORTS_DIR, date_str)
-    os.makedirs(day_dir, exist_ok=True)
+    return {
+        "dir": day_dir,
+        "pdf": os.path.join(day_dir, f"report_{date_str}.pdf"),
+        "zip": os.path.join(day_dir, f"report_{date_str}.zip"),
+        "key": os.path.join(day_dir, f"report_{date_str}.key"),
+    }
 
-    rooms = load_rooms()
-    room_reports = []
 
+def report_input_hash(date_str: str, rooms, rows_by_room, mould: dict) -> str:
+    """
+    SHA-256 over everything a day's report is built from: the day's rows,
+    the room config, thresholds, filters and the end-of-day mould-risk
+    index. The server-side aggregates are a function of the same rows and
+    thresholds.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(
+        {"format": REPORT_FORMAT, "date": date_str, "rooms": rooms, "mould": mould,
+         "warn": HUMIDITY_WARN, "alert": HUMIDITY_ALERT, "exclude_anomalies": EXCLUDE_ANOMALIES},
+        sort_keys=True,
+    ).encode("utf-8"))
     for room in rooms:
-        rows = load_rows_for_room(date_str, room["id"])
-        room_reports.append(build_room_summary(room, rows))
+        h.update(b"\0" + room["id"].encode("utf-8") + b"\0")
+        h.update(json.dumps(rows_by_room.get(room["id"]) or []).encode("utf-8"))
+    return h.hexdigest()
+
+
+def cached_report(date_str: str, input_hash: str):
+    """
+    Zip path of the existing report if it was built from the same inputs.
+    """
+    paths = report_paths(date_str)
+    try:
+        with open(paths["key"], "r", encoding="utf-8") as f:
+            if f.read().strip() != input_hash:
+                return None
+    except OSError:
+        return None
+    if not (os.path.exists(paths["zip"]) and os.path.exists(paths["pdf"])):
+        return None
+    return paths["zip"]
+
+
+def generate_report(date_str: str, force: bool = False) -> str:
+    rooms = load_rooms()
+    room_ids = [room["id"] for room in rooms]
+    rows_by_room, mould = load_day_rows(date_str, room_ids)
+    input_hash = report_input_hash(date_str, rooms, rows_by_room, mould)
+
+    zip_path = None if force else cached_report(date_str, input_hash)
+    if zip_path:
+        print(f"[INFO] {date_str}: inputs unchanged, keeping existing report")
+        return zip_path
+
+    return write_report(date_str, rooms, rows_by_room, fetch_day_stats(date_str), mould, input_hash)
+
+
+def backfill_reports(first: str, last: str, force: bool = False):
+    """
+    Reports for every day from first to last (inclusive), in one pass over
+    the readings. Days whose inputs are unchanged are skipped; the stats
+    for the range are only requested once a day needs rendering.
+    """
+    rooms = load_rooms()
+    room_ids = [room["id"] for room in rooms]
+    range_stats = None
+    built = skipped = 0
+
+    for date_str, rows_by_room, mould in iter_range_rows(first, last, room_ids):
+        input_hash = report_input_hash(date_str, rooms, rows_by_room, mould)
+        if not force and cached_report(date_str, input_hash):
+            skipped += 1
+            continue
+
+        if range_stats is None:
+            range_stats = fetch_range_stats(first, last)
+        zip_path = write_report(date_str, rooms, rows_by_room, range_stats.get(date_str, {}), mould, input_hash)
+        print(f"[OK] generated {zip_path}", flush=True)
+        built += 1
+
+    print(f"[INFO] backfill {first}..{last}: {built} generated, {skipped} unchanged", flush=True)
+
+
+def write_report(date_str: str, rooms, rows_by_room, stats_by_room, mould: dict, input_hash: str) -> str:
+    """
+    Render the PDF and ZIP for one day. The input hash is recorded last, so
+    an interrupted report is rebuilt on the next run.
+    """
+    paths = report_paths(date_str)
+    os.makedirs(paths["dir"], exist_ok=True)
+    if os.path.exists(paths["key"]):
+        os.remove(paths["key"])
+
+    room_reports = [
+        build_room_summary(room, rows_by_room[room["id"]], stats_by_room.get(room["id"]) or {},
+                           (mould.get(room["id"]) or {}).get("index"))
+        for room in rooms
+    ]
 
     summary = {
         "date": date_str,
         "generated_utc": datetime.utcnow().isoformat() + "Z",
+        "input_hash": input_hash,
         "thresholds": {
             "warn": HUMIDITY_WARN,
             "alert": HUMIDITY_ALERT,
@@ -379,13 +716,17 @@ def generate_report(date_str: str) -> str:
                 "temp_c": room_summary["temp_c"],
                 "humidity_pct": room_summary["humidity_pct"],
                 "battery_mv": room_summary["battery_mv"],
+                "dew_point_c": room_summary["dew_point_c"],
+                "abs_humidity_gm3": room_summary["abs_humidity_gm3"],
                 "hours_humidity_above_warn": room_summary["hours_humidity_above_warn"],
                 "hours_humidity_above_alert": room_summary["hours_humidity_above_alert"],
+                "hours_mould_risk": room_summary["hours_mould_risk"],
+                "mould_risk_index": room_summary["mould_risk_index"],
             }
         )
 
-    pdf_path = os.path.join(day_dir, f"report_{date_str}.pdf")
-    generate_pdf(date_str, room_reports, pdf_path)
+    pdf_path = paths["pdf"]
+    render_report_pdf(date_str, room_reports, pdf_path)
 
     csv_lines = ["room_id,room_label,timestamp_iso,epoch,temp_c,humidity_pct,battery_mv"]
     for room_summary in room_reports:
@@ -408,12 +749,15 @@ def generate_report(date_str: str) -> str:
 
     csv_text = "\n".join(csv_lines) + "\n"
 
-    zip_path = os.path.join(day_dir, f"report_{date_str}.zip")
+    zip_path = paths["zip"]
     with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
         z.writestr("summary.json", json.dumps(summary, indent=2))
         z.writestr("data.csv", csv_text)
         z.write(pdf_path, arcname=os.path.basename(pdf_path))
 
+    with open(paths["key"], "w", encoding="utf-8") as f:
+        f.write(input_hash + "\n")
+
     return zip_path
 
 
@@ -483,6 +827,8 @@ def send_email(date_str: str, zip_path: str):
             )
             body.append(f"Hours > warn({HUMIDITY_WARN}%): {room.get('hours_humidity_above_warn', 0)}")
             body.append(f"Hours > alert({HUMIDITY_ALERT}%): {room.get('hours_humidity_above_alert', 0)}")
+            body.append(f"Hours mould-favourable: {room.get('hours_mould_risk', 0)} "
+                        f"(risk index {room.get('mould_risk_index') if room.get('mould_risk_index') is not None else '—'})")
             body.append("")
     else:
         body.append("Summary could not be loaded from the report zip.")
@@ -517,13 +863,44 @@ def send_email(date_str: str, zip_path: str):
     print(f"[OK] emailed report to {recipients}")
 
 
+def valid_date(value: str) -> str:
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+    return value
+
+
 def main():
+    try:
+        run()
+    except StatsUnavailable as e:
+        print(f"[ERROR] {e}", flush=True)
+        raise SystemExit(1)
+
+
+def run():
+    ap = argparse.ArgumentParser(description="Generate (and email) the daily hygrometer report.")
+    ap.add_argument("--from", dest="first", type=valid_date, help="backfill: first day (YYYY-MM-DD); no email is sent")
+    ap.add_argument("--to", dest="last", type=valid_date, help="backfill: last day (default: yesterday)")
+    ap.add_argument("--force", action="store_true", help="rebuild even if the inputs are unchanged")
+    args = ap.parse_args()
+
+    if args.first or args.last:
+        if not args.first:
+            ap.error("--to needs --from")
+        last = args.last or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        if last < args.first:
+            ap.error("--to is before --from")
+        backfill_reports(args.first, last, force=args.force)
+        return
+
     # default: report for "today" in local time (container TZ)
     date_str = os.getenv("REPORT_DATE", "").strip()
     if not date_str:
         date_str = datetime.now().strftime("%Y-%m-%d")
 
-    zip_path = generate_report(date_str)
+    zip_path = generate_report(date_str, force=args.force)
     print(f"[OK] generated {zip_path}")
 
     if os.getenv("SEND_EMAIL", "1") == "1":
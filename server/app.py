@@ -1,15 +1,17 @@
 import csv
+import hashlib
 import io
 import asyncio
+import math
 import os
 import sqlite3
-from datetime import datetime, date
-from typing import List, Optional
+from datetime import datetime, date, timezone
+from typing import Any, Dict, List, Optional
 import subprocess
 import re
 from fastapi import HTTPException
 from fastapi import FastAPI, UploadFile, File, Form, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
@@ -21,7 +23,12 @@ from fastapi.responses import FileResponse
 from fastapi import Query
 import smtplib
 import ssl
+import sys
+import threading
+import time
+import urllib.request
 from email.message import EmailMessage
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
 
 DATA_DIR = os.getenv("DATA_DIR", "/data")
 
@@ -31,6 +38,93 @@ SETUP_CONFIG_PATH = os.path.join(DATA_DIR, "config.json")
 INSIGHTS_PATH = os.path.join(DATA_DIR, "insights", "latest.json")
 REPORTS_DIR = os.path.join(DATA_DIR, "reports")
 
+HUMIDITY_WARN = float(os.getenv("HUMIDITY_WARN", "60"))
+HUMIDITY_ALERT = float(os.getenv("HUMIDITY_ALERT", "65"))
+STATS_GAP_CAP_SECS = int(os.getenv("STATS_GAP_CAP_SECS", str(3 * 3600)))  # cap offline gaps in time-above
+STATS_PERCENTILES = (50, 90, 95)
+STATS_MAX_BUCKETS = 5000
+# cumulative mould-risk index per room (simplified VTT model, 0..6), hourly steps
+MOULD_TICK_SECS = float(os.getenv("MOULD_TICK_SECS", "300"))        # how often the background tick advances it
+MOULD_GROWTH_HOURS = float(os.getenv("MOULD_GROWTH_HOURS", "168"))  # favourable hours per index unit
+MOULD_DECAY_RATIO = float(os.getenv("MOULD_DECAY_RATIO", "0.5"))    # recovery per dry hour relative to growth
+MOULD_INDEX_MAX = 6.0
+GAP_THRESHOLD_SECS = int(os.getenv("GAP_THRESHOLD_SECS", "3600"))  # silence longer than this is an outage
+
+# streaming alerts (evaluated on ingest)
+ALERT_HYSTERESIS_RH = float(os.getenv("ALERT_HYSTERESIS_RH", "2"))          # clear only below threshold - this
+ALERT_MIN_DURATION_SECS = int(os.getenv("ALERT_MIN_DURATION_SECS", "600"))  # must stay above this long to raise
+ALERT_COOLDOWN_SECS = int(os.getenv("ALERT_COOLDOWN_SECS", "3600"))         # per room+level between notifications
+ALERT_NOTIFY_MAX_AGE_SECS = int(os.getenv("ALERT_NOTIFY_MAX_AGE_SECS", str(12 * 3600)))  # older readings: log only
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "").strip()
+ALERT_EMAIL = os.getenv("ALERT_EMAIL", "1") == "1"                          # uses the report email settings
+ALERT_NOTIFY_POLL_SECS = float(os.getenv("ALERT_NOTIFY_POLL_SECS", "30"))
+ALERT_NOTIFY_MAX_ATTEMPTS = int(os.getenv("ALERT_NOTIFY_MAX_ATTEMPTS", "10"))
+ALERT_LEVELS = ("ok", "warn", "alert")
+
+# per-room trends (exponentially weighted least squares, updated on ingest)
+TREND_RH_TAU_SECS = int(os.getenv("TREND_RH_TAU_SECS", str(3 * 3600)))              # humidity memory
+TREND_RH_HORIZON_SECS = int(os.getenv("TREND_RH_HORIZON_SECS", str(24 * 3600)))     # don't project further
+TREND_BATTERY_TAU_SECS = int(os.getenv("TREND_BATTERY_TAU_SECS", str(14 * 86400)))  # battery memory
+TREND_BATTERY_HORIZON_SECS = int(os.getenv("TREND_BATTERY_HORIZON_SECS", str(3 * 365 * 86400)))
+TREND_MIN_POINTS = float(os.getenv("TREND_MIN_POINTS", "6"))  # effective (weighted) readings before projecting
+BATTERY_EMPTY_MV = int(os.getenv("BATTERY_EMPTY_MV", "2200"))
+
+# streaming sensor-fault detection (flags go to reading_anomalies)
+ANOMALY_TAU_SECS = int(os.getenv("ANOMALY_TAU_SECS", "7200"))              # EWMA memory for mean/variance
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "6"))                             # spike: |x - mean| > Z sigma ...
+ANOMALY_MIN_DELTA = {"humidity": float(os.getenv("ANOMALY_MIN_DELTA_RH", "8")),   # ... and more than this
+                     "temp": float(os.getenv("ANOMALY_MIN_DELTA_C", "3"))}
+ANOMALY_CONFIRM = int(os.getenv("ANOMALY_CONFIRM", "3"))                   # outliers in a row = real level shift
+ANOMALY_STUCK_SECS = int(os.getenv("ANOMALY_STUCK_SECS", str(6 * 3600)))  # identical temp+RH this long = frozen
+ANOMALY_WARMUP = 10
+ANOMALY_SIGMA_FLOOR = {"humidity": 0.2, "temp": 0.05}                     # below sensor resolution noise
+ANOMALY_RANGE = {"humidity": (0.0, 100.0), "temp": (-40.0, 85.0)}        # sensor limits; RH 0 is a byte artefact
+
+SQLITE_BUSY_TIMEOUT_SECS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECS", "5"))
+SQLITE_LOCK_SLICE_SECS = 0.05  # sqlite's own busy wait per attempt; retries are counted as lock waits
+
+# ---- Opt-in request profiling (X-Profile: 1 header or ?profile=1) ----
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# ---- Metrics (scraped from /metrics) ----
+HTTP_LATENCY = Histogram(
+    "hygro_http_request_duration_seconds", "Request latency per route",
+    ["method", "route", "status"],
+)
+INGEST_READINGS = Counter(
+    "hygro_ingest_readings_total", "Readings written to the database",
+    ["room_id", "source"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "hygro_sqlite_query_duration_seconds", "SQLite statement time (including lock waits)",
+    ["op"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_LOCK_WAITS = Counter(
+    "hygro_sqlite_lock_waits_total", "Times a statement hit a locked database and had to wait",
+    ["op"],
+)
+AUTO_IMPORT_DURATION = Histogram(
+    "hygro_auto_import_duration_seconds", "Duration of one current.csv auto-import pass",
+)
+AUTO_IMPORT_ROWS = Counter(
+    "hygro_auto_import_rows_total", "Rows processed by the current.csv auto-import loop",
+)
+ALERT_EVENTS = Counter(
+    "hygro_alert_events_total", "Alert state transitions emitted by the ingest path",
+    ["kind", "level"],
+)
+ANOMALIES = Counter(
+    "hygro_anomalies_total", "Readings flagged as suspicious on ingest",
+    ["kind"],
+)
+ALERT_NOTIFICATIONS = Counter(
+    "hygro_alert_notifications_total", "Alert notification outcomes",
+    ["status"],
+)
+
 os.makedirs(REPORTS_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(os.path.join(DATA_DIR, "insights"), exist_ok=True)
@@ -55,6 +149,15 @@ class IngestReadingReq(BaseModel):
     humidity_pct: Optional[float] = None
     battery_mv: Optional[int] = None
 
+class CollectorTelemetryReq(BaseModel):
+    collector: str
+    since_epoch: Optional[int] = None
+    rooms: Dict[str, Dict[str, Any]] = {}
+
+class IngestBatchReq(BaseModel):
+    readings: List[IngestReadingReq]
+    telemetry: Optional[CollectorTelemetryReq] = None
+
 class SelectDeviceReq(BaseModel):
     mac: str
     name: Optional[str] = None
@@ -188,17 +291,16 @@ def save_email_config(email_cfg: dict) -> dict:
     _save_setup_cfg(cfg)
     return cfg["email"]
 
-def send_email_with_attachment_from_config(file_path: str):
+def _checked_email_config():
+    """
+    Enabled email settings and the recipient list, or RuntimeError.
+    """
     email = get_email_config()
 
     if not email.get("enabled"):
         raise RuntimeError("Email not enabled")
 
     smtp_host = email.get("smtp_host", "").strip()
-    smtp_port = int(email.get("smtp_port", 587))
-    smtp_tls = bool(email.get("smtp_tls", True))
-    smtp_user = email.get("smtp_user", "").strip()
-    smtp_pass = email.get("smtp_pass", "").strip()
     mail_from = email.get("mail_from", "").strip()
     mail_to = email.get("mail_to", "").strip()
 
@@ -212,6 +314,28 @@ def send_email_with_attachment_from_config(file_path: str):
     recipients = [x.strip() for x in mail_to.split(",") if x.strip()]
     if not recipients:
         raise RuntimeError("No valid recipients configured")
+    return email, recipients
+
+def _smtp_send(email: dict, msg: EmailMessage) -> None:
+    with smtplib.SMTP(email["smtp_host"].strip(), int(email.get("smtp_port", 587)), timeout=30) as s:
+        if email.get("smtp_tls", True):
+            s.starttls(context=ssl.create_default_context())
+        if email.get("smtp_user", "").strip():
+            s.login(email["smtp_user"].strip(), email.get("smtp_pass", "").strip())
+        s.send_message(msg)
+
+def send_email_from_config(subject: str, body: str) -> None:
+    email, recipients = _checked_email_config()
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = email["mail_from"].strip()
+    msg["To"] = ", ".join(recipients)
+    msg.set_content(body)
+    _smtp_send(email, msg)
+
+def send_email_with_attachment_from_config(file_path: str):
+    email, recipients = _checked_email_config()
+    mail_from = email["mail_from"].strip()
 
     fp = Path(file_path)
     if not fp.exists():
@@ -232,13 +356,7 @@ def send_email_with_attachment_from_config(file_path: str):
         maintype, subtype = "application", "octet-stream"
 
     msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=fp.name)
-
-    with smtplib.SMTP(smtp_host, smtp_port, timeout=30) as s:
-        if smtp_tls:
-            s.starttls(context=ssl.create_default_context())
-        if smtp_user:
-            s.login(smtp_user, smtp_pass)
-        s.send_message(msg)
+    _smtp_send(email, msg)
         
 
 def build_room_status(cfg: dict, room: dict, stale_seconds: int) -> dict:
@@ -309,6 +427,458 @@ def calc_age_seconds(epoch_val) -> Optional[int]:
     except Exception:
         return None
 
+def _sqlite_has_math() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("SELECT ln(1), exp(0)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+SQLITE_HAS_MATH = _sqlite_has_math()  # builds without SQLITE_ENABLE_MATH_FUNCTIONS get Python fallbacks
+
+def psychro_sql(t: str, h: str) -> dict:
+    """
+    SQL expressions for metrics derived from temperature/RH columns, so they
+    are computed set-wise by the query that aggregates or lists readings:
+    dew point (Magnus, °C), absolute humidity (g/m³) and a 0/1 flag for
+    mould-favourable conditions (VTT critical RH: a cubic in T up to 20 °C,
+    80% above).
+    """
+    g = f"(ln({h} / 100.0) + 17.62 * {t} / (243.12 + {t}))"
+    return {
+        "dew_c": f"CASE WHEN {t} IS NOT NULL AND {h} > 0 THEN 243.12 * {g} / (17.62 - {g}) END",
+        "ah_gm3": f"CASE WHEN {t} IS NOT NULL AND {h} IS NOT NULL "
+                  f"THEN 6.112 * exp(17.67 * {t} / ({t} + 243.5)) * {h} * 2.1674 / (273.15 + {t}) END",
+        "mould": f"CASE WHEN {t} BETWEEN 0 AND 50 AND {h} >= "
+                 f"(CASE WHEN {t} <= 20 THEN ((-0.00267 * {t} + 0.160) * {t} - 3.13) * {t} + 100 ELSE 80 END) "
+                 f"THEN 1 ELSE 0 END",
+    }
+
+def _stats_sql() -> str:
+    """
+    One pass over the window, grouped per room (and per time bucket when
+    :bucket is set; otherwise the whole window is one bucket).
+
+    dt is the time a reading "holds" until the next one (LEAD over a range
+    extended by the gap cap), clipped at the window end and capped so an
+    offline sensor does not count as hours above threshold. A reading's dt
+    counts in its own bucket, so bucket sums add up to the window's.
+    Derived psychrometric columns come from psychro_sql(). With :exclude,
+    readings flagged in reading_anomalies are left out entirely.
+    """
+    ps = psychro_sql("temp_c", "humidity_pct")
+    pct_cols = []
+    for col, alias in (("temp_c", "t"), ("humidity_pct", "h")):
+        for p in STATS_PERCENTILES:
+            pct_cols.append(
+                f"MIN(CASE WHEN {col} IS NOT NULL AND rn_{alias} * 100 >= {p} * n_{alias} THEN {col} END) AS {alias}_p{p}"
+            )
+
+    return f"""
+        WITH ext AS (
+            SELECT room_id, epoch, temp_c, humidity_pct, battery_mv,
+                   {ps["dew_c"]} AS dew_c, {ps["ah_gm3"]} AS ah_gm3, {ps["mould"]} AS mould,
+                   CASE WHEN :bucket IS NULL THEN :start ELSE epoch - epoch % :bucket END AS bkt,
+                   LEAD(epoch) OVER (PARTITION BY room_id ORDER BY epoch) AS next_epoch
+            FROM readings r
+            WHERE epoch >= :start AND epoch < :end + :gap_cap
+              AND (:room_id IS NULL OR room_id = :room_id)
+              AND (:exclude = 0 OR NOT EXISTS (
+                    SELECT 1 FROM reading_anomalies a WHERE a.room_id = r.room_id AND a.epoch = r.epoch))
+        ),
+        w AS (
+            SELECT room_id, bkt, epoch, temp_c, humidity_pct, battery_mv, dew_c, ah_gm3, mould,
+                   CASE WHEN next_epoch IS NULL THEN 0
+                        ELSE MIN(MIN(next_epoch, :end) - epoch, :gap_cap) END AS dt,
+                   ROW_NUMBER() OVER (PARTITION BY room_id, bkt ORDER BY temp_c IS NULL, temp_c) AS rn_t,
+                   COUNT(temp_c) OVER (PARTITION BY room_id, bkt) AS n_t,
+                   ROW_NUMBER() OVER (PARTITION BY room_id, bkt ORDER BY humidity_pct IS NULL, humidity_pct) AS rn_h,
+                   COUNT(humidity_pct) OVER (PARTITION BY room_id, bkt) AS n_h,
+                   FIRST_VALUE(epoch) OVER (PARTITION BY room_id, bkt ORDER BY temp_c DESC, epoch) AS t_peak_epoch,
+                   FIRST_VALUE(epoch) OVER (PARTITION BY room_id, bkt ORDER BY humidity_pct DESC, epoch) AS h_peak_epoch
+            FROM ext
+            WHERE epoch < :end
+        )
+        SELECT room_id, bkt,
+               COUNT(*) AS points, MIN(epoch) AS first_epoch, MAX(epoch) AS last_epoch,
+               COUNT(temp_c) AS t_count, MIN(temp_c) AS t_min, MAX(temp_c) AS t_max, AVG(temp_c) AS t_avg,
+               MAX(t_peak_epoch) AS t_peak_epoch,
+               COUNT(humidity_pct) AS h_count, MIN(humidity_pct) AS h_min, MAX(humidity_pct) AS h_max,
+               AVG(humidity_pct) AS h_avg, MAX(h_peak_epoch) AS h_peak_epoch,
+               COUNT(battery_mv) AS b_count, MIN(battery_mv) AS b_min, MAX(battery_mv) AS b_max,
+               AVG(battery_mv) AS b_avg,
+               COUNT(dew_c) AS d_count, MIN(dew_c) AS d_min, MAX(dew_c) AS d_max, AVG(dew_c) AS d_avg,
+               COUNT(ah_gm3) AS a_count, MIN(ah_gm3) AS a_min, MAX(ah_gm3) AS a_max, AVG(ah_gm3) AS a_avg,
+               SUM(dt) AS secs_covered,
+               SUM(CASE WHEN mould = 1 THEN dt ELSE 0 END) AS secs_mould,
+               SUM(CASE WHEN humidity_pct >= :warn THEN dt ELSE 0 END) AS secs_above_warn,
+               SUM(CASE WHEN humidity_pct >= :alert THEN dt ELSE 0 END) AS secs_above_alert,
+               {", ".join(pct_cols)}
+        FROM w
+        GROUP BY room_id, bkt
+        ORDER BY room_id, bkt
+    """
+
+def _stats_block(row, prefix: str, percentiles: bool = True, peak: bool = True, cast=float) -> Optional[dict]:
+    if not row[f"{prefix}_count"]:
+        return None
+    out = {
+        "min": cast(row[f"{prefix}_min"]),
+        "max": cast(row[f"{prefix}_max"]),
+        "avg": float(row[f"{prefix}_avg"]),
+        "count": int(row[f"{prefix}_count"]),
+    }
+    if percentiles:
+        for p in STATS_PERCENTILES:
+            out[f"p{p}"] = float(row[f"{prefix}_p{p}"])
+    if peak:
+        out["peak_epoch"] = row[f"{prefix}_peak_epoch"]
+    return out
+
+def compute_stats(
+    conn: sqlite3.Connection,
+    start_epoch: int,
+    end_epoch: int,
+    room_id: Optional[str] = None,
+    warn_rh: float = HUMIDITY_WARN,
+    alert_rh: float = HUMIDITY_ALERT,
+    gap_cap: int = STATS_GAP_CAP_SECS,
+    bucket: Optional[int] = None,
+    exclude_anomalies: bool = False,
+) -> dict:
+    """
+    Aggregates for readings with start_epoch <= epoch < end_epoch, keyed by room_id.
+    Rooms without readings in the window are absent from the result.
+
+    With `bucket` (seconds, epoch-aligned) each room maps to a list of
+    per-bucket aggregates instead, oldest first; empty buckets are omitted.
+    """
+    params = {
+        "start": int(start_epoch),
+        "end": int(end_epoch),
+        "room_id": room_id,
+        "gap_cap": int(gap_cap),
+        "warn": float(warn_rh),
+        "alert": float(alert_rh),
+        "bucket": int(bucket) if bucket else None,
+        "exclude": 1 if exclude_anomalies else 0,
+    }
+    cur = conn.execute(_stats_sql(), params)
+    cols = [c[0] for c in cur.description]
+
+    out = {}
+    for values in cur.fetchall():
+        row = dict(zip(cols, values))
+        if bucket:
+            b_start, b_end = max(row["bkt"], params["start"]), min(row["bkt"] + params["bucket"], params["end"])
+        else:
+            b_start, b_end = params["start"], params["end"]
+        st = {
+            "room_id": row["room_id"],
+            "start": b_start,
+            "end": b_end,
+            "points": int(row["points"]),
+            "first_epoch": row["first_epoch"],
+            "last_epoch": row["last_epoch"],
+            "temperature": _stats_block(row, "t"),
+            "humidity": _stats_block(row, "h"),
+            "battery_mv": _stats_block(row, "b", percentiles=False, peak=False, cast=int),
+            "dew_point": _stats_block(row, "d", percentiles=False, peak=False),
+            "absolute_humidity": _stats_block(row, "a", percentiles=False, peak=False),
+            "thresholds": {"warn_rh": params["warn"], "alert_rh": params["alert"]},
+            "seconds_covered": int(row["secs_covered"] or 0),
+            "seconds_humidity_above_warn": int(row["secs_above_warn"] or 0),
+            "seconds_humidity_above_alert": int(row["secs_above_alert"] or 0),
+            "hours_humidity_above_warn": round((row["secs_above_warn"] or 0) / 3600.0, 2),
+            "hours_humidity_above_alert": round((row["secs_above_alert"] or 0) / 3600.0, 2),
+            "seconds_mould_risk": int(row["secs_mould"] or 0),
+            "hours_mould_risk": round((row["secs_mould"] or 0) / 3600.0, 2),
+        }
+        if bucket:
+            out.setdefault(row["room_id"], []).append(st)
+        else:
+            out[row["room_id"]] = st
+    return out
+
+_mould_lock = threading.Lock()
+
+def update_mould_index(conn: sqlite3.Connection, room_ids, now: int) -> dict:
+    """
+    Advance each room's cumulative mould-risk index through the last full
+    hour and return {room_id: {"index", "through_epoch"}}.
+
+    Each hour adds its mould-favourable hours / MOULD_GROWTH_HOURS and takes
+    off MOULD_DECAY_RATIO times that rate for every other covered hour,
+    clamped to 0..MOULD_INDEX_MAX; hours without data leave it unchanged.
+    Hourly steps are kept in mould_index so late data can rewind
+    (rewind_mould_index); only hours after mould_index_state are computed,
+    in one grouped stats pass per distinct starting hour.
+    """
+    hour = now - now % 3600
+    out = {}
+    with _mould_lock:
+        starts = {}
+        for room_id in room_ids:
+            row = conn.execute("SELECT through_epoch, idx FROM mould_index_state WHERE room_id=?", (room_id,)).fetchone()
+            if row is None:
+                first = conn.execute("SELECT MIN(epoch) FROM readings WHERE room_id=?", (room_id,)).fetchone()[0]
+                if first is None:
+                    continue
+                row = (first - first % 3600, 0.0)
+            out[room_id] = {"index": row[1], "through_epoch": row[0]}
+            if row[0] < hour:
+                starts.setdefault(row[0], []).append(room_id)
+
+        for start, ids in starts.items():
+            stats = compute_stats(conn, start, hour, room_id=ids[0] if len(ids) == 1 else None, bucket=3600)
+            for room_id in ids:
+                idx = out[room_id]["index"]
+                steps = []
+                for b in stats.get(room_id) or []:
+                    risk_h = b["seconds_mould_risk"] / 3600.0
+                    dry_h = max(0.0, b["seconds_covered"] / 3600.0 - risk_h)
+                    idx += (risk_h - MOULD_DECAY_RATIO * dry_h) / MOULD_GROWTH_HOURS
+                    idx = min(MOULD_INDEX_MAX, max(0.0, idx))
+                    steps.append((room_id, b["start"], b["seconds_mould_risk"], b["seconds_covered"], idx))
+                with conn:
+                    # only if no write rewound the room meanwhile (the update then matches nothing)
+                    cur = conn.execute(
+                        "UPDATE mould_index_state SET through_epoch=?, idx=? WHERE room_id=? AND through_epoch=?",
+                        (hour, idx, room_id, start),
+                    )
+                    if cur.rowcount == 0:
+                        cur = conn.execute(
+                            "INSERT OR IGNORE INTO mould_index_state(room_id, through_epoch, idx) VALUES (?,?,?)",
+                            (room_id, hour, idx),
+                        )
+                    if cur.rowcount == 0:
+                        continue
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO mould_index(room_id, hour_epoch, risk_secs, covered_secs, idx) VALUES (?,?,?,?,?)",
+                        steps,
+                    )
+                out[room_id] = {"index": idx, "through_epoch": hour}
+
+    for v in out.values():
+        v["index"] = round(v["index"], 3)
+    return out
+
+def load_mould_index(conn: sqlite3.Connection, room_ids) -> dict:
+    """
+    {room_id: {"index", "through_epoch"}} as last advanced by the tick;
+    rooms it has not reached yet are absent. Read-only.
+    """
+    ids = list(room_ids)
+    if not ids:
+        return {}
+    rows = conn.execute(
+        f"SELECT room_id, through_epoch, idx FROM mould_index_state WHERE room_id IN ({','.join('?' * len(ids))})",
+        ids,
+    ).fetchall()
+    return {room_id: {"index": round(idx, 3), "through_epoch": through} for room_id, through, idx in rows}
+
+def rewind_mould_index(conn: sqlite3.Connection, room_id: str, epoch: int) -> None:
+    """
+    Forget index steps from the hour holding `epoch` so they are recomputed.
+    Callers pass the reading before the new ones, whose span (dt) they change.
+    """
+    hour = epoch - epoch % 3600
+    row = conn.execute("SELECT through_epoch FROM mould_index_state WHERE room_id=?", (room_id,)).fetchone()
+    if row is None or row[0] <= hour:
+        return
+    prev = conn.execute(
+        "SELECT idx FROM mould_index WHERE room_id=? AND hour_epoch < ? ORDER BY hour_epoch DESC LIMIT 1",
+        (room_id, hour),
+    ).fetchone()
+    conn.execute("DELETE FROM mould_index WHERE room_id=? AND hour_epoch >= ?", (room_id, hour))
+    if prev is None:
+        conn.execute("DELETE FROM mould_index_state WHERE room_id=?", (room_id,))  # restart from the first reading
+    else:
+        conn.execute("UPDATE mould_index_state SET through_epoch=?, idx=? WHERE room_id=?", (hour, prev[0], room_id))
+
+def store_collector_telemetry(conn: sqlite3.Connection, t: "CollectorTelemetryReq") -> None:
+    """
+    Keep the latest per-room summary each collector pushed with its batch.
+    """
+    now = int(time.time())
+    conn.executemany(
+        "INSERT OR REPLACE INTO collector_telemetry(collector, room_id, updated_epoch, since_epoch, summary) VALUES (?,?,?,?,?)",
+        [(t.collector, room_id, now, t.since_epoch, json.dumps(summary)) for room_id, summary in t.rooms.items()],
+    )
+
+def load_collector_telemetry(conn: sqlite3.Connection) -> list:
+    """
+    Latest summary per (collector, room), slowest rooms first. `poll_secs`
+    is the mean scan + connect + first-notify time.
+    """
+    out = []
+    for collector, room_id, updated, since, summary in conn.execute(
+        "SELECT collector, room_id, updated_epoch, since_epoch, summary FROM collector_telemetry"
+    ).fetchall():
+        item = json.loads(summary)
+        means = [item.get(f"{p}_mean") for p in ("scan", "connect", "first_notify")]
+        item.update({
+            "collector": collector,
+            "room_id": room_id,
+            "updated_epoch": updated,
+            "since_epoch": since,
+            "age_seconds": calc_age_seconds(updated),
+            "poll_secs": round(sum(m for m in means if m is not None), 2) if any(m is not None for m in means) else None,
+        })
+        out.append(item)
+    out.sort(key=lambda r: -(r["poll_secs"] or 0))
+    return out
+
+def refresh_gaps(conn: sqlite3.Connection, room_id: str, lo: int, hi: int) -> None:
+    """
+    Re-derive reading_gaps for one room around newly written epochs [lo, hi].
+
+    Widened to the neighbouring readings outside the range, so only gaps
+    that can have changed are touched; one LAG pass over that slice.
+    """
+    prev = conn.execute("SELECT MAX(epoch) FROM readings WHERE room_id=? AND epoch < ?", (room_id, lo)).fetchone()[0]
+    nxt = conn.execute("SELECT MIN(epoch) FROM readings WHERE room_id=? AND epoch > ?", (room_id, hi)).fetchone()[0]
+    a = lo if prev is None else prev
+    b = hi if nxt is None else nxt
+    conn.execute("DELETE FROM reading_gaps WHERE room_id=? AND start_epoch >= ? AND start_epoch < ?", (room_id, a, b))
+    rewind_mould_index(conn, room_id, a)
+    conn.execute(
+        """
+        INSERT INTO reading_gaps(room_id, start_epoch, end_epoch)
+        SELECT room_id, prev_epoch, epoch FROM (
+            SELECT room_id, epoch, LAG(epoch) OVER (ORDER BY epoch) AS prev_epoch
+            FROM readings WHERE room_id = ? AND epoch BETWEEN ? AND ?
+        )
+        WHERE prev_epoch IS NOT NULL AND epoch - prev_epoch > ?
+        """,
+        (room_id, a, b, GAP_THRESHOLD_SECS),
+    )
+
+def refresh_gaps_for_rows(conn: sqlite3.Connection, rows) -> None:
+    """
+    refresh_gaps() once per room for ingest rows (room_id, ts_utc, epoch, ...).
+    """
+    span = {}
+    for r in rows:
+        lo, hi = span.get(r[0], (r[2], r[2]))
+        span[r[0]] = (min(lo, r[2]), max(hi, r[2]))
+    for room_id, (lo, hi) in span.items():
+        refresh_gaps(conn, room_id, int(lo), int(hi))
+
+def ensure_gap_index() -> None:
+    """
+    Build reading_gaps from scratch when it is missing or was built with a
+    different GAP_THRESHOLD_SECS (one window-function pass over readings).
+    """
+    conn = get_db()
+    try:
+        row = conn.execute("SELECT threshold_secs FROM reading_gaps_meta").fetchone()
+        if row and row[0] == GAP_THRESHOLD_SECS:
+            return
+        t0 = time.perf_counter()
+        with conn:
+            conn.execute("DELETE FROM reading_gaps")
+            conn.execute(
+                """
+                INSERT INTO reading_gaps(room_id, start_epoch, end_epoch)
+                SELECT room_id, prev_epoch, epoch FROM (
+                    SELECT room_id, epoch, LAG(epoch) OVER (PARTITION BY room_id ORDER BY epoch) AS prev_epoch
+                    FROM readings
+                )
+                WHERE prev_epoch IS NOT NULL AND epoch - prev_epoch > ?
+                """,
+                (GAP_THRESHOLD_SECS,),
+            )
+            conn.execute("DELETE FROM reading_gaps_meta")
+            conn.execute("INSERT INTO reading_gaps_meta(threshold_secs) VALUES (?)", (GAP_THRESHOLD_SECS,))
+        n = conn.execute("SELECT COUNT(*) FROM reading_gaps").fetchone()[0]
+        print(f"[INFO] gap index rebuilt: {n} gap(s) > {GAP_THRESHOLD_SECS}s in {time.perf_counter() - t0:.2f}s", flush=True)
+    finally:
+        conn.close()
+
+def room_gaps(conn: sqlite3.Connection, room_id: str, start: int, end: int, now: int) -> dict:
+    """
+    Outages of one room inside [start, end) and its coverage, from index
+    seeks only. Coverage runs from the room's first reading (or `start`);
+    a room with no reading since its last one gets an open gap up to `now`.
+    """
+    first = conn.execute("SELECT MIN(epoch) FROM readings WHERE room_id=?", (room_id,)).fetchone()[0]
+    last = conn.execute("SELECT MAX(epoch) FROM readings WHERE room_id=? AND epoch < ?", (room_id, end)).fetchone()[0]
+    out = {"room_id": room_id, "start": start, "end": end, "gaps": [],
+           "outage_secs": None, "observed_secs": None, "coverage_pct": None}
+    stop = min(end, now)
+    if first is None or last is None or first >= stop:
+        return out
+    eff_start = max(start, first)
+
+    gaps = [
+        {"start_epoch": a, "end_epoch": b, "ongoing": False}
+        for a, b in conn.execute(
+            "SELECT start_epoch, end_epoch FROM reading_gaps WHERE room_id=? AND start_epoch < ? AND end_epoch > ? ORDER BY start_epoch",
+            (room_id, stop, eff_start),
+        )
+    ]
+    # a later reading means the gap after `last` is closed and already in reading_gaps
+    later = conn.execute("SELECT 1 FROM readings WHERE room_id=? AND epoch > ? LIMIT 1", (room_id, last)).fetchone()
+    if later is None and stop - last > GAP_THRESHOLD_SECS:
+        gaps.append({"start_epoch": last, "end_epoch": None, "ongoing": True})
+
+    outage = 0
+    for g in gaps:
+        a = max(g["start_epoch"], eff_start)
+        b = min(stop if g["end_epoch"] is None else g["end_epoch"], stop)
+        g["duration_secs"] = (stop if g["end_epoch"] is None else g["end_epoch"]) - g["start_epoch"]
+        g["start_utc"] = datetime.fromtimestamp(g["start_epoch"], tz=timezone.utc).isoformat().replace("+00:00", "Z")
+        g["end_utc"] = None if g["end_epoch"] is None else \
+            datetime.fromtimestamp(g["end_epoch"], tz=timezone.utc).isoformat().replace("+00:00", "Z")
+        outage += max(0, b - a)
+
+    observed = stop - eff_start
+    out.update(
+        gaps=gaps,
+        first_epoch=first,
+        last_epoch=last,
+        outage_secs=outage,
+        observed_secs=observed,
+        coverage_pct=round(100.0 * (observed - outage) / observed, 2) if observed > 0 else None,
+    )
+    return out
+
+def stats_window_params(start: Optional[str], end: Optional[str], bucket: Optional[int]):
+    """
+    Validated (start, end) for the stats endpoints; default is the last 24h.
+    """
+    end_epoch = parse_epoch_param(end, int(datetime.now(timezone.utc).timestamp()))
+    start_epoch = parse_epoch_param(start, end_epoch - 24 * 3600)
+    if end_epoch <= start_epoch:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if bucket is not None and (bucket < 60 or (end_epoch - start_epoch) / bucket > STATS_MAX_BUCKETS):
+        raise HTTPException(status_code=400, detail=f"bucket must be >= 60s and give at most {STATS_MAX_BUCKETS} buckets")
+    return start_epoch, end_epoch
+
+def parse_epoch_param(value: Optional[str], default: int) -> int:
+    """
+    Accepts an epoch (int), YYYY-MM-DD (UTC midnight) or an ISO timestamp.
+    """
+    s = (value or "").strip()
+    if not s:
+        return default
+    try:
+        return int(float(s))
+    except ValueError:
+        pass
+    try:
+        if len(s) == 10:
+            return int(datetime.strptime(s, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+        if s.endswith("Z"):
+            s = s[:-1] + "+00:00"
+        dt = datetime.fromisoformat(s)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time value: {value}")
+
 def save_rooms_v2(rooms: list[dict]) -> dict:
     cfg = load_config_v2()
 
@@ -345,26 +915,163 @@ def _load_setup_cfg() -> dict:
 
 def _save_setup_cfg(cfg: dict) -> None:
     os.makedirs(os.path.dirname(SETUP_CONFIG_PATH), exist_ok=True)
-    with open(SETUP_CONFIG_PATH, "w", encoding="utf-8") as f:
+    # temp file + rename: the collectors' watchers never see a half-written file
+    tmp = f"{SETUP_CONFIG_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(cfg, f, indent=2)
+    os.replace(tmp, SETUP_CONFIG_PATH)
 
 app = FastAPI(title="Hygrometer Cloud") 
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+@app.middleware("http")
+async def _observe_latency(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # route template (/api/rooms/{room_id}/day), not the raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        HTTP_LATENCY.labels(
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status),
+        ).observe(time.perf_counter() - t0)
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of the thread running one request's handler every
+    PROFILE_INTERVAL_MS and aggregates it as folded stacks
+    ("thread;file:func;file:func count"), the input format of
+    flamegraph.pl / speedscope / inferno.
+
+    An async handler runs on the event loop thread. A sync handler runs on
+    whichever threadpool worker picks it up, so that thread is found once
+    by looking for the endpoint's code object on a stack, then sampled
+    alone; idle workers and background threads stay out of the profile.
+    """
+
+    def __init__(self, interval_s: float, scope: dict, loop_tid: int):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval_s = interval_s
+        self.scope = scope
+        self.loop_tid = loop_tid
+        self.tid = None
+        self.stacks: dict = {}
+        self._done = threading.Event()
+
+    def _handler_thread(self, frames: dict):
+        # set by the router once the request is matched
+        endpoint = self.scope.get("endpoint")
+        if endpoint is None:
+            return None
+        if asyncio.iscoroutinefunction(endpoint):
+            return self.loop_tid
+        code = getattr(endpoint, "__code__", None)
+        for tid, frame in frames.items():
+            while frame is not None:
+                if frame.f_code is code:
+                    return tid
+                frame = frame.f_back
+        return None
+
+    def run(self):
+        while not self._done.wait(self.interval_s):
+            frames = sys._current_frames()
+            if self.tid is None:
+                self.tid = self._handler_thread(frames)
+            frame = frames.get(self.tid)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            names = {t.ident: t.name for t in threading.enumerate()}
+            parts.append(names.get(self.tid, str(self.tid)))
+            key = ";".join(reversed(parts))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self) -> dict:
+        self._done.set()
+        self.join()
+        return self.stacks
+
+def _write_profile(name: str, stacks: dict) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+        for key, count in sorted(stacks.items()):
+            f.write(f"{key} {count}\n")
+
+    # rotation: keep the newest PROFILE_KEEP files
+    files = sorted(Path(PROFILE_DIR).glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[PROFILE_KEEP:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+if PROFILE_ENABLED:
+    # only registered when enabled, so normal requests pay nothing
+    @app.middleware("http")
+    async def _profile_request(request: Request, call_next):
+        wanted = request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+        if not wanted:
+            return await call_next(request)
+
+        sampler = StackSampler(PROFILE_INTERVAL_MS / 1000.0, request.scope, threading.get_ident())
+        sampler.start()
+        t0 = time.perf_counter()
+        try:
+            return await call_next(request)
+        finally:
+            stacks = sampler.stop()
+            elapsed_ms = int((time.perf_counter() - t0) * 1000)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"
+            name = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}_{request.method}_{slug}_{elapsed_ms}ms.folded"
+            try:
+                _write_profile(name, stacks)
+                print(f"[PROFILE] {request.method} {request.url.path} {elapsed_ms}ms -> {name}", flush=True)
+            except Exception as e:
+                print("[WARN] writing profile failed:", e, flush=True)
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.on_event("startup")
 async def _auto_import_current_csv():
     async def loop():
+        seen = None
         while True:
+            t0 = time.perf_counter()
             try:
-                import_current_csv()  # your existing endpoint function
+                st = os.stat(CSV_CURRENT)
+                key = (st.st_ino, st.st_mtime_ns, st.st_size)
+                if key != seen:  # nothing to do while the file is unchanged
+                    res = import_current_csv()  # your existing endpoint function
+                    AUTO_IMPORT_ROWS.inc(res.get("inserted", 0))
+                    seen = key
+            except FileNotFoundError:
+                seen = None
             except Exception as e:
                 print("[WARN] auto-import failed:", e, flush=True)
+            finally:
+                AUTO_IMPORT_DURATION.observe(time.perf_counter() - t0)
             await asyncio.sleep(60)
 
     asyncio.create_task(loop())
 
+@app.on_event("startup")
+def _build_gap_index():
+    ensure_gap_index()
+
 @app.get("/api/setup/status")
 def setup_status():
     cfg = load_config_v2()
@@ -640,8 +1347,10 @@ def api_room_day(room_id: str, date_str: str = Query(..., description="YYYY-MM-D
 
     conn = get_db()
     try:
+        ps = psychro_sql("temp_c", "humidity_pct")
         cur = conn.execute(
-            """SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv
+            f"""SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv,
+                       ROUND({ps["dew_c"]}, 2), ROUND({ps["ah_gm3"]}, 2)
                FROM readings
                WHERE room_id=? AND ts_utc BETWEEN ? AND ?
                ORDER BY epoch ASC""",
@@ -653,12 +1362,735 @@ def api_room_day(room_id: str, date_str: str = Query(..., description="YYYY-MM-D
             "temp_c": r[2],
             "humidity_pct": r[3],
             "battery_mv": r[4],
+            "dew_point_c": r[5],
+            "abs_humidity_gm3": r[6],
         } for r in cur.fetchall()]
     finally:
         conn.close()
 
     return {"status": "ok", "message": None, "room_id": room_id, "date_str": date_str, "rows": rows}
 
+@app.get("/api/stats")
+def api_stats(
+    start: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: end - 24h)"),
+    end: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: now)"),
+    warn: Optional[float] = None,
+    alert: Optional[float] = None,
+    bucket: Optional[int] = Query(None, description="split into epoch-aligned buckets of this many seconds"),
+    exclude_anomalies: bool = Query(False, description="leave out readings flagged as sensor faults"),
+):
+    """
+    Same as /api/rooms/{room_id}/stats for every room at once (one grouped pass).
+    """
+    start_epoch, end_epoch = stats_window_params(start, end, bucket)
+
+    conn = get_db()
+    try:
+        rooms = compute_stats(
+            conn,
+            start_epoch,
+            end_epoch,
+            warn_rh=HUMIDITY_WARN if warn is None else warn,
+            alert_rh=HUMIDITY_ALERT if alert is None else alert,
+            bucket=bucket,
+            exclude_anomalies=exclude_anomalies,
+        )
+        mould = load_mould_index(conn, rooms)
+    finally:
+        conn.close()
+
+    return {"status": "ok", "start": start_epoch, "end": end_epoch, "bucket": bucket, "rooms": rooms,
+            "mould_risk_index": mould}
+
+@app.get("/api/rooms/{room_id}/stats")
+def api_room_stats(
+    room_id: str,
+    start: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: end - 24h)"),
+    end: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: now)"),
+    warn: Optional[float] = None,
+    alert: Optional[float] = None,
+    bucket: Optional[int] = Query(None, description="split into epoch-aligned buckets of this many seconds"),
+    exclude_anomalies: bool = Query(False, description="leave out readings flagged as sensor faults"),
+):
+    cfg = load_config_v2()
+    get_room_or_404(cfg, room_id)
+    start_epoch, end_epoch = stats_window_params(start, end, bucket)
+
+    conn = get_db()
+    try:
+        stats = compute_stats(
+            conn,
+            start_epoch,
+            end_epoch,
+            room_id=room_id,
+            warn_rh=HUMIDITY_WARN if warn is None else warn,
+            alert_rh=HUMIDITY_ALERT if alert is None else alert,
+            bucket=bucket,
+            exclude_anomalies=exclude_anomalies,
+        )
+        mould = load_mould_index(conn, [room_id]).get(room_id)
+    finally:
+        conn.close()
+
+    if bucket is not None:
+        return {
+            "status": "ok", "room_id": room_id, "start": start_epoch, "end": end_epoch,
+            "bucket": bucket, "buckets": stats.get(room_id) or [], "mould_risk_index": mould,
+        }
+    return {"status": "ok", "room_id": room_id, "start": start_epoch, "end": end_epoch, "stats": stats.get(room_id),
+            "mould_risk_index": mould}
+
+# ---- Streaming humidity alerts ----
+
+class AlertEngine:
+    """
+    Per-room warn/alert state machine, fed every reading from the ingest path.
+
+    A level is raised once humidity has stayed at or above its threshold for
+    ALERT_MIN_DURATION_SECS (reading time, not wall time) and dropped as soon
+    as it falls ALERT_HYSTERESIS_RH below it. Transitions go to alert_events;
+    those that should notify also go to alert_outbox in the same transaction.
+    A raise within ALERT_COOLDOWN_SECS of the last notified raise at that
+    level is logged as 'suppressed'. Transitions on readings older than
+    ALERT_NOTIFY_MAX_AGE_SECS (e.g. an uploaded CSV of history) are logged
+    but not notified.
+
+    State is cached in memory and written back once per room per batch.
+    Only write_readings() drives it, under _ingest_lock, and calls
+    `forget()` if the transaction fails.
+    """
+
+    def __init__(self):
+        self.rooms = {}
+
+    @staticmethod
+    def thresholds():
+        return (None, HUMIDITY_WARN, HUMIDITY_ALERT)
+
+    def _state(self, conn: sqlite3.Connection, room_id: str) -> dict:
+        st = self.rooms.get(room_id)
+        if st is not None:
+            return st
+        row = conn.execute(
+            "SELECT level, pending, raised, notified_level, last_epoch, last_rh FROM alert_state WHERE room_id=?",
+            (room_id,),
+        ).fetchone()
+        if row:
+            st = {
+                "level": row[0],
+                "pending": {int(k): v for k, v in json.loads(row[1]).items()},
+                "raised": {int(k): v for k, v in json.loads(row[2]).items()},
+                "notified_level": row[3],
+                "last_epoch": row[4],
+                "last_rh": row[5],
+            }
+        else:
+            st = {"level": 0, "pending": {}, "raised": {}, "notified_level": 0, "last_epoch": None, "last_rh": None}
+        self.rooms[room_id] = st
+        return st
+
+    def _emit(self, conn, room_id, epoch, ts, kind, level, prev, rh, notify: bool, status: str = "pending"):
+        thr = self.thresholds()[level if kind == "raised" else prev]
+        cur = conn.execute(
+            """
+            INSERT INTO alert_events(room_id, epoch, ts_utc, kind, level, prev_level, humidity_pct, threshold,
+                                     notify_status, created_epoch)
+            VALUES (?,?,?,?,?,?,?,?,?,?)
+            """,
+            (room_id, epoch, ts, kind, level, prev, rh, thr, status if notify else "not_notified", int(time.time())),
+        )
+        if notify and status == "pending":
+            conn.execute("INSERT INTO alert_outbox(event_id, next_attempt) VALUES (?,?)", (cur.lastrowid, 0))
+        ALERT_EVENTS.labels(kind, ALERT_LEVELS[level if kind == "raised" else prev]).inc()
+
+    def observe(self, conn: sqlite3.Connection, room_id: str, epoch: int, rh: Optional[float], ts: str = None) -> int:
+        """
+        Advance one room by one reading. Returns the number of events emitted.
+        """
+        if rh is None:
+            return 0
+        st = self._state(conn, room_id)
+        last = st["last_epoch"]
+        if last is not None and epoch <= last:
+            return 0  # late or replayed reading; never rewind the state machine
+        if last is not None and epoch - last > STATS_GAP_CAP_SECS:
+            st["pending"] = {}  # too long offline to claim it stayed above
+        st["last_epoch"] = epoch
+        st["last_rh"] = rh
+        live = int(time.time()) - epoch <= ALERT_NOTIFY_MAX_AGE_SECS
+
+        thr = self.thresholds()
+        raw = 2 if rh >= thr[2] else 1 if rh >= thr[1] else 0
+        level = st["level"]
+        events = 0
+
+        # down: immediate, but only once clearly below (hysteresis)
+        new = level
+        while new > 0 and rh < thr[new] - ALERT_HYSTERESIS_RH:
+            new -= 1
+        if new < level:
+            notify = live and st["notified_level"] > new
+            self._emit(conn, room_id, epoch, ts, "cleared" if new == 0 else "lowered", new, level, rh, notify)
+            st["notified_level"] = min(st["notified_level"], new)
+            st["level"] = level = new
+            events += 1
+
+        # up: each level needs an unbroken run at or above its threshold
+        for lv in (1, 2):
+            if raw >= lv and lv > level:
+                st["pending"].setdefault(lv, epoch)
+            else:
+                st["pending"].pop(lv, None)
+        due = [lv for lv, since in st["pending"].items() if epoch - since >= ALERT_MIN_DURATION_SECS]
+        if due:
+            new = max(due)
+            last_raise = st["raised"].get(new)
+            if last_raise is not None and epoch - last_raise < ALERT_COOLDOWN_SECS:
+                self._emit(conn, room_id, epoch, ts, "raised", new, level, rh, True, status="suppressed")
+            elif live:
+                self._emit(conn, room_id, epoch, ts, "raised", new, level, rh, True)
+                st["raised"][new] = epoch
+                st["notified_level"] = new
+            else:
+                self._emit(conn, room_id, epoch, ts, "raised", new, level, rh, False)
+            st["level"] = new
+            for lv in list(st["pending"]):
+                if lv <= new:
+                    del st["pending"][lv]
+            events += 1
+        return events
+
+    def observe_rows(self, conn: sqlite3.Connection, rows) -> int:
+        """
+        Evaluate ingest rows (room_id, ts_utc, epoch, temp_c, humidity_pct,
+        battery_mv) in time order and persist each touched room's state.
+        """
+        events = 0
+        touched = set()
+        for room_id, ts, epoch, _t, rh, _b in sorted(rows, key=lambda r: (r[0], r[2])):
+            events += self.observe(conn, room_id, int(epoch), rh, ts)
+            touched.add(room_id)
+        for room_id in touched:
+            st = self.rooms[room_id]
+            conn.execute(
+                "INSERT OR REPLACE INTO alert_state(room_id, level, pending, raised, notified_level, last_epoch, last_rh) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (room_id, st["level"], json.dumps(st["pending"]), json.dumps(st["raised"]),
+                 st["notified_level"], st["last_epoch"], st["last_rh"]),
+            )
+        return events
+
+    def forget(self, room_ids) -> None:
+        for room_id in room_ids:
+            self.rooms.pop(room_id, None)
+
+alert_engine = AlertEngine()
+
+class EwTrend:
+    """
+    Exponentially weighted least-squares line through (epoch, value) points.
+
+    Keeps five decayed sums with x measured back from the newest point, so
+    adding a reading is O(1): shift x by the time step, decay by
+    exp(-dt / tau), add the point at x = 0. tau is the window's memory.
+    """
+
+    __slots__ = ("tau", "t", "s0", "sx", "sxx", "sy", "sxy")
+
+    def __init__(self, tau: float, d: Optional[dict] = None):
+        self.tau = tau
+        d = d or {}
+        self.t = d.get("t")
+        self.s0, self.sx, self.sxx, self.sy, self.sxy = (d.get(k, 0.0) for k in ("s0", "sx", "sxx", "sy", "sxy"))
+
+    def add(self, t: int, y: float) -> None:
+        if self.t is not None:
+            dt = t - self.t
+            # re-origin at t (x -> x - dt), then forget
+            self.sxx += dt * (dt * self.s0 - 2 * self.sx)
+            self.sxy -= dt * self.sy
+            self.sx -= dt * self.s0
+            a = math.exp(-dt / self.tau)
+            self.s0 *= a; self.sx *= a; self.sxx *= a; self.sy *= a; self.sxy *= a
+        self.t = t
+        self.s0 += 1.0
+        self.sy += y
+
+    def fit(self):
+        """
+        (value at the newest point, slope per second), or None while the
+        weighted sample is too small or spans no time.
+        """
+        if self.t is None or self.s0 < TREND_MIN_POINTS:
+            return None
+        den = self.s0 * self.sxx - self.sx * self.sx
+        if den <= 1e-9 * self.s0 * self.s0:
+            return None
+        slope = (self.s0 * self.sxy - self.sx * self.sy) / den
+        return (self.sy - slope * self.sx) / self.s0, slope
+
+    def to_dict(self) -> dict:
+        return {"t": self.t, "s0": self.s0, "sx": self.sx, "sxx": self.sxx, "sy": self.sy, "sxy": self.sxy}
+
+class TrendEngine:
+    """
+    Humidity and battery trends per room, advanced by every ingested reading
+    (same rules as AlertEngine: in time order, late readings ignored, cached
+    state written back once per room per batch).
+    """
+
+    def __init__(self):
+        self.rooms = {}
+
+    def _state(self, conn: sqlite3.Connection, room_id: str) -> dict:
+        st = self.rooms.get(room_id)
+        if st is None:
+            row = conn.execute("SELECT humidity, battery FROM room_trends WHERE room_id=?", (room_id,)).fetchone()
+            st = {
+                "humidity": EwTrend(TREND_RH_TAU_SECS, json.loads(row[0]) if row else None),
+                "battery": EwTrend(TREND_BATTERY_TAU_SECS, json.loads(row[1]) if row else None),
+            }
+            self.rooms[room_id] = st
+        return st
+
+    def observe_rows(self, conn: sqlite3.Connection, rows) -> None:
+        touched = set()
+        for room_id, _ts, epoch, _t, rh, batt in sorted(rows, key=lambda r: (r[0], r[2])):
+            st = self._state(conn, room_id)
+            for key, val in (("humidity", rh), ("battery", batt)):
+                tr = st[key]
+                if val is not None and (tr.t is None or epoch > tr.t):
+                    tr.add(int(epoch), float(val))
+                    touched.add(room_id)
+        for room_id in touched:
+            st = self.rooms[room_id]
+            conn.execute(
+                "INSERT OR REPLACE INTO room_trends(room_id, humidity, battery) VALUES (?,?,?)",
+                (room_id, json.dumps(st["humidity"].to_dict()), json.dumps(st["battery"].to_dict())),
+            )
+
+    def forget(self, room_ids) -> None:
+        for room_id in room_ids:
+            self.rooms.pop(room_id, None)
+
+trend_engine = TrendEngine()
+
+class AnomalyDetector:
+    """
+    Per-room sensor-fault detector, run on every ingested reading before the
+    alert and trend engines (which skip what it flags). Constant memory per
+    room and metric:
+
+    - out_of_range: outside ANOMALY_RANGE (e.g. RH stuck at a scaled byte
+      limit such as 0% or >100%)
+    - spike: more than ANOMALY_Z sigmas and ANOMALY_MIN_DELTA away from a
+      time-aware EWMA mean/variance; ANOMALY_CONFIRM outliers in a row on
+      the same side are taken as a real change: the baseline jumps and
+      the run's earlier spike flags are withdrawn
+    - stuck: identical temperature and RH for ANOMALY_STUCK_SECS; the whole
+      run is flagged once detected, then each further repeat
+
+    Flags go to reading_anomalies; state is written back once per room per
+    batch (anomaly_state).
+    """
+
+    def __init__(self):
+        self.rooms = {}
+
+    def _state(self, conn: sqlite3.Connection, room_id: str) -> dict:
+        st = self.rooms.get(room_id)
+        if st is None:
+            row = conn.execute("SELECT state FROM anomaly_state WHERE room_id=?", (room_id,)).fetchone()
+            st = json.loads(row[0]) if row else {
+                "last_epoch": None,
+                "ewm": {m: {"n": 0, "t": None, "mean": 0.0, "var": 0.0, "out": []} for m in ANOMALY_RANGE},
+                "run": {"values": None, "start": None, "flagged": False},
+            }
+            self.rooms[room_id] = st
+        return st
+
+    @staticmethod
+    def _spike(e: dict, metric: str, epoch: int, x: float):
+        """
+        Update one metric's EWMA with x unless it is an outlier. Returns
+        ("spike", mean, z) when x is flagged, ("shift", [epochs]) when it
+        confirms a level shift (those earlier flags are withdrawn), or None.
+        """
+        if e["t"] is None or e["n"] == 0 or epoch - e["t"] > 3 * ANOMALY_TAU_SECS:
+            e.update(n=1, t=epoch, mean=x, var=0.0, out=[])
+            return None
+        diff = x - e["mean"]
+        z = abs(diff) / max(math.sqrt(e["var"]), ANOMALY_SIGMA_FLOOR[metric])
+        if e["n"] >= ANOMALY_WARMUP and z > ANOMALY_Z and abs(diff) > ANOMALY_MIN_DELTA[metric]:
+            side = 1 if diff > 0 else -1
+            # out: [side, epoch, epoch, ...] of the current run of outliers
+            e["out"] = e["out"] + [epoch] if e["out"] and e["out"][0] == side else [side, epoch]
+            if len(e["out"]) - 1 < ANOMALY_CONFIRM:
+                return "spike", e["mean"], z
+            earlier = e["out"][1:-1]
+            e.update(n=1, t=epoch, mean=x, var=0.0, out=[])  # sustained: new baseline
+            return "shift", earlier
+        a = 1.0 - math.exp(-(epoch - e["t"]) / ANOMALY_TAU_SECS)
+        incr = a * diff
+        e["mean"] += incr
+        e["var"] = (1.0 - a) * (e["var"] + diff * incr)
+        e["n"] += 1
+        e["t"] = epoch
+        e["out"] = []
+        return None
+
+    def observe_rows(self, conn: sqlite3.Connection, rows) -> set:
+        """
+        Check ingest rows in time order. Returns {(room_id, epoch)} flagged.
+        """
+        flagged = set()
+        flags = []
+        withdrawn = []
+        touched = set()
+        for room_id, _ts, epoch, temp, rh, _b in sorted(rows, key=lambda r: (r[0], r[2])):
+            epoch = int(epoch)
+            st = self._state(conn, room_id)
+            if st["last_epoch"] is not None and epoch <= st["last_epoch"]:
+                continue
+            st["last_epoch"] = epoch
+            touched.add(room_id)
+
+            for metric, x in (("humidity", rh), ("temp", temp)):
+                if x is None:
+                    continue
+                lo, hi = ANOMALY_RANGE[metric]
+                if not (lo < x <= hi if metric == "humidity" else lo <= x <= hi):
+                    flags.append((room_id, epoch, "out_of_range", metric, x, None, None))
+                    continue
+                hit = self._spike(st["ewm"][metric], metric, epoch, x)
+                if hit and hit[0] == "spike":
+                    flags.append((room_id, epoch, "spike", metric, x, round(hit[1], 2), round(hit[2], 1)))
+                elif hit:
+                    withdrawn += [(room_id, ep, metric) for ep in hit[1]]
+
+            run = st["run"]
+            values = [temp, rh]
+            if None in values or values != run["values"]:
+                run.update(values=values, start=epoch, flagged=False)
+            elif run["flagged"]:
+                flags.append((room_id, epoch, "stuck", "both", rh, None, None))
+            elif epoch - run["start"] >= ANOMALY_STUCK_SECS:
+                run["flagged"] = True
+                cur = conn.execute(
+                    """
+                    INSERT OR IGNORE INTO reading_anomalies(room_id, epoch, kind, metric, value, expected, score)
+                    SELECT room_id, epoch, 'stuck', 'both', humidity_pct, NULL, NULL FROM readings
+                    WHERE room_id = ? AND epoch >= ? AND epoch < ? AND temp_c = ? AND humidity_pct = ?
+                    """,
+                    (room_id, run["start"], epoch, temp, rh),
+                )
+                ANOMALIES.labels("stuck").inc(max(cur.rowcount, 0))
+                flags.append((room_id, epoch, "stuck", "both", rh, None, None))
+
+        if flags:
+            conn.executemany(
+                "INSERT OR IGNORE INTO reading_anomalies(room_id, epoch, kind, metric, value, expected, score) "
+                "VALUES (?,?,?,?,?,?,?)",
+                flags,
+            )
+            for f in flags:
+                flagged.add((f[0], f[1]))
+                ANOMALIES.labels(f[2]).inc()
+        if withdrawn:
+            conn.executemany(
+                "DELETE FROM reading_anomalies WHERE room_id=? AND epoch=? AND kind='spike' AND metric=?", withdrawn
+            )
+        for room_id in touched:
+            conn.execute("INSERT OR REPLACE INTO anomaly_state(room_id, state) VALUES (?,?)",
+                         (room_id, json.dumps(self.rooms[room_id])))
+        return flagged
+
+    def forget(self, room_ids) -> None:
+        for room_id in room_ids:
+            self.rooms.pop(room_id, None)
+
+anomaly_detector = AnomalyDetector()
+_ingest_lock = threading.Lock()
+
+def room_forecast(room_id: str, humidity: Optional[dict], battery: Optional[dict], now: int) -> dict:
+    """
+    Projection from persisted trend state: humidity slope and when it will
+    reach warn/alert, battery slope and when it reaches BATTERY_EMPTY_MV.
+    """
+    out = {"room_id": room_id, "humidity": None, "battery": None}
+
+    tr = EwTrend(TREND_RH_TAU_SECS, humidity)
+    fit = tr.fit()
+    if fit:
+        value, slope = fit
+        h = {"as_of_epoch": tr.t, "value": round(value, 2), "slope_per_hour": round(slope * 3600, 3)}
+        for name, thr in (("warn", HUMIDITY_WARN), ("alert", HUMIDITY_ALERT)):
+            if value >= thr:
+                at = tr.t
+            elif slope > 0:
+                secs = (thr - value) / slope
+                at = int(tr.t + secs) if secs <= TREND_RH_HORIZON_SECS else None
+            else:
+                at = None
+            h[f"{name}_at_epoch"] = at
+            h[f"{name}_in_secs"] = None if at is None else max(0, at - now)
+        out["humidity"] = h
+
+    tr = EwTrend(TREND_BATTERY_TAU_SECS, battery)
+    fit = tr.fit()
+    if fit:
+        value, slope = fit
+        b = {"as_of_epoch": tr.t, "value_mv": round(value), "slope_mv_per_day": round(slope * 86400, 3),
+             "empty_mv": BATTERY_EMPTY_MV, "empty_at_epoch": None, "empty_utc": None, "days_left": None}
+        if value <= BATTERY_EMPTY_MV:
+            b["empty_at_epoch"] = tr.t
+        elif slope < 0 and (value - BATTERY_EMPTY_MV) / -slope <= TREND_BATTERY_HORIZON_SECS:
+            b["empty_at_epoch"] = int(tr.t + (value - BATTERY_EMPTY_MV) / -slope)
+        if b["empty_at_epoch"] is not None:
+            b["empty_utc"] = datetime.fromtimestamp(b["empty_at_epoch"], tz=timezone.utc).strftime("%Y-%m-%d")
+            b["days_left"] = round(max(0, b["empty_at_epoch"] - now) / 86400, 1)
+        out["battery"] = b
+    return out
+
+def load_forecasts(conn: sqlite3.Connection, room_ids, now: int) -> dict:
+    out = {}
+    for room_id in room_ids:
+        row = conn.execute("SELECT humidity, battery FROM room_trends WHERE room_id=?", (room_id,)).fetchone()
+        if row:
+            out[room_id] = room_forecast(room_id, json.loads(row[0]), json.loads(row[1]), now)
+    return out
+
+def write_readings(conn: sqlite3.Connection, rows: list, telemetry: "CollectorTelemetryReq" = None) -> int:
+    """
+    Insert ingest rows, update the gap index, flag suspicious readings,
+    advance the alert state machine and trends on the rest and store
+    collector telemetry in one transaction. Returns the number of alert
+    events.
+    """
+    with _ingest_lock:
+        try:
+            with conn:
+                events = 0
+                if rows:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO readings(room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv) VALUES (?,?,?,?,?,?)",
+                        rows
+                    )
+                    refresh_gaps_for_rows(conn, rows)
+                    flagged = anomaly_detector.observe_rows(conn, rows)
+                    clean = [r for r in rows if (r[0], int(r[2])) not in flagged] if flagged else rows
+                    events = alert_engine.observe_rows(conn, clean)
+                    trend_engine.observe_rows(conn, clean)
+                if telemetry:
+                    store_collector_telemetry(conn, telemetry)
+        except Exception:
+            for engine in (anomaly_detector, alert_engine, trend_engine):
+                engine.forget({r[0] for r in rows})
+            raise
+    if events:
+        alert_notifier.wake()
+    return events
+
+def _alert_message(ev: dict, label: str) -> tuple:
+    lvl = ALERT_LEVELS[ev["level"]]
+    prev = ALERT_LEVELS[ev["prev_level"]]
+    when = ev["ts_utc"] or datetime.fromtimestamp(ev["epoch"], tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if ev["kind"] == "raised":
+        subject = f"Humidity {lvl.upper()}: {label} at {ev['humidity_pct']:.0f}%"
+        body = f"{label}: humidity {ev['humidity_pct']:.1f}% has been at or above {ev['threshold']:.0f}% " \
+               f"for at least {ALERT_MIN_DURATION_SECS // 60} min ({prev} -> {lvl}) as of {when}."
+    else:
+        subject = f"Humidity {'back to normal' if ev['kind'] == 'cleared' else lvl}: {label}"
+        body = f"{label}: humidity {ev['humidity_pct']:.1f}% dropped below " \
+               f"{ev['threshold'] - ALERT_HYSTERESIS_RH:.0f}% ({prev} -> {lvl}) as of {when}."
+    return subject, body
+
+class AlertNotifier(threading.Thread):
+    """
+    Drains alert_outbox to the webhook and/or the configured email. Woken
+    right after an ingest commit that emitted events; also polls, so retries
+    (exponential backoff) and events left from a restart go out.
+    """
+
+    def __init__(self):
+        super().__init__(name="alert-notifier", daemon=True)
+        self.event = threading.Event()
+
+    def wake(self) -> None:
+        self.event.set()
+
+    def run(self):
+        while True:
+            self.event.wait(ALERT_NOTIFY_POLL_SECS)
+            self.event.clear()
+            try:
+                self.drain()
+            except Exception as e:
+                print("[WARN] alert notifier:", e, flush=True)
+
+    def send(self, ev: dict, label: str) -> bool:
+        """
+        Deliver on every configured channel. False if there is none.
+        """
+        subject, body = _alert_message(ev, label)
+        sent = False
+        if ALERT_WEBHOOK_URL:
+            payload = dict(ev, room_label=label, level_name=ALERT_LEVELS[ev["level"]], subject=subject, text=body)
+            req = urllib.request.Request(
+                ALERT_WEBHOOK_URL, data=json.dumps(payload).encode("utf-8"),
+                headers={"Content-Type": "application/json"}, method="POST",
+            )
+            with urllib.request.urlopen(req, timeout=15) as resp:
+                resp.read()
+            sent = True
+        if ALERT_EMAIL and get_email_config().get("enabled"):
+            send_email_from_config(subject, body)
+            sent = True
+        return sent
+
+    def drain(self) -> None:
+        cfg = load_config_v2()
+        labels = {r.get("id"): r.get("label") for r in cfg.get("rooms") or []}
+        conn = get_db()
+        conn.row_factory = sqlite3.Row
+        try:
+            while True:
+                now = int(time.time())
+                batch = conn.execute(
+                    """
+                    SELECT e.*, o.attempts FROM alert_outbox o JOIN alert_events e ON e.id = o.event_id
+                    WHERE o.next_attempt <= ? ORDER BY o.event_id LIMIT 50
+                    """,
+                    (now,),
+                ).fetchall()
+                if not batch:
+                    return
+                for row in batch:
+                    ev = dict(row)
+                    attempts = ev.pop("attempts") + 1
+                    try:
+                        status = "sent" if self.send(ev, labels.get(ev["room_id"]) or ev["room_id"]) else "no_channel"
+                    except Exception as e:
+                        if attempts < ALERT_NOTIFY_MAX_ATTEMPTS:
+                            print(f"[WARN] alert {ev['id']} notify failed (attempt {attempts}):", e, flush=True)
+                            with conn:
+                                conn.execute(
+                                    "UPDATE alert_outbox SET attempts=?, next_attempt=?, last_error=? WHERE event_id=?",
+                                    (attempts, now + min(3600, 30 * 2 ** (attempts - 1)), str(e), ev["id"]),
+                                )
+                            continue
+                        print(f"[WARN] alert {ev['id']} notify gave up after {attempts} attempts:", e, flush=True)
+                        status = "failed"
+                    with conn:
+                        conn.execute("UPDATE alert_events SET notify_status=?, notified_epoch=? WHERE id=?",
+                                     (status, int(time.time()), ev["id"]))
+                        conn.execute("DELETE FROM alert_outbox WHERE event_id=?", (ev["id"],))
+                    ALERT_NOTIFICATIONS.labels(status).inc()
+        finally:
+            conn.close()
+
+alert_notifier = AlertNotifier()
+
+@app.on_event("startup")
+def _start_alert_notifier():
+    alert_notifier.start()
+    alert_notifier.wake()
+
+class MouldIndexTicker(threading.Thread):
+    """
+    Advances every room's mould-risk index through the last full hour, every
+    MOULD_TICK_SECS, so the stats endpoints only read it. A tick with no new
+    full hour and no rewound steps writes nothing.
+    """
+
+    def __init__(self):
+        super().__init__(name="mould-index", daemon=True)
+        self.event = threading.Event()
+
+    def wake(self) -> None:
+        self.event.set()
+
+    def run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print("[WARN] mould index tick:", e, flush=True)
+            self.event.wait(MOULD_TICK_SECS)
+            self.event.clear()
+
+    def tick(self) -> None:
+        room_ids = [r.get("id") for r in load_config_v2().get("rooms") or [] if r.get("id")]
+        conn = get_db()
+        try:
+            update_mould_index(conn, room_ids, int(time.time()))
+        finally:
+            conn.close()
+
+mould_ticker = MouldIndexTicker()
+
+@app.on_event("startup")
+def _start_mould_ticker():
+    mould_ticker.start()
+
+@app.get("/api/rooms/{room_id}/gaps")
+def api_room_gaps(
+    room_id: str,
+    start: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: end - 7d)"),
+    end: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: now)"),
+):
+    """
+    Outage intervals (no reading for more than GAP_THRESHOLD_SECS) and
+    coverage for one room, from the gap index.
+    """
+    cfg = load_config_v2()
+    get_room_or_404(cfg, room_id)
+    now = int(datetime.now(timezone.utc).timestamp())
+    end_epoch = parse_epoch_param(end, now)
+    start_epoch = parse_epoch_param(start, end_epoch - 7 * 24 * 3600)
+    if end_epoch <= start_epoch:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    conn = get_db()
+    try:
+        res = room_gaps(conn, room_id, start_epoch, end_epoch, now)
+    finally:
+        conn.close()
+    return {"status": "ok", "threshold_secs": GAP_THRESHOLD_SECS, **res}
+
+@app.get("/api/coverage")
+def api_coverage(
+    start: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: end - 24h)"),
+    end: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: now)"),
+):
+    """
+    Coverage and outage time for every enabled room (gap lists omitted).
+    """
+    cfg = load_config_v2()
+    now = int(datetime.now(timezone.utc).timestamp())
+    end_epoch = parse_epoch_param(end, now)
+    start_epoch = parse_epoch_param(start, end_epoch - 24 * 3600)
+    if end_epoch <= start_epoch:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    rooms = {}
+    conn = get_db()
+    try:
+        for r in cfg.get("rooms") or []:
+            if not r.get("enabled", True) or not r.get("id"):
+                continue
+            res = room_gaps(conn, r["id"], start_epoch, end_epoch, now)
+            rooms[r["id"]] = {
+                "coverage_pct": res["coverage_pct"],
+                "outage_secs": res["outage_secs"],
+                "observed_secs": res["observed_secs"],
+                "gaps": len(res["gaps"]),
+                "ongoing": any(g["ongoing"] for g in res["gaps"]),
+            }
+    finally:
+        conn.close()
+    return {"status": "ok", "start": start_epoch, "end": end_epoch, "threshold_secs": GAP_THRESHOLD_SECS, "rooms": rooms}
+
 @app.post("/api/ingest/reading")
 def api_ingest_reading(req: IngestReadingReq):
     cfg = load_config_v2()
@@ -672,16 +2104,172 @@ def api_ingest_reading(req: IngestReadingReq):
 
     conn = get_db()
     try:
-        conn.execute(
-            "INSERT OR REPLACE INTO readings(room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv) VALUES (?,?,?,?,?,?)",
-            (room_id, ts, int(req.epoch), req.temp_c, req.humidity_pct, req.battery_mv)
-        )
-        conn.commit()
+        write_readings(conn, [(room_id, ts, int(req.epoch), req.temp_c, req.humidity_pct, req.battery_mv)])
     finally:
         conn.close()
 
+    INGEST_READINGS.labels(room_id, "api").inc()
+
     return {"ok": True, "room_id": room_id}
 
+@app.post("/api/ingest/batch")
+def api_ingest_batch(req: IngestBatchReq):
+    """
+    Many readings in one request and one transaction. Readings whose MAC is
+    not mapped are reported per item instead of failing the whole batch.
+    """
+    cfg = load_config_v2()
+    results = []
+    rows = []
+    for r in req.readings:
+        room_id = room_id_for_mac(cfg, r.mac)
+        if not room_id:
+            results.append({"ok": False, "mac": r.mac, "epoch": r.epoch, "error": "MAC not mapped to any enabled room"})
+            continue
+        ts = (r.ts_utc or "").strip()
+        if ts.endswith("+00:00"):
+            ts = ts[:-6] + "Z"
+        rows.append((room_id, ts, int(r.epoch), r.temp_c, r.humidity_pct, r.battery_mv))
+        results.append({"ok": True, "mac": r.mac, "epoch": r.epoch, "room_id": room_id})
+
+    if rows or req.telemetry:
+        conn = get_db()
+        try:
+            write_readings(conn, rows, req.telemetry)
+        finally:
+            conn.close()
+
+        for row in rows:
+            INGEST_READINGS.labels(row[0], "api").inc()
+
+    return {"ok": True, "accepted": len(rows), "rejected": len(results) - len(rows), "results": results}
+
+@app.get("/api/alerts")
+def api_alerts(room_id: Optional[str] = None, limit: int = Query(50, ge=1, le=1000)):
+    """
+    Current alert level per room and the most recent alert events.
+    """
+    cfg = load_config_v2()
+    labels = {r.get("id"): r.get("label") for r in cfg.get("rooms") or []}
+    if room_id is not None:
+        get_room_or_404(cfg, room_id)
+
+    conn = get_db()
+    conn.row_factory = sqlite3.Row
+    try:
+        where, params = ("WHERE room_id=?", (room_id,)) if room_id else ("", ())
+        states = conn.execute(
+            f"SELECT room_id, level, last_epoch, last_rh FROM alert_state {where} ORDER BY level DESC, room_id", params
+        ).fetchall()
+        events = conn.execute(
+            f"SELECT * FROM alert_events {where} ORDER BY id DESC LIMIT ?", params + (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    rooms = []
+    for s in states:
+        d = dict(s)
+        d["label"] = labels.get(d["room_id"]) or d["room_id"]
+        d["status"] = ALERT_LEVELS[d["level"]]
+        rooms.append(d)
+    out_events = []
+    for e in events:
+        d = dict(e)
+        d["label"] = labels.get(d["room_id"]) or d["room_id"]
+        d["level_name"] = ALERT_LEVELS[d["level"]]
+        out_events.append(d)
+    return {
+        "status": "ok",
+        "thresholds": {"warn": HUMIDITY_WARN, "alert": HUMIDITY_ALERT, "hysteresis": ALERT_HYSTERESIS_RH,
+                       "min_duration_secs": ALERT_MIN_DURATION_SECS, "cooldown_secs": ALERT_COOLDOWN_SECS},
+        "rooms": rooms,
+        "events": out_events,
+    }
+
+@app.get("/api/rooms/{room_id}/anomalies")
+def api_room_anomalies(
+    room_id: str,
+    start: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: end - 7d)"),
+    end: Optional[str] = Query(None, description="epoch, YYYY-MM-DD or ISO timestamp (default: now)"),
+    limit: int = Query(500, ge=1, le=10000),
+):
+    """
+    Readings flagged as suspicious (spike, stuck, out_of_range), newest first,
+    with counts per kind over the window.
+    """
+    cfg = load_config_v2()
+    get_room_or_404(cfg, room_id)
+    end_epoch = parse_epoch_param(end, int(time.time()))
+    start_epoch = parse_epoch_param(start, end_epoch - 7 * 24 * 3600)
+
+    conn = get_db()
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            "SELECT epoch, kind, metric, value, expected, score FROM reading_anomalies "
+            "WHERE room_id=? AND epoch >= ? AND epoch < ? ORDER BY epoch DESC LIMIT ?",
+            (room_id, start_epoch, end_epoch, limit),
+        ).fetchall()
+        counts = dict(conn.execute(
+            "SELECT kind, COUNT(DISTINCT epoch) FROM reading_anomalies "
+            "WHERE room_id=? AND epoch >= ? AND epoch < ? GROUP BY kind",
+            (room_id, start_epoch, end_epoch),
+        ).fetchall())
+    finally:
+        conn.close()
+    return {"status": "ok", "room_id": room_id, "start": start_epoch, "end": end_epoch,
+            "counts": counts, "anomalies": [dict(r) for r in rows]}
+
+@app.get("/api/forecast")
+def api_forecast():
+    """
+    Humidity and battery projections for every enabled room.
+    """
+    cfg = load_config_v2()
+    ids = [r["id"] for r in cfg.get("rooms") or [] if r.get("enabled", True) and r.get("id")]
+    conn = get_db()
+    try:
+        rooms = load_forecasts(conn, ids, int(time.time()))
+    finally:
+        conn.close()
+    return {"status": "ok", "thresholds": {"warn": HUMIDITY_WARN, "alert": HUMIDITY_ALERT, "battery_empty_mv": BATTERY_EMPTY_MV},
+            "rooms": rooms}
+
+@app.get("/api/rooms/{room_id}/forecast")
+def api_room_forecast(room_id: str):
+    """
+    When the room's humidity will reach warn/alert at its current trend and
+    when its sensor battery will be empty.
+    """
+    cfg = load_config_v2()
+    get_room_or_404(cfg, room_id)
+    conn = get_db()
+    try:
+        res = load_forecasts(conn, [room_id], int(time.time())).get(room_id)
+    finally:
+        conn.close()
+    return {"status": "ok" if res else "no_data", "room_id": room_id, "forecast": res}
+
+@app.get("/api/collector/telemetry")
+def api_collector_telemetry():
+    """
+    Per-room poll timings, success rate and RSSI as last reported by the
+    collectors, slowest rooms first.
+    """
+    cfg = load_config_v2()
+    labels = {r.get("id"): r.get("label") for r in cfg.get("rooms") or []}
+
+    conn = get_db()
+    try:
+        rooms = load_collector_telemetry(conn)
+    finally:
+        conn.close()
+
+    for r in rooms:
+        r["label"] = labels.get(r["room_id"]) or r["room_id"]
+    return {"status": "ok", "rooms": rooms}
+
 @app.get("/api/reports")
 def list_reports():
     base = Path(REPORTS_DIR)
@@ -750,8 +2338,61 @@ def setup_select(req: SelectDeviceReq):
     return {"ok": True, "device": {"mac": default["mac"], "name": default["name"]}}
 
 
+class TimedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that records statement timings and lock waits.
+
+    The driver-level busy timeout is kept short so a locked database surfaces
+    here; we count it, back off and retry until SQLITE_BUSY_TIMEOUT_SECS.
+    """
+
+    def _run(self, op: str, fn, *args):
+        t0 = time.perf_counter()
+        deadline = t0 + SQLITE_BUSY_TIMEOUT_SECS
+        delay = 0.01
+        try:
+            while True:
+                try:
+                    return fn(*args)
+                except sqlite3.OperationalError as e:
+                    msg = str(e).lower()
+                    if ("locked" not in msg and "busy" not in msg) or time.perf_counter() >= deadline:
+                        raise
+                    DB_LOCK_WAITS.labels(op).inc()
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.25)
+        finally:
+            DB_QUERY_LATENCY.labels(op).observe(time.perf_counter() - t0)
+
+    def execute(self, sql, parameters=()):
+        op = (sql.lstrip().split(None, 1) or ["?"])[0].upper()
+        return self._run(op, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        op = (sql.lstrip().split(None, 1) or ["?"])[0].upper()
+        return self._run(op, super().executemany, sql, seq_of_parameters)
+
+    def commit(self):
+        return self._run("COMMIT", super().commit)
+
+    def __exit__(self, exc_type, exc, tb):
+        # route the context-manager commit through our timed/retrying commit
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn = sqlite3.connect(
+        DB_PATH,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=SQLITE_LOCK_SLICE_SECS,
+        factory=TimedConnection,
+    )
+    if not SQLITE_HAS_MATH:
+        conn.create_function("ln", 1, lambda x: math.log(x) if x and x > 0 else None, deterministic=True)
+        conn.create_function("exp", 1, lambda x: None if x is None else math.exp(x), deterministic=True)
 
     # --- Detect existing schema ---
     conn.execute("CREATE TABLE IF NOT EXISTS __meta(dummy INTEGER)")
@@ -797,8 +2438,158 @@ def get_db():
 
     conn.execute("CREATE INDEX IF NOT EXISTS idx_room_epoch ON readings(room_id, epoch)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_room_ts ON readings(room_id, ts_utc)")
+
+    # latest collector telemetry summary per room (pushed with ingest batches)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS collector_telemetry (
+            collector TEXT NOT NULL,
+            room_id TEXT NOT NULL,
+            updated_epoch INTEGER NOT NULL,
+            since_epoch INTEGER,
+            summary TEXT NOT NULL,
+            PRIMARY KEY (collector, room_id)
+        )
+    """)
+
+    # streaming alert state per room, the event log and the notifier queue
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alert_state (
+            room_id TEXT PRIMARY KEY,
+            level INTEGER NOT NULL,
+            pending TEXT NOT NULL,
+            raised TEXT NOT NULL,
+            notified_level INTEGER NOT NULL,
+            last_epoch INTEGER,
+            last_rh REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alert_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_id TEXT NOT NULL,
+            epoch INTEGER NOT NULL,
+            ts_utc TEXT,
+            kind TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            prev_level INTEGER NOT NULL,
+            humidity_pct REAL,
+            threshold REAL,
+            notify_status TEXT NOT NULL,
+            notified_epoch INTEGER,
+            created_epoch INTEGER NOT NULL
+        )
+    """)
+    # outage index: intervals between consecutive readings longer than GAP_THRESHOLD_SECS
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reading_gaps (
+            room_id TEXT NOT NULL,
+            start_epoch INTEGER NOT NULL,
+            end_epoch INTEGER NOT NULL,
+            PRIMARY KEY (room_id, start_epoch)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS reading_gaps_meta (threshold_secs INTEGER NOT NULL)")
+
+    # suspicious readings (sensor faults) and the detector's per-room state
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reading_anomalies (
+            room_id TEXT NOT NULL,
+            epoch INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            value REAL,
+            expected REAL,
+            score REAL,
+            PRIMARY KEY (room_id, epoch, kind, metric)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS anomaly_state (room_id TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+    # incremental trend state per room (EwTrend sums as JSON)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS room_trends (
+            room_id TEXT PRIMARY KEY,
+            humidity TEXT NOT NULL,
+            battery TEXT NOT NULL
+        )
+    """)
+
+    # cumulative mould-risk index: hourly steps and how far each room has been advanced
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mould_index (
+            room_id TEXT NOT NULL,
+            hour_epoch INTEGER NOT NULL,
+            risk_secs INTEGER NOT NULL,
+            covered_secs INTEGER NOT NULL,
+            idx REAL NOT NULL,
+            PRIMARY KEY (room_id, hour_epoch)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mould_index_state (
+            room_id TEXT PRIMARY KEY,
+            through_epoch INTEGER NOT NULL,
+            idx REAL NOT NULL
+        )
+    """)
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_room ON alert_events(room_id, id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alert_outbox (
+            event_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt INTEGER NOT NULL,
+            last_error TEXT
+        )
+    """)
     return conn
 
+def changed_rows(conn: sqlite3.Connection, rows) -> tuple:
+    """
+    (rows that differ from what is stored, how many of them are new) for
+    rows (room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv). The
+    last row per epoch wins, as with INSERT OR REPLACE. A re-import of the
+    same file therefore writes and re-derives nothing.
+    """
+    latest = {}
+    for r in rows:
+        latest[(r[0], int(r[2]))] = r
+    by_room = {}
+    for (room_id, epoch), r in latest.items():
+        by_room.setdefault(room_id, {})[epoch] = r
+
+    out, new = [], 0
+    for room_id, rs in by_room.items():
+        stored = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                "SELECT epoch, ts_utc, temp_c, humidity_pct, battery_mv FROM readings WHERE room_id=? AND epoch BETWEEN ? AND ?",
+                (room_id, min(rs), max(rs)),
+            )
+        }
+        for epoch, r in sorted(rs.items()):
+            old = stored.get(epoch)
+            if old is None:
+                new += 1
+            elif old == (r[1], r[3], r[4], r[5]):
+                continue
+            out.append(r)
+    return out, new
+
+def store_csv_rows(conn: sqlite3.Connection, room_id: str, rows, source: str) -> int:
+    """
+    Write the rows of a CSV import that change anything through
+    write_readings(), so gaps (over their span only), anomalies, alerts and
+    trends see them like any ingest. Returns how many were written; the
+    ingest counter only counts the new ones, so corrections and re-imports
+    don't inflate it.
+    """
+    changed, new = changed_rows(conn, rows)
+    if changed:
+        write_readings(conn, changed)
+    INGEST_READINGS.labels(room_id, source).inc(new)
+    return len(changed)
+
 def import_csv_bytes(raw: bytes, conn: sqlite3.Connection,  room_id: str = "default") -> int:
     """
     Robust importer for current.csv.
@@ -856,91 +2647,167 @@ def import_csv_bytes(raw: bytes, conn: sqlite3.Connection,  room_id: str = "defa
         except:
             return None
 
-    inserted = 0
-
-    with conn:
-        for row in reader:
-            if not row:
-                continue
+    rows = []
+    for row in reader:
+        if not row:
+            continue
 
-            # Strip cells
-            vals = [("" if c is None else str(c).strip()) for c in row]
+        # Strip cells
+        vals = [("" if c is None else str(c).strip()) for c in row]
 
-            # --- Canonical row interpretation by length (header may lie) ---
-            ts_raw = ""
-            ep_raw = ""
-            temp_raw = ""
-            hum_raw = ""
-            batt_raw = ""
+        # --- Canonical row interpretation by length (header may lie) ---
+        ts_raw = ""
+        ep_raw = ""
+        temp_raw = ""
+        hum_raw = ""
+        batt_raw = ""
 
-            if len(vals) >= 5:
-                # Prefer 5-col: ts, epoch, temp, hum, batt
-                ts_raw, ep_raw, temp_raw, hum_raw, batt_raw = vals[0], vals[1], vals[2], vals[3], vals[4]
+        if len(vals) >= 5:
+            # Prefer 5-col: ts, epoch, temp, hum, batt
+            ts_raw, ep_raw, temp_raw, hum_raw, batt_raw = vals[0], vals[1], vals[2], vals[3], vals[4]
 
-                # If the second column is NOT epoch-like, fallback to 4-col interpretation
-                # (this helps when a row has extra columns unrelated to epoch)
-                try:
-                    ep_num = float(ep_raw) if ep_raw != "" else None
-                except:
-                    ep_num = None
-
-                if ep_num is None or ep_num < 10_000_000:
-                    # Treat as 4-col: ts, temp, hum, batt (ignore extras)
-                    ts_raw, temp_raw, hum_raw, batt_raw = vals[0], vals[1], vals[2], vals[3]
-                    ep_raw = ""
+            # If the second column is NOT epoch-like, fallback to 4-col interpretation
+            # (this helps when a row has extra columns unrelated to epoch)
+            try:
+                ep_num = float(ep_raw) if ep_raw != "" else None
+            except:
+                ep_num = None
 
-            elif len(vals) == 4:
-                # 4-col: ts, temp, hum, batt
+            if ep_num is None or ep_num < 10_000_000:
+                # Treat as 4-col: ts, temp, hum, batt (ignore extras)
                 ts_raw, temp_raw, hum_raw, batt_raw = vals[0], vals[1], vals[2], vals[3]
                 ep_raw = ""
-            else:
-                # Not enough columns
-                continue
 
-            ts_raw = (ts_raw or "").strip()
-            if not ts_raw:
-                continue
-
-            # epoch: take from column if valid, else derive from ts
-            epoch = None
-            if ep_raw:
-                try:
-                    epoch = int(float(ep_raw))
-                except:
-                    epoch = None
+        elif len(vals) == 4:
+            # 4-col: ts, temp, hum, batt
+            ts_raw, temp_raw, hum_raw, batt_raw = vals[0], vals[1], vals[2], vals[3]
+            ep_raw = ""
+        else:
+            # Not enough columns
+            continue
 
-            if epoch is None:
-                try:
-                    epoch = to_epoch(ts_raw)
-                except:
-                    continue
+        ts_raw = (ts_raw or "").strip()
+        if not ts_raw:
+            continue
 
-            temp = float_or_none(temp_raw)
-            hum  = float_or_none(hum_raw)
-            batt = float_or_none(batt_raw)
-            batt_int = int(batt) if batt is not None else None
+        # epoch: take from column if valid, else derive from ts
+        epoch = None
+        if ep_raw:
+            try:
+                epoch = int(float(ep_raw))
+            except:
+                epoch = None
 
-            # Store timestamp consistently for /api/day BETWEEN string comparison
+        if epoch is None:
             try:
-                ts_store = store_ts_z(ts_raw)
+                epoch = to_epoch(ts_raw)
             except:
                 continue
 
-            conn.execute(
-                "INSERT OR REPLACE INTO readings(room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv) VALUES (?,?,?,?,?,?)",
-                (room_id, ts_store, epoch, temp, hum, batt_int)
-            )
-            inserted += 1
+        temp = float_or_none(temp_raw)
+        hum  = float_or_none(hum_raw)
+        batt = float_or_none(batt_raw)
+        batt_int = int(batt) if batt is not None else None
+
+        # Store timestamp consistently for /api/day BETWEEN string comparison
+        try:
+            ts_store = store_ts_z(ts_raw)
+        except:
+            continue
+
+        rows.append((room_id, ts_store, epoch, temp, hum, batt_int))
+
+    return store_csv_rows(conn, room_id, rows, "csv")
+
 
-    return inserted
+_insights_lock = threading.Lock()
+# (key, doc, body, etag, rooms), replaced as a whole under _insights_lock; rooms
+# holds the per-room bodies derived from this doc
+_insights = None
 
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+def load_insights() -> Optional[dict]:
+    """
+    latest.json parsed once per publication: a stat per call, a re-read
+    only when (inode, mtime, size) changed. The agent replaces the file by
+    rename, so a changed key always means a complete new document.
+    Returns a (key, doc, body, etag, rooms) snapshot, or None if there
+    are no insights yet.
+    """
+    global _insights
+    try:
+        st = os.stat(INSIGHTS_PATH)
+    except FileNotFoundError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    with _insights_lock:
+        if _insights is None or _insights[0] != key:
+            with open(INSIGHTS_PATH, "rb") as f:
+                raw = f.read()
+            try:
+                doc = json.loads(raw)
+            except ValueError:
+                if _insights is None:
+                    raise HTTPException(status_code=503, detail="Insights file is not valid JSON")
+                return _insights  # keep serving the last good version
+            _insights = (key, doc, raw, _etag(raw), {})
+        return _insights
+
+def _cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """
+    Pre-serialised JSON with an ETag; 304 when the client already has it.
+    """
+    inm = request.headers.get("if-none-match") or ""
+    if etag in [t.strip().removeprefix("W/") for t in inm.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 @app.get("/api/insights/latest")
-def api_insights_latest():
-    if not os.path.exists(INSIGHTS_PATH):
+def api_insights_latest(request: Request):
+    snap = load_insights()
+    if snap is None:
         return {"ok": False, "detail": "No insights yet"}
-    with open(INSIGHTS_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    _, _, body, etag, _ = snap
+    return _cached_json(request, body, etag)
+
+@app.get("/api/rooms/{room_id}/insights")
+def api_room_insights(room_id: str, request: Request):
+    cfg = load_config_v2()
+    get_room_or_404(cfg, room_id)
+
+    snap = load_insights()
+    if snap is None:
+        return {"status": "no_data", "message": "No insights yet", "room_id": room_id, "insights": None}
+
+    _, data, _, _, rooms = snap
+    with _insights_lock:
+        entry = rooms.get(room_id)
+        if entry is None:
+            room = (data.get("rooms") or {}).get(room_id)
+            if room is None:
+                out = {
+                    "status": "no_data",
+                    "message": f"No insights for room '{room_id}' yet.",
+                    "room_id": room_id,
+                    "version": data.get("version"),
+                    "generated_utc": data.get("generated_utc"),
+                    "insights": None,
+                }
+            else:
+                out = {
+                    "status": "ok",
+                    "room_id": room_id,
+                    "version": data.get("version"),
+                    "generated_utc": data.get("generated_utc"),
+                    "insights": room,
+                }
+            body = json.dumps(out).encode("utf-8")
+            entry = rooms[room_id] = (body, _etag(body))
+
+    return _cached_json(request, *entry)
 
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
@@ -987,8 +2854,8 @@ async def upload_csv(file: UploadFile = File(...)):
     i_b  = idx("battery_mv") if "battery_mv" in header else None
 
     conn = get_db()
-    inserted = 0
-    with conn:
+    rows = []
+    try:
         for row in reader:
             if not row: 
                 continue
@@ -1019,11 +2886,11 @@ async def upload_csv(file: UploadFile = File(...)):
             batt = f_or_none(i_b)
             batt_int = int(batt) if batt is not None else None
 
-            conn.execute(
-                "INSERT OR REPLACE INTO readings(room_id, ts_utc, epoch, temp_c, humidity_pct, battery_mv) VALUES (?,?,?,?,?,?)",
-                ("default", ts, epoch, temp, hum, batt_int)
-            )
-            inserted += 1
+            rows.append(("default", ts, epoch, temp, hum, batt_int))
+
+        inserted = store_csv_rows(conn, "default", rows, "upload")
+    finally:
+        conn.close()
 
     return {"ok": True, "inserted": inserted, "saved_as": save_path}
 
@@ -1041,7 +2908,10 @@ def import_current_csv():
     room_id = (primary.get("id") or "default")
 
     conn = get_db()
-    inserted = import_csv_bytes(raw, conn, room_id=room_id)
+    try:
+        inserted = import_csv_bytes(raw, conn, room_id=room_id)
+    finally:
+        conn.close()
 
     return {"ok": True, "inserted": inserted, "source": csv_path, "room_id": room_id}
 
@@ -1121,8 +2991,10 @@ def api_day(date_str: str):
 
     conn = get_db()
     try:
+        ps = psychro_sql("temp_c", "humidity_pct")
         cur = conn.execute(
-            """SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv
+            f"""SELECT ts_utc, epoch, temp_c, humidity_pct, battery_mv,
+                       ROUND({ps["dew_c"]}, 2), ROUND({ps["ah_gm3"]}, 2)
                FROM readings
                WHERE room_id=? AND ts_utc BETWEEN ? AND ?
                ORDER BY epoch ASC""",
@@ -1134,6 +3006,8 @@ def api_day(date_str: str):
             "temp_c": r[2],
             "humidity_pct": r[3],
             "battery_mv": r[4],
+            "dew_point_c": r[5],
+            "abs_humidity_gm3": r[6],
         } for r in cur.fetchall()]
     finally:
         conn.close()
@@ -26,13 +26,26 @@ function updateCard(id, text) {
   el.style.opacity = 0;
   setTimeout(() => { el.textContent = text; el.style.opacity = 1; }, 150);
 }
-function peakIndex(arr) {
-  let idx = -1, best = -Infinity;
-  for (let i = 0; i < arr.length; i++) {
-    const v = Number(arr[i]);
-    if (Number.isFinite(v) && v > best) { best = v; idx = i; }
+function indexOfEpoch(rows, epoch) {
+  if (epoch == null) return -1;
+  return rows.findIndex(r => r.epoch === epoch);
+}
+async function getDayStats(roomId, d) {
+  // UTC day, same bounds as /day
+  const start = `${d}T00:00:00Z`;
+  const end = new Date(Date.parse(start) + 86400 * 1000).toISOString().replace(".000Z", "Z");
+  try {
+    const r = await fetch(
+      `/api/rooms/${encodeURIComponent(roomId)}/stats?start=${encodeURIComponent(start)}&end=${encodeURIComponent(end)}`,
+      { cache: "no-store" }
+    );
+    if (!r.ok) return null;
+    const data = await r.json();
+    return data.stats || null;
+  } catch (e) {
+    console.warn("stats fetch failed", e);
+    return null;
   }
-  return idx;
 }
 function setPeakBadges(tLabel, tVal, hLabel, hVal) {
   const tBox = document.getElementById("statTemp");
@@ -291,7 +304,42 @@ function overviewStatusBadge(status) {
   return `<span class="inline-flex items-center rounded-full bg-slate-200 text-slate-700 px-2 py-1 text-xs font-medium">Not configured</span>`;
 }
 
-function renderSetupOverview(data) {
+function fmtSecs(v) {
+  return v != null ? `${Number(v).toFixed(1)}s` : "—";
+}
+
+// collector-side poll timings for one room (slowest collector wins)
+function telemetryLine(t) {
+  if (!t) return "";
+  const rate = t.success_rate != null ? `${Math.round(t.success_rate * 100)}%` : "—";
+  const rssi = t.rssi_avg != null ? `${t.rssi_avg} dBm` : "—";
+  return `
+    <div class="mt-2 text-xs text-slate-500">
+      <span class="font-medium text-slate-600">Poll:</span>
+      scan ${fmtSecs(t.scan_mean)} · connect ${fmtSecs(t.connect_mean)} · first notify ${fmtSecs(t.first_notify_mean)}
+      · success ${rate} · RSSI ${rssi}
+    </div>
+  `;
+}
+
+async function getCollectorTelemetry() {
+  try {
+    const r = await fetch("/api/collector/telemetry", { cache: "no-store" });
+    if (!r.ok) return {};
+    const data = await r.json();
+    const byRoom = {};
+    // rows come slowest first, so the first one per room is kept
+    for (const t of data.rooms || []) {
+      if (!(t.room_id in byRoom)) byRoom[t.room_id] = t;
+    }
+    return byRoom;
+  } catch (err) {
+    console.error("getCollectorTelemetry failed:", err);
+    return {};
+  }
+}
+
+function renderSetupOverview(data, telemetry = {}) {
   const summary = data.summary || {};
   const rooms = data.rooms || [];
 
@@ -333,6 +381,7 @@ function renderSetupOverview(data) {
               <div><span class="font-medium text-slate-700">MAC:</span> ${room.mac || "—"}</div>
               <div><span class="font-medium text-slate-700">Device:</span> ${room.name || "—"}</div>
             </div>
+            ${telemetryLine(telemetry[room.room_id])}
           </div>
 
           <div class="text-sm text-slate-600 text-right">
@@ -351,8 +400,8 @@ async function loadSetupOverview() {
   try {
     const r = await fetch("/api/overview", { cache: "no-store" });
     if (!r.ok) throw new Error("Failed to load overview");
-    const data = await r.json();
-    renderSetupOverview(data);
+    const [data, telemetry] = await Promise.all([r.json(), getCollectorTelemetry()]);
+    renderSetupOverview(data, telemetry);
   } catch (err) {
     console.error("loadSetupOverview failed:", err);
   }
@@ -364,6 +413,7 @@ async function refreshSelectedRoomDashboard() {
   await loadDashboardRoomSummary();
   await getLatest();
   await loadDay();
+  await refreshInsightsBadge();
 }
 
 async function getSetupConfig() {
@@ -559,17 +609,24 @@ async function getLatest() {
 
 
 // ---------- insights badge ----------
+// selected room's insights; the fleet status when no room is selected
 async function refreshInsightsBadge() {
   try {
-    const res = await fetch("/api/insights/latest", { cache: "no-store" });
+    const url = selectedRoomId
+      ? `/api/rooms/${encodeURIComponent(selectedRoomId)}/insights`
+      : "/api/insights/latest";
+    // "no-cache" revalidates with the ETag: unchanged insights come back as a bodiless 304
+    const res = await fetch(url, { cache: "no-cache" });
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
-    const data = await res.json();
+    const body = await res.json();
+    const data = selectedRoomId ? (body.insights || {}) : body;
 
     const status = (data.status || "idle").toLowerCase();
 
-    // optional: show hours in the badge text
-    const hWarn = data?.last_24h?.hours_humidity_above_warn;
-    const hAlert = data?.last_24h?.hours_humidity_above_alert;
+    // optional: show hours in the badge text (the fleet rollup sums them as room-hours)
+    const w24 = selectedRoomId ? data?.last_24h : body.fleet?.last_24h;
+    const hWarn = selectedRoomId ? w24?.hours_humidity_above_warn : w24?.room_hours_humidity_above_warn;
+    const hAlert = selectedRoomId ? w24?.hours_humidity_above_alert : w24?.room_hours_humidity_above_alert;
 
     console.log("insights status =", status);
 
@@ -856,7 +913,7 @@ async function loadDay() {
     return;
   }
 
-  const { rows = [] } = await res.json();
+  const [{ rows = [] }, stats] = await Promise.all([res.json(), getDayStats(selectedRoomId, d)]);
 
   if (!rows.length) {
     chartMain.data.labels = [];
@@ -891,8 +948,8 @@ async function loadDay() {
   setYAxisRange(chartMain.options.scales.yTemp, temps);
   setYAxisRange(chartMain.options.scales.yHum, hums);
 
-  const iT = peakIndex(temps);
-  const iH = peakIndex(hums);
+  const iT = indexOfEpoch(rows, stats?.temperature?.peak_epoch);
+  const iH = indexOfEpoch(rows, stats?.humidity?.peak_epoch);
   const tPeakVal = iT >= 0 ? temps[iT] : null;
   const hPeakVal = iH >= 0 ? hums[iH] : null;
   const tPeakLabel = iT >= 0 ? labels[iT] : null;